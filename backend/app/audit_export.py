@@ -0,0 +1,476 @@
+"""
+Background jobs for the audit-log PDF export.
+
+POST /admin/audit-logs/export no longer renders the PDF inside the request: it
+snapshots the filtered event set (row count and highest event id), then either
+returns the cached artifact for that snapshot or submits a render job to a
+process pool (AUDIT_EXPORT_WORKERS processes, "spawn" start method so children
+do not inherit the server's threads and sockets). The client polls the job and
+downloads the file once it is complete.
+
+Artifacts are keyed by a hash of the filters plus the snapshot, so asking for
+the same export again is served from disk until new matching events arrive.
+A cached PDF keeps the "Generated by / Generated at" header of the run that
+produced it.
+
+Job status lives in small JSON files next to the artifacts, written atomically
+by the rendering process, so any API worker can answer a poll. Files older than
+AUDIT_EXPORT_TTL_SECONDS are pruned when a new job is submitted.
+
+The job reads events in keyset batches of AUDIT_EXPORT_BATCH_SIZE on (timestamp,
+id), resolving actor names with a join, and emits one table per batch, so there
+is no row ceiling and no per-row user lookup.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.models import SystemEvent, User
+from app.timezone_utils import now_ph
+
+AUDIT_EXPORT_WORKERS = int(os.getenv("AUDIT_EXPORT_WORKERS", "2"))
+AUDIT_EXPORT_BATCH_SIZE = int(os.getenv("AUDIT_EXPORT_BATCH_SIZE", "1000"))
+AUDIT_EXPORT_TTL_SECONDS = int(os.getenv("AUDIT_EXPORT_TTL_SECONDS", str(24 * 3600)))
+# Not under uploads/, which is served publicly
+AUDIT_EXPORT_DIR = os.getenv(
+    "AUDIT_EXPORT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "exports", "audit_logs")
+)
+
+# Event types covered by the "admin_crud" filter
+ADMIN_CRUD_EVENT_TYPES = ("ADMIN_UPDATE_USER", "ADMIN_MANUAL_REGISTRATION", "ADMIN_DELETE_USER")
+
+TERMINAL_STATUSES = ("complete", "failed")
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+# ---------------- Filters ----------------
+
+def apply_filters(query, filters: Dict):
+    """Apply the export filters (event_type, severity, start_date, end_date) to a SystemEvent query."""
+    event_type = filters.get("event_type")
+    if event_type == "admin_crud":
+        query = query.filter(SystemEvent.event_type.in_(ADMIN_CRUD_EVENT_TYPES))
+    elif event_type:
+        query = query.filter(SystemEvent.event_type == event_type)
+    if filters.get("severity"):
+        query = query.filter(SystemEvent.severity == filters["severity"])
+    if filters.get("start_date"):
+        query = query.filter(SystemEvent.timestamp >= filters["start_date"])
+    if filters.get("end_date"):
+        query = query.filter(SystemEvent.timestamp <= filters["end_date"])
+    return query
+
+
+def _cache_key(filters: Dict, snapshot_id: int, total: int) -> str:
+    canonical = json.dumps(
+        {
+            "event_type": filters.get("event_type"),
+            "severity": filters.get("severity"),
+            "start_date": filters["start_date"].isoformat() if filters.get("start_date") else None,
+            "end_date": filters["end_date"].isoformat() if filters.get("end_date") else None,
+            "snapshot_id": snapshot_id,
+            "total": total,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# ---------------- Job files ----------------
+
+def _job_path(job_id: str) -> str:
+    return os.path.join(AUDIT_EXPORT_DIR, "jobs", f"{job_id}.json")
+
+
+def artifact_path(key: str) -> str:
+    return os.path.join(AUDIT_EXPORT_DIR, f"{key}.pdf")
+
+
+def _write_json(path: str, data: Dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _update_job(job: Dict, **changes) -> Dict:
+    job.update(changes)
+    done = job.get("rows_fetched", 0) + job.get("rows_rendered", 0)
+    job["progress"] = 100 if job["status"] == "complete" else (
+        round(100 * done / (2 * job["total"])) if job["total"] else 0
+    )
+    _write_json(_job_path(job["job_id"]), job)
+    return job
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    """Current status of a job, or None if the id is unknown (or malformed)."""
+    if not _JOB_ID.match(job_id or ""):
+        return None
+    try:
+        with open(_job_path(job_id)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _prune():
+    cutoff = time.time() - AUDIT_EXPORT_TTL_SECONDS
+    for directory in (AUDIT_EXPORT_DIR, os.path.join(AUDIT_EXPORT_DIR, "jobs")):
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            try:
+                if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+# ---------------- Rendering (runs in the pool) ----------------
+
+def _fetch_batches(db: Session, filters: Dict, snapshot_id: int):
+    """Yield lists of (timestamp, event_type, actor, severity, description), newest first."""
+    actor = func.coalesce(User.name, "Unknown")
+    base = apply_filters(
+        db.query(
+            SystemEvent.id, SystemEvent.timestamp, SystemEvent.event_type,
+            SystemEvent.user_id, actor.label("actor"), SystemEvent.severity, SystemEvent.description,
+        ).outerjoin(User, User.id == SystemEvent.user_id),
+        filters,
+    ).filter(SystemEvent.id <= snapshot_id)
+
+    last = None
+    while True:
+        query = base
+        if last is not None:
+            last_ts, last_id = last
+            if last_ts is None:
+                query = query.filter(SystemEvent.timestamp.is_(None), SystemEvent.id < last_id)
+            else:
+                query = query.filter(or_(
+                    SystemEvent.timestamp < last_ts,
+                    and_(SystemEvent.timestamp == last_ts, SystemEvent.id < last_id),
+                    SystemEvent.timestamp.is_(None),
+                ))
+        rows = (
+            query.order_by(SystemEvent.timestamp.desc().nulls_last(), SystemEvent.id.desc())
+            .limit(AUDIT_EXPORT_BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            return
+        last = (rows[-1].timestamp, rows[-1].id)
+        yield [
+            (r.timestamp, r.event_type, "System" if r.user_id is None else r.actor, r.severity, r.description)
+            for r in rows
+        ]
+        if len(rows) < AUDIT_EXPORT_BATCH_SIZE:
+            return
+
+
+def _render_job(job: Dict, filters: Dict, snapshot_id: int, generated_by: str):
+    from xml.sax.saxutils import escape
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.lib.enums import TA_LEFT, TA_CENTER
+    from app.database import SessionLocal
+
+    _update_job(job, status="running", phase="fetching")
+
+    class ProgressDocTemplate(SimpleDocTemplate):
+        def afterFlowable(self, flowable):
+            if isinstance(flowable, Table):
+                rendered = job["rows_rendered"] + len(flowable._cellvalues) - flowable.repeatRows
+                _update_job(job, rows_rendered=min(rendered, job["total"]))
+
+    key = job["key"]
+    final_path = artifact_path(key)
+    fd, tmp_path = tempfile.mkstemp(dir=AUDIT_EXPORT_DIR, suffix=".pdf.tmp")
+    os.close(fd)
+
+    doc = ProgressDocTemplate(
+        tmp_path,
+        pagesize=landscape(A4),
+        rightMargin=15,
+        leftMargin=15,
+        topMargin=35,
+        bottomMargin=20,
+        title="DoughNation Audit Logs Report"
+    )
+
+    elements = []
+    styles = getSampleStyleSheet()
+
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        textColor=colors.HexColor('#4A2F17'),
+        spaceAfter=8,
+        alignment=TA_CENTER,
+        fontName='Helvetica-Bold'
+    )
+    elements.append(Paragraph("<b>DoughNation - Audit Logs Report</b>", title_style))
+
+    meta_style = ParagraphStyle(
+        'MetaStyle',
+        parent=styles['Normal'],
+        fontSize=8,
+        textColor=colors.HexColor('#6b4b2b'),
+        spaceAfter=12
+    )
+
+    meta_info = f"<b>Generated:</b> {now_ph().strftime('%B %d, %Y at %H:%M:%S PHT')} | "
+    meta_info += f"<b>By:</b> {escape(generated_by)} | "
+    meta_info += f"<b>Total Records:</b> {job['total']}"
+
+    if any(filters.values()):
+        applied = []
+        if filters.get("event_type"):
+            applied.append(f"Event Type: {escape(filters['event_type'])}")
+        if filters.get("severity"):
+            applied.append(f"Severity: {escape(filters['severity'])}")
+        if filters.get("start_date"):
+            applied.append(f"From: {filters['start_date'].strftime('%Y-%m-%d')}")
+        if filters.get("end_date"):
+            applied.append(f"To: {filters['end_date'].strftime('%Y-%m-%d')}")
+        meta_info += "<br/><b>Filters Applied:</b> " + ", ".join(applied)
+
+    elements.append(Paragraph(meta_info, meta_style))
+    elements.append(Spacer(1, 0.2 * inch))
+
+    header_style = ParagraphStyle(
+        'HeaderStyle',
+        parent=styles['Normal'],
+        fontSize=9,
+        fontName='Helvetica-Bold',
+        textColor=colors.HexColor('#4A2F17'),
+        alignment=TA_CENTER,
+        leading=11
+    )
+    cell_style = ParagraphStyle(
+        'CellStyle',
+        parent=styles['Normal'],
+        fontSize=7.5,
+        leading=9,
+        textColor=colors.HexColor('#4A2F17'),
+        wordWrap='CJK',
+        alignment=TA_LEFT
+    )
+    cell_style_center = ParagraphStyle(
+        'CellStyleCenter',
+        parent=styles['Normal'],
+        fontSize=7.5,
+        leading=9,
+        textColor=colors.HexColor('#4A2F17'),
+        alignment=TA_CENTER
+    )
+
+    header = [
+        Paragraph('<b>Timestamp</b>', header_style),
+        Paragraph('<b>Event Type</b>', header_style),
+        Paragraph('<b>Actor</b>', header_style),
+        Paragraph('<b>Severity</b>', header_style),
+        Paragraph('<b>Description</b>', header_style)
+    ]
+
+    col_widths = [
+        1.0 * inch,   # Timestamp
+        1.5 * inch,   # Event Type
+        1.1 * inch,   # Actor
+        0.7 * inch,   # Severity
+        4.5 * inch    # Description
+    ]
+
+    table_style = TableStyle([
+        # Header styling
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#EADBC8')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#4A2F17')),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, 0), 'MIDDLE'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('TOPPADDING', (0, 0), (-1, 0), 10),
+
+        # Body styling
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor('#4A2F17')),
+        ('ALIGN', (0, 1), (0, -1), 'CENTER'),
+        ('ALIGN', (1, 1), (2, -1), 'LEFT'),
+        ('ALIGN', (3, 1), (3, -1), 'CENTER'),
+        ('ALIGN', (4, 1), (4, -1), 'LEFT'),
+        ('VALIGN', (0, 1), (-1, -1), 'TOP'),
+        ('FONTSIZE', (0, 1), (-1, -1), 7.5),
+        ('TOPPADDING', (0, 1), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+        ('LEFTPADDING', (0, 0), (-1, -1), 6),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+
+        # Grid and borders
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#D4B896')),
+        ('LINEBELOW', (0, 0), (-1, 0), 1.5, colors.HexColor('#BF7327')),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#FFF9F1')]),
+        ('WORDWRAP', (0, 0), (-1, -1), True),
+    ])
+
+    db = SessionLocal()
+    try:
+        # One table per batch; ReportLab splits each across pages and repeats the header
+        for batch in _fetch_batches(db, filters, snapshot_id):
+            table_data = [header]
+            for timestamp, event_type, actor, severity, description in batch:
+                table_data.append([
+                    Paragraph(timestamp.strftime('%Y-%m-%d<br/>%H:%M:%S') if timestamp else "N/A", cell_style_center),
+                    Paragraph(escape(event_type or "N/A"), cell_style),
+                    Paragraph(escape(actor), cell_style),
+                    Paragraph((severity or "info").upper(), cell_style_center),
+                    Paragraph(escape(description or "No description"), cell_style)
+                ])
+            table = Table(table_data, colWidths=col_widths, repeatRows=1)
+            table.setStyle(table_style)
+            elements.append(table)
+            _update_job(job, rows_fetched=job["rows_fetched"] + len(batch))
+    finally:
+        db.close()
+
+    elements.append(Spacer(1, 0.2 * inch))
+    footer_style = ParagraphStyle(
+        'FooterStyle',
+        parent=styles['Normal'],
+        fontSize=7,
+        textColor=colors.HexColor('#999999'),
+        alignment=TA_CENTER
+    )
+    elements.append(Paragraph(
+        f"<i>This is an official audit log report from DoughNation System. "
+        f"Report generated on {now_ph().strftime('%B %d, %Y')}.  </i>",
+        footer_style
+    ))
+
+    _update_job(job, phase="rendering")
+    try:
+        doc.build(elements)
+        os.replace(tmp_path, final_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def run_export_job(job: Dict, filters: Dict, snapshot_id: int, generated_by: str):
+    """Process-pool entry point: render the PDF and record the outcome in the job file."""
+    try:
+        _render_job(job, filters, snapshot_id, generated_by)
+        _update_job(job, status="complete", phase=None, finished_at=now_ph().isoformat())
+    except Exception as e:
+        print(f"[AuditExport] ❌ Job {job['job_id']} failed: {e}")
+        _update_job(job, status="failed", phase=None, error=str(e), finished_at=now_ph().isoformat())
+
+
+# ---------------- Submission (runs in the API process) ----------------
+
+class AuditExportJobs:
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._running: Dict[str, str] = {}  # cache key -> job id, for jobs submitted by this process
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=AUDIT_EXPORT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def submit(self, db: Session, filters: Dict, generated_by: str) -> Dict:
+        """
+        Start (or reuse) an export for `filters` and return its job status.
+
+        The event set is pinned to the highest matching id at submit time, so the
+        artifact is stable and identical requests share it.
+        """
+        total, snapshot_id = apply_filters(
+            db.query(func.count(SystemEvent.id), func.max(SystemEvent.id)), filters
+        ).one()
+        snapshot_id = snapshot_id or 0
+        key = _cache_key(filters, snapshot_id, total)
+
+        with self._lock:
+            running = self._running.get(key)
+            if running:
+                job = get_job(running)
+                if job and job["status"] not in TERMINAL_STATUSES:
+                    return job
+
+            os.makedirs(os.path.join(AUDIT_EXPORT_DIR, "jobs"), exist_ok=True)
+            _prune()
+
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "key": key,
+                "status": "queued",
+                "phase": None,
+                "total": total,
+                "rows_fetched": 0,
+                "rows_rendered": 0,
+                "error": None,
+                "cached": False,
+                "created_at": now_ph().isoformat(),
+                "finished_at": None,
+            }
+
+            if os.path.exists(artifact_path(key)):
+                # Touch so the cached copy outlives the TTL while it is in use
+                os.utime(artifact_path(key))
+                return _update_job(job, status="complete", cached=True, finished_at=job["created_at"])
+
+            _update_job(job)
+            future = self._pool().submit(run_export_job, dict(job), filters, snapshot_id, generated_by)
+            self._running[key] = job["job_id"]
+            future.add_done_callback(lambda f, job=job: self._finished(job, f))
+            return job
+
+    def _finished(self, job: Dict, future):
+        with self._lock:
+            if self._running.get(job["key"]) == job["job_id"]:
+                del self._running[job["key"]]
+        # The worker process died before it could record the outcome
+        error = future.exception()
+        if error is not None:
+            current = get_job(job["job_id"]) or job
+            if current["status"] not in TERMINAL_STATUSES:
+                _update_job(current, status="failed", phase=None, error=str(error), finished_at=now_ph().isoformat())
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+audit_export_jobs = AuditExportJobs()
@@ -5,19 +5,66 @@ from fastapi import Depends, HTTPException, status
 from app.timezone_utils import now_ph
 from fastapi.security import OAuth2PasswordBearer
 from app import models, schemas, database 
+from app.principal_cache import principal_cache
 from sqlalchemy.orm import Session
-import os
+from concurrent.futures import ThreadPoolExecutor
+import asyncio, os, threading
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
+# Build employee principals from the signed token claims alone (no DB lookup).
+# The claims stay valid until the token expires, even if the employee is edited or removed.
+AUTH_TRUST_CLAIMS = os.getenv("AUTH_TRUST_CLAIMS", "0").lower() in ("1", "true", "yes")
+
+# ------------------ Password hashing executor ------------------
+# bcrypt runs on its own small pool instead of the shared request threadpool. At most
+# PASSWORD_HASH_WORKERS jobs run at once and PASSWORD_HASH_QUEUE more may wait;
+# beyond that callers get an immediate 429 instead of piling up request threads.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "16"))
+_HASH_THREAD_PREFIX = "password-hash"
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix=_HASH_THREAD_PREFIX)
+_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE)
+
+
+def _acquire_hash_slot():
+    if not _hash_slots.acquire(blocking=False):
+        print("[Auth] ⛔ Password hashing pool saturated, rejecting request")
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                            detail="Server is busy, please try again shortly",
+                            headers={"Retry-After": "1"})
+
+
+def _run_hashing(fn, *args):
+    # Already on the pool (inside run_on_password_pool): run inline
+    if threading.current_thread().name.startswith(_HASH_THREAD_PREFIX):
+        return fn(*args)
+    _acquire_hash_slot()
+    try:
+        return _hash_executor.submit(fn, *args).result()
+    finally:
+        _hash_slots.release()
+
+
+async def run_on_password_pool(fn, *args):
+    """
+    Run a whole password-checking handler (DB lookups + bcrypt) on the hashing
+    pool, so login traffic never occupies the shared request threadpool.
+    """
+    _acquire_hash_slot()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _hash_slots.release()
+
 
 def hash_password(password: str):
-    return pwd_context.hash(password)
+    return _run_hashing(pwd_context.hash, password)
 
 def verify_password(plain, hashed):
-    return pwd_context.verify(plain, hashed)
+    return _run_hashing(pwd_context.verify, plain, hashed)
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -30,7 +77,78 @@ def decode_access_token(token: str):
         return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         return None
-    
+
+
+def _load_user(db: Session, sub: str):
+    """User for a token subject (id, or email for old tokens), via the principal cache."""
+    user = principal_cache.get_user(db, sub)
+    if user is not None:
+        return user
+
+    try:
+        user_id = int(sub)
+        user = db.query(models.User).filter(models.User.id == user_id).first()
+    except ValueError:
+        # fallback: assume sub is email
+        user = db.query(models.User).filter(models.User.email == sub).first()
+
+    if user:
+        principal_cache.put_user(sub, user)
+    return user
+
+
+def _load_employee(db: Session, payload: dict):
+    """Employee principal dict for an employee token, or None if the employee is gone."""
+    employee_id = payload.get("employee_id")
+    principal = principal_cache.get_employee(employee_id)
+    if principal is not None:
+        return principal
+
+    if AUTH_TRUST_CLAIMS and payload.get("bakery_id") is not None:
+        return {
+            "type": "employee",
+            "employee_id": employee_id,
+            "employee_name": payload.get("employee_name"),
+            "employee_role": payload.get("employee_role"),
+            "bakery_id": payload.get("bakery_id"),
+            "user_id": payload.get("bakery_id")
+        }
+
+    employee = db.query(models.Employee).filter(
+        models.Employee.id == employee_id
+    ).first()
+    if not employee:
+        return None
+
+    principal = {
+        "type": "employee",
+        "employee_id": employee.id,
+        "employee_name": employee.name,
+        "employee_role": employee.role,
+        "bakery_id": employee.bakery_id,
+        "user_id": employee.bakery_id  # For compatibility with existing code
+    }
+    principal_cache.put_employee(employee.id, principal)
+    return dict(principal)
+
+
+def get_token_claims(token: str = Depends(oauth2_scheme)) -> dict:
+    """
+    Verified token payload, without touching the database. Meant for read-only
+    routes that only need the caller's id/role/bakery; use get_current_user when
+    the current account state matters.
+    """
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="Missing authentication token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    payload = decode_access_token(token)
+    if not payload or payload.get("sub") is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="Could not validate credentials",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return payload
+
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)) -> models.User:
     if not SECRET_KEY or not ALGORITHM:
         raise RuntimeError("SECRET_KEY or ALGORITHM environment variable not set")
@@ -46,18 +164,10 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         if sub is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
         
-        # Convert sub to int if possible (user ID)
-        try:
-            user_id = int(sub)
-            user = db.query(models.User).filter(models.User.id == user_id).first()
-        except ValueError:
-            # fallback: assume sub is email
-            user = db.query(models.User).filter(models.User.email == sub).first()
-        
+        user = _load_user(db, sub)
         if not user:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-        
-        print(f"Authenticated user: {user.id} | role: {user.role}")
+
         return user
 
     except JWTError as e:
@@ -105,16 +215,11 @@ def get_current_employee_user(
     Validate employee JWT token and return employee data.
     Returns dict with employee_id, employee_name, employee_role, bakery_id.
     """
-    print(f"\n{'='*80}")
-    print(f"🔐 GET_CURRENT_EMPLOYEE_USER CALLED")
-    print(f"   Token received: {token[:50]}..." if token else "   Token: None")
-    
     if not SECRET_KEY or not ALGORITHM:
         raise RuntimeError("SECRET_KEY or ALGORITHM environment variable not set")
 
     if not token:
         print(f"❌ No token provided")
-        print(f"{'='*80}\n")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Missing authentication token",
@@ -123,58 +228,45 @@ def get_current_employee_user(
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        print(f"✅ Token decoded successfully")
-        print(f"   Payload: {payload}")
         
         # Check if this is an employee token
         token_type = payload.get("type")
-        print(f"   Token type: {token_type}")
         
         if token_type != "employee":
             print(f"❌ Invalid token type (expected 'employee', got '{token_type}')")
-            print(f"{'='*80}\n")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token type. Employee token required."
             )
 
         employee_id = payload.get("employee_id")
-        print(f"   Employee ID from token: {employee_id}")
         
         if not employee_id:
             print(f"❌ No employee_id in token payload")
-            print(f"{'='*80}\n")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token payload"
             )
 
         # Verify employee still exists
-        employee = db.query(models.Employee).filter(
-            models.Employee.id == employee_id
-        ).first()
+        principal = _load_employee(db, payload)
 
-        if not employee:
+        if not principal:
             print(f"❌ Employee ID {employee_id} not found in database")
-            print(f"{'='*80}\n")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Employee not found"
             )
 
-        print(f"✅ Employee authenticated: {employee.name} (ID: {employee.id})")
-        print(f"{'='*80}\n")
-
         return {
-            "employee_id": employee.id,
-            "employee_name": employee.name,
-            "employee_role": employee.role,
-            "bakery_id": employee.bakery_id
+            "employee_id": principal["employee_id"],
+            "employee_name": principal["employee_name"],
+            "employee_role": principal["employee_role"],
+            "bakery_id": principal["bakery_id"]
         }
 
     except JWTError as e:
         print(f"❌ JWT decode error: {str(e)}")
-        print(f"{'='*80}\n")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
@@ -216,25 +308,16 @@ def get_current_user_or_employee(
                     detail="Invalid employee token payload"
                 )
             
-            employee = db.query(models.Employee).filter(
-                models.Employee.id == employee_id
-            ).first()
+            principal = _load_employee(db, payload)
             
-            if not employee:
+            if not principal:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Employee not found"
                 )
             
             # Return employee data in dict format
-            return {
-                "type": "employee",
-                "employee_id": employee.id,
-                "employee_name": employee.name,
-                "employee_role": employee.role,
-                "bakery_id": employee.bakery_id,
-                "user_id": employee.bakery_id  # For compatibility with existing code
-            }
+            return principal
         
         # Bakery owner token (standard user token)
         else:
@@ -245,11 +328,7 @@ def get_current_user_or_employee(
                     detail="Invalid token payload"
                 )
             
-            try:
-                user_id = int(sub)
-                user = db.query(models.User).filter(models.User.id == user_id).first()
-            except ValueError:
-                user = db.query(models.User).filter(models.User.email == sub).first()
+            user = _load_user(db, sub)
             
             if not user:
                 raise HTTPException(
@@ -287,6 +366,13 @@ def get_bakery_id_from_auth(current_auth):
         return current_auth.id
 
 
+def get_bakery_user(db: Session, current_auth):
+    """The bakery's User: the owner themselves, or an employee's bakery (via the principal cache)."""
+    if isinstance(current_auth, dict):
+        return _load_user(db, str(current_auth.get("bakery_id")))
+    return current_auth
+
+
 def check_employee_role_access(
     required_roles: list,
     current_employee: dict = Depends(get_current_employee_user)
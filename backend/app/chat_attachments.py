@@ -0,0 +1,106 @@
+"""
+Chat attachment storage.
+
+Media is uploaded ahead of the message (POST /messages/attachments, multipart)
+and streamed to UPLOAD_DIR in fixed-size chunks. The returned attachment id is
+then referenced by the message, so message frames stay small. All functions
+here are blocking and are meant to be run off the event loop (threadpool /
+executor).
+"""
+
+import base64
+import os
+from uuid import uuid4
+
+from sqlalchemy.orm import Session
+
+from app import models
+
+UPLOAD_DIR = "uploads"
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+MAX_ATTACHMENT_BYTES = int(os.getenv("CHAT_MAX_ATTACHMENT_MB", "50")) * 1024 * 1024
+
+
+class AttachmentError(Exception):
+    pass
+
+
+def media_kind(content_type: str):
+    """"image", "video" or None for a MIME type."""
+    content_type = (content_type or "").lower()
+    if "image" in content_type:
+        return "image"
+    if "video" in content_type:
+        return "video"
+    return None
+
+
+def store_upload(fileobj, original_name: str) -> str:
+    """Copy an uploaded file to UPLOAD_DIR in chunks; returns its URL path."""
+    safe_name = os.path.basename(original_name or "file")
+    filename = f"{uuid4().hex}_{safe_name}"
+    path = os.path.join(UPLOAD_DIR, filename)
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+    written = 0
+    try:
+        with open(path, "wb") as out:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > MAX_ATTACHMENT_BYTES:
+                    raise AttachmentError("Attachment too large")
+                out.write(chunk)
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return f"/{UPLOAD_DIR}/{filename}"
+
+
+def store_base64(data: str, media_type: str) -> str:
+    """Legacy path for base64 media sent inside a message; returns its URL path."""
+    ext = "mp4" if media_type and "video" in media_type else "png"
+    filename = f"{uuid4().hex}.{ext}"
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    with open(os.path.join(UPLOAD_DIR, filename), "wb") as f:
+        f.write(base64.b64decode(data))
+    return f"/{UPLOAD_DIR}/{filename}"
+
+
+def save_upload(db: Session, uploader_id: int, fileobj, original_name: str, content_type: str) -> models.ChatAttachment:
+    """Store an uploaded file and register it as an unclaimed attachment of `uploader_id`."""
+    kind = media_kind(content_type)
+    if not kind:
+        raise AttachmentError("Only image and video attachments are supported")
+
+    file_url = store_upload(fileobj, original_name)
+    attachment = models.ChatAttachment(
+        id=uuid4().hex,
+        uploader_id=uploader_id,
+        file_url=file_url,
+        content_type=content_type,
+        size=os.path.getsize(file_url.lstrip("/"))
+    )
+    db.add(attachment)
+    db.commit()
+    db.refresh(attachment)
+    return attachment
+
+
+def claim_attachment(db: Session, attachment_id: str, sender_id: int) -> models.ChatAttachment:
+    """
+    Attachment referenced by a new message. It must belong to the sender and not be
+    attached to another message yet; link it with `attachment.message_id` once the
+    message is flushed.
+    """
+    attachment = db.query(models.ChatAttachment).filter(
+        models.ChatAttachment.id == str(attachment_id)
+    ).with_for_update().first()
+    if not attachment or attachment.uploader_id != sender_id:
+        raise AttachmentError("Attachment not found")
+    if attachment.message_id is not None:
+        raise AttachmentError("Attachment already used")
+    return attachment
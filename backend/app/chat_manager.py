@@ -1,26 +1,304 @@
-from typing import Dict, List
+"""
+WebSocket connection registry for chat, with a pluggable broker so messages
+reach users connected to other workers/hosts.
+
+Every worker keeps its own sockets in `active_connections`. send_personal_message
+publishes through the broker; each worker's broker subscription delivers to
+the sockets it holds.
+
+CHAT_BROKER selects the backend:
+- "local" (default): in-process only, for a single worker and for tests
+- "postgres": LISTEN/NOTIFY on the app database, for several workers/hosts
+
+Local delivery only queues the frame; each socket has its own sender task, so
+one slow client never delays the others.
+"""
+
+import asyncio
+import json
+import os
+import select
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
 from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+
+CHAT_BROKER = os.getenv("CHAT_BROKER", "local").lower()
+CHAT_CHANNEL = os.getenv("CHAT_BROKER_CHANNEL", "chat_messages")
+
+# Postgres NOTIFY payloads must stay below 8000 bytes
+NOTIFY_MAX_BYTES = 7900
+
+# Per-connection backpressure: frames wait in a bounded queue drained by one task
+# per socket; a socket whose queue overflows or whose send stalls is evicted.
+CHAT_SEND_QUEUE_SIZE = int(os.getenv("CHAT_SEND_QUEUE_SIZE", "256"))
+CHAT_SEND_TIMEOUT = float(os.getenv("CHAT_SEND_TIMEOUT", "5"))
+# Server sends {"type": "ping"} every interval; clients answer with any frame
+# (normally {"type": "pong"}) or are reaped after the timeout.
+CHAT_PING_INTERVAL = float(os.getenv("CHAT_PING_INTERVAL", "25"))
+CHAT_PING_TIMEOUT = float(os.getenv("CHAT_PING_TIMEOUT", "60"))
+
+Deliver = Callable[[int, dict], Awaitable[None]]
+
+
+class LocalBroker:
+    """Delivers straight to this process's sockets."""
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def publish(self, user_id: int, message: dict):
+        await self._deliver(user_id, message)
+
+    async def stop(self):
+        pass
+
+
+class PostgresBroker:
+    """
+    Fans messages out to every worker with Postgres LISTEN/NOTIFY.
+    Messages are delivered locally right away; other workers pick them up from the
+    notification (a worker ignores its own notifications).
+    """
+
+    def __init__(self, engine, channel: str = CHAT_CHANNEL):
+        self.engine = engine
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self._deliver: Optional[Deliver] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+        self._loop = asyncio.get_running_loop()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._listen, name="chat-broker", daemon=True)
+        self._thread.start()
+
+    async def publish(self, user_id: int, message: dict):
+        await self._deliver(user_id, message)
+
+        payload = json.dumps({"origin": self.origin, "user_id": user_id, "message": message}, default=str)
+        if len(payload.encode()) > NOTIFY_MAX_BYTES:
+            print(f"[ChatBroker] ⚠️ Message for user {user_id} too large to broadcast, delivered locally only")
+            return
+        await asyncio.to_thread(self._notify, payload)
+
+    async def stop(self):
+        self._stopped.set()
+        if self._thread:
+            await asyncio.to_thread(self._thread.join, 5)
+
+    def _notify(self, payload: str):
+        with self.engine.connect() as conn:
+            conn.exec_driver_sql("SELECT pg_notify(%(channel)s, %(payload)s)", {"channel": self.channel, "payload": payload})
+            conn.commit()
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            raw = None
+            try:
+                # A dedicated connection outside the pool, kept open for LISTEN
+                raw = self.engine.raw_connection()
+                conn = raw.driver_connection
+                raw.detach()
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN "{self.channel}"')
+                print(f"[ChatBroker] Listening on '{self.channel}'")
+
+                while not self._stopped.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._dispatch(conn.notifies.pop(0).payload)
+            except Exception as e:
+                print(f"[ChatBroker] ❌ Listener error, reconnecting: {e}")
+                self._stopped.wait(2)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+
+    def _dispatch(self, payload: str):
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            return
+        if data.get("origin") == self.origin:
+            return
+        asyncio.run_coroutine_threadsafe(
+            self._deliver(int(data["user_id"]), data["message"]), self._loop
+        )
+
+
+def create_broker(kind: str = CHAT_BROKER, channel: str = CHAT_CHANNEL):
+    if kind == "postgres":
+        from app.database import engine
+        return PostgresBroker(engine, channel)
+    return LocalBroker()
+
+
+class ClientConnection:
+    """
+    One socket with its own bounded outbound queue. A dedicated task drains the
+    queue, so a slow client only backs up its own queue; a heartbeat task pings
+    the client and reaps it when it stops answering.
+    """
+
+    def __init__(self, manager: "ConnectionManager", user_id: int, websocket: WebSocket):
+        self.manager = manager
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=CHAT_SEND_QUEUE_SIZE)
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self._tasks = [
+            asyncio.create_task(self._sender()),
+            asyncio.create_task(self._heartbeat()),
+        ]
+
+    def enqueue(self, message: dict) -> bool:
+        """Queue a frame; False when the queue is full."""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    async def _sender(self):
+        while True:
+            message = await self.queue.get()
+            try:
+                await asyncio.wait_for(self.websocket.send_json(message), CHAT_SEND_TIMEOUT)
+                self.manager.stats["frames_sent"] += 1
+            except asyncio.TimeoutError:
+                await self.manager.evict(self, "send_timeout")
+                return
+            except Exception:
+                await self.manager.evict(self, "send_failed")
+                return
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(CHAT_PING_INTERVAL)
+            if time.monotonic() - self.last_seen > CHAT_PING_TIMEOUT:
+                await self.manager.evict(self, "heartbeat_timeout")
+                return
+            if not self.enqueue({"type": "ping"}):
+                await self.manager.evict(self, "queue_full")
+                return
+
+    def cancel(self):
+        self.closed = True
+        current = asyncio.current_task()
+        for task in self._tasks:
+            if task is not current:
+                task.cancel()
+
+    async def close(self, code: int = 1000):
+        self.cancel()
+        if self.websocket.client_state == WebSocketState.CONNECTED:
+            try:
+                await asyncio.wait_for(self.websocket.close(code=code), CHAT_SEND_TIMEOUT)
+            except Exception:
+                pass
+
 
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, broker=None):
         self.active_connections: Dict[int, List[WebSocket]] = {}
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.broker = broker or create_broker()
+        self.stats = {"frames_sent": 0, "frames_dropped": 0, "evicted": {}}
+        self._started = False
+
+    async def start(self):
+        if not self._started:
+            await self.broker.start(self.deliver_local)
+            self._started = True
+
+    async def stop(self):
+        if self._started:
+            await self.broker.stop()
+            self._started = False
 
     async def connect(self, user_id: int, websocket: WebSocket):
-        await websocket.accept()
+        await self.start()
+        # The endpoint may already have accepted the socket; accepting twice is an ASGI error
+        if websocket.client_state == WebSocketState.CONNECTING:
+            await websocket.accept()
         self.active_connections.setdefault(user_id, []).append(websocket)
+        self.clients[websocket] = ClientConnection(self, user_id, websocket)
 
-    def disconnect(self, user_id: int, websocket: WebSocket):
+    def _remove(self, user_id: int, websocket: WebSocket):
         if user_id in self.active_connections:
-            self.active_connections[user_id].remove(websocket)
+            if websocket in self.active_connections[user_id]:
+                self.active_connections[user_id].remove(websocket)
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
+        return self.clients.pop(websocket, None)
+
+    def disconnect(self, user_id: int, websocket: WebSocket):
+        client = self._remove(user_id, websocket)
+        if client:
+            client.cancel()
+
+    def touch(self, websocket: WebSocket):
+        """Record inbound traffic (any frame counts as a heartbeat reply)."""
+        client = self.clients.get(websocket)
+        if client:
+            client.touch()
+
+    async def evict(self, client: ClientConnection, reason: str):
+        if client.closed:
+            return
+        print(f"[WS] Evicting connection of user {client.user_id}: {reason}")
+        self.stats["evicted"][reason] = self.stats["evicted"].get(reason, 0) + 1
+        self.stats["frames_dropped"] += client.queue.qsize()
+        self._remove(client.user_id, client.websocket)
+        await client.close(code=1008 if reason == "queue_full" else 1011)
 
     async def send_personal_message(self, message: dict, user_id: int):
-        if user_id in self.active_connections:
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_json(message)
-                except RuntimeError:
-                    print(f"[WS] Tried sending to closed WS for user {user_id}")
-                    
-manager = ConnectionManager()
\ No newline at end of file
+        """Deliver to every socket of `user_id`, on any worker."""
+        await self.broker.publish(int(user_id), message)
+
+    async def deliver_local(self, user_id: int, message: dict):
+        """Queue `message` on every socket of `user_id` held by this worker."""
+        for websocket in list(self.active_connections.get(user_id, [])):
+            await self.reply(websocket, message)
+
+    async def reply(self, websocket: WebSocket, message: dict):
+        """Queue a frame for one socket (answers to that socket's own requests)."""
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        if not client.enqueue(message):
+            self.stats["frames_dropped"] += 1
+            await self.evict(client, "queue_full")
+
+    def get_stats(self) -> dict:
+        depths = [c.queue.qsize() for c in self.clients.values()]
+        return {
+            "users": len(self.active_connections),
+            "connections": len(self.clients),
+            "queued_frames": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "queue_limit": CHAT_SEND_QUEUE_SIZE,
+            "frames_sent": self.stats["frames_sent"],
+            "frames_dropped": self.stats["frames_dropped"],
+            "evicted": dict(self.stats["evicted"]),
+        }
+
+manager = ConnectionManager()
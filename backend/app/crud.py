@@ -5,10 +5,11 @@ import os
 import shutil
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
+from sqlalchemy import func, select, union_all, literal, cast, Date, and_, or_, case, tuple_, insert, exists, false
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app import schemas
-from . import models, auth
+from . import models, auth, admin_models
 from datetime import date, datetime, timedelta, timezone
 from app.timezone_utils import now_ph, today_ph
 
@@ -505,6 +506,17 @@ def delete_inventory(db: Session, inventory_id: int, bakery_id: int):
     if item.image and os.path.exists(item.image):
         os.remove(item.image)
 
+    # Its direct donations are deleted with it (cascade); take the completed ones out of
+    # donation_totals. Donation requests survive the delete, so their totals stay.
+    for direct in item.direct_donations:
+        if _is_complete(direct.btracking_status):
+            for user_id in (item.bakery_id, direct.charity_id):
+                _bump_donation_totals(
+                    db, user_id, direct.creation_date or today_ph(),
+                    direct_count=-1,
+                    direct_quantity=-(direct.quantity or 0),
+                )
+
     # Delete from DB
     db.delete(item)
     db.commit()
@@ -809,32 +821,458 @@ def seed_badges(db: Session):
             db.add(badge)
     db.commit()
     
-# ------------------ Updates Badge Progress Every Donation Completion ------------------
-    
-def get_completed_donation_count(db: Session, user_id: int) -> int:
-    """Count all completed donations (direct + request) for a given user."""
-    # Direct donations where btracking_status == 'complete'
-    direct_count = (
-        db.query(models.DirectDonation)
-        .join(models.BakeryInventory, models.DirectDonation.bakery_inventory_id == models.BakeryInventory.id)
-        .filter(
-            models.BakeryInventory.bakery_id == user_id,
-            models.DirectDonation.btracking_status.ilike("complete")
+# ------------------ Donation Totals (rollup) ------------------
+
+def _is_complete(status) -> bool:
+    return (status or "").lower() == "complete"
+
+
+def _bump_donation_totals(db: Session, user_id: int, day: date, **deltas):
+    """Add the given deltas to the (user_id, day) rollup row, creating it if needed."""
+    if not user_id:
+        return
+
+    values = {
+        "request_count": 0,
+        "request_quantity": 0,
+        "direct_count": 0,
+        "direct_quantity": 0,
+    }
+    values.update(deltas)
+
+    table = models.DonationTotal.__table__
+    stmt = pg_insert(table).values(user_id=user_id, day=day, updated_at=now_ph(), **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.day],
+        set_={
+            **{key: table.c[key] + stmt.excluded[key] for key in values},
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    db.execute(stmt)
+
+
+def set_request_tracking_status(db: Session, request_obj: models.DonationRequest, tracking_status: str):
+    """
+    Set a donation request's tracking status and keep donation_totals in step.
+    The rollup row is written in the caller's transaction; commit is left to the caller.
+    """
+    was_complete = _is_complete(request_obj.tracking_status)
+    request_obj.tracking_status = tracking_status
+    now_complete = _is_complete(tracking_status)
+
+    if was_complete == now_complete:
+        return
+
+    sign = 1 if now_complete else -1
+    day = (request_obj.timestamp or now_ph()).date()
+    quantity = request_obj.donation_quantity or 0
+    for user_id in (request_obj.bakery_id, request_obj.charity_id):
+        _bump_donation_totals(
+            db, user_id, day,
+            request_count=sign,
+            request_quantity=sign * quantity,
+        )
+
+
+def set_direct_tracking_status(db: Session, donation: models.DirectDonation, btracking_status: str):
+    """
+    Set a direct donation's tracking status and keep donation_totals in step.
+    The rollup row is written in the caller's transaction; commit is left to the caller.
+    """
+    was_complete = _is_complete(donation.btracking_status)
+    donation.btracking_status = btracking_status
+    now_complete = _is_complete(btracking_status)
+
+    if was_complete == now_complete:
+        return
+
+    sign = 1 if now_complete else -1
+    day = donation.creation_date or today_ph()
+    quantity = donation.quantity or 0
+    bakery_id = donation.bakery_inventory.bakery_id if donation.bakery_inventory else None
+    for user_id in (bakery_id, donation.charity_id):
+        _bump_donation_totals(
+            db, user_id, day,
+            direct_count=sign,
+            direct_quantity=sign * quantity,
+        )
+
+
+def rebuild_donation_totals(db: Session) -> int:
+    """
+    Recompute donation_totals from donation_requests and direct_donations.
+    Used for the initial backfill and to repair drift. Returns the number of rows written.
+    """
+    zero = literal(0)
+    one = literal(1)
+    request_day = cast(models.DonationRequest.timestamp, Date)
+    request_complete = func.lower(models.DonationRequest.tracking_status) == "complete"
+    direct_complete = func.lower(models.DirectDonation.btracking_status) == "complete"
+
+    sources = [
+        select(
+            models.DonationRequest.bakery_id.label("user_id"), request_day.label("day"),
+            one.label("request_count"), func.coalesce(models.DonationRequest.donation_quantity, 0).label("request_quantity"),
+            zero.label("direct_count"), zero.label("direct_quantity"),
+        ).where(request_complete, models.DonationRequest.bakery_id.isnot(None)),
+        select(
+            models.DonationRequest.charity_id, request_day,
+            one, func.coalesce(models.DonationRequest.donation_quantity, 0),
+            zero, zero,
+        ).where(request_complete, models.DonationRequest.charity_id.isnot(None)),
+        select(
+            models.BakeryInventory.bakery_id, models.DirectDonation.creation_date,
+            zero, zero,
+            one, func.coalesce(models.DirectDonation.quantity, 0),
+        ).join(
+            models.BakeryInventory, models.DirectDonation.bakery_inventory_id == models.BakeryInventory.id
+        ).where(direct_complete),
+        select(
+            models.DirectDonation.charity_id, models.DirectDonation.creation_date,
+            zero, zero,
+            one, func.coalesce(models.DirectDonation.quantity, 0),
+        ).where(direct_complete, models.DirectDonation.charity_id.isnot(None)),
+    ]
+    completed = union_all(*sources).subquery()
+
+    rollup = select(
+        completed.c.user_id,
+        completed.c.day,
+        func.sum(completed.c.request_count),
+        func.sum(completed.c.request_quantity),
+        func.sum(completed.c.direct_count),
+        func.sum(completed.c.direct_quantity),
+        literal(now_ph()),
+    ).group_by(completed.c.user_id, completed.c.day)
+
+    table = models.DonationTotal.__table__
+    db.execute(table.delete())
+    result = db.execute(
+        table.insert().from_select(
+            ["user_id", "day", "request_count", "request_quantity",
+             "direct_count", "direct_quantity", "updated_at"],
+            rollup,
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+def seed_donation_totals(db: Session):
+    """Backfill donation_totals on first start (table empty but completed donations exist)."""
+    if db.query(models.DonationTotal.id).first():
+        return
+    rebuild_donation_totals(db)
+
+
+def get_donation_totals(db: Session, user_id: int) -> dict:
+    """Completed donation counts and quantities for one user, read from donation_totals."""
+    row = db.query(
+        func.coalesce(func.sum(models.DonationTotal.request_count), 0).label("request_count"),
+        func.coalesce(func.sum(models.DonationTotal.request_quantity), 0).label("request_quantity"),
+        func.coalesce(func.sum(models.DonationTotal.direct_count), 0).label("direct_count"),
+        func.coalesce(func.sum(models.DonationTotal.direct_quantity), 0).label("direct_quantity"),
+    ).filter(models.DonationTotal.user_id == user_id).one()
+
+    return {
+        "request_count": int(row.request_count),
+        "request_quantity": int(row.request_quantity),
+        "direct_count": int(row.direct_count),
+        "direct_quantity": int(row.direct_quantity),
+    }
+
+# ------------------ Conversations (chat list) ------------------
+
+def _visible_to(user_id: int):
+    """Messages not deleted for `user_id` on their side of the conversation."""
+    return and_(
+        or_(models.Message.sender_id != user_id, func.coalesce(models.Message.deleted_for_sender, False) == False),
+        or_(models.Message.receiver_id != user_id, func.coalesce(models.Message.deleted_for_receiver, False) == False),
+    )
+
+
+def _pair_filter(user_id: int, peer_id: int):
+    return or_(
+        and_(models.Message.sender_id == user_id, models.Message.receiver_id == peer_id),
+        and_(models.Message.sender_id == peer_id, models.Message.receiver_id == user_id),
+    )
+
+
+def _upsert_conversation(db: Session, user_id: int, peer_id: int, values: dict, unread_delta: int = None):
+    table = models.Conversation.__table__
+    stmt = pg_insert(table).values(user_id=user_id, peer_id=peer_id, **values)
+    set_ = {key: stmt.excluded[key] for key in values if key != "unread_count"}
+    if unread_delta is None:
+        set_["unread_count"] = stmt.excluded.unread_count
+    else:
+        set_["unread_count"] = table.c.unread_count + unread_delta
+    db.execute(stmt.on_conflict_do_update(index_elements=[table.c.user_id, table.c.peer_id], set_=set_))
+
+
+def record_message(db: Session, message: models.Message):
+    """
+    Update both sides' conversation rows for a newly added message.
+    The message must be flushed (have an id); commit is left to the caller.
+    """
+    activity = message.timestamp or now_ph()
+    sides = [(message.sender_id, message.receiver_id, 0)]
+    if message.receiver_id != message.sender_id:
+        sides.append((message.receiver_id, message.sender_id, 0 if message.is_read else 1))
+
+    for user_id, peer_id, unread in sides:
+        _upsert_conversation(
+            db, user_id, peer_id,
+            {"last_visible_message_id": message.id, "last_activity_at": activity, "unread_count": unread},
+            unread_delta=unread,
+        )
+
+
+def mark_conversation_read(db: Session, user_id: int, peer_id: int, read_count: int = None):
+    """
+    Lower the unread count after `user_id` read messages from `peer_id` (by read_count,
+    or to zero when not given). Commit is left to the caller.
+    """
+    if read_count is None:
+        unread = 0
+    else:
+        unread = func.greatest(models.Conversation.unread_count - read_count, 0)
+    db.query(models.Conversation).filter(
+        models.Conversation.user_id == user_id,
+        models.Conversation.peer_id == peer_id
+    ).update({models.Conversation.unread_count: unread}, synchronize_session=False)
+
+
+def get_message_history(db: Session, user_id: int, peer_id: int, before_id: int = None, limit: int = 50):
+    """
+    One page of the chat between two users, oldest first, skipping messages deleted for `user_id`.
+    Pages are keyed on (timestamp, id): pass the id of the oldest message already loaded
+    as before_id to get the page before it. Returns (messages, has_more).
+    """
+    query = db.query(models.Message).filter(_pair_filter(user_id, peer_id), _visible_to(user_id))
+
+    if before_id is not None:
+        anchor = db.query(models.Message.timestamp, models.Message.id).filter(models.Message.id == before_id).first()
+        if not anchor:
+            return [], False
+        query = query.filter(
+            tuple_(models.Message.timestamp, models.Message.id) < tuple_(anchor.timestamp, anchor.id)
         )
-        .count()
+
+    rows = (
+        query.order_by(models.Message.timestamp.desc(), models.Message.id.desc())
+        .limit(limit + 1)
+        .all()
     )
+    has_more = len(rows) > limit
+    return list(reversed(rows[:limit])), has_more
+
 
-    # Request donations where tracking_status == 'complete'
-    request_count = (
-        db.query(models.DonationRequest)
-        .filter(
-            models.DonationRequest.bakery_id == user_id,
-            models.DonationRequest.tracking_status.ilike("complete")
+def mark_history_read(db: Session, user_id: int, peer_id: int, up_to_id: int) -> int:
+    """
+    Mark the unread messages from `peer_id` to `user_id` with id <= up_to_id as read in a
+    single UPDATE and keep the conversation's unread count in step.
+    Returns the number of messages marked; commit is left to the caller.
+    """
+    marked = db.query(models.Message).filter(
+        models.Message.receiver_id == user_id,
+        models.Message.sender_id == peer_id,
+        models.Message.is_read == False,
+        models.Message.id <= up_to_id,
+        _visible_to(user_id)
+    ).update({models.Message.is_read: True}, synchronize_session=False)
+
+    if marked:
+        mark_conversation_read(db, user_id, peer_id, marked)
+    return marked
+
+
+def refresh_conversation(db: Session, user_id: int, peer_id: int):
+    """
+    Recompute one conversation row from the messages table.
+    Used after deletes, where the latest visible message may change.
+    """
+    last = (
+        db.query(models.Message.id, models.Message.timestamp)
+        .filter(_pair_filter(user_id, peer_id), _visible_to(user_id))
+        .order_by(models.Message.timestamp.desc(), models.Message.id.desc())
+        .first()
+    )
+    unread = db.query(func.count(models.Message.id)).filter(
+        models.Message.receiver_id == user_id,
+        models.Message.sender_id == peer_id,
+        models.Message.is_read == False,
+        _visible_to(user_id)
+    ).scalar()
+
+    _upsert_conversation(db, user_id, peer_id, {
+        "last_visible_message_id": last.id if last else None,
+        "last_activity_at": last.timestamp if last else None,
+        "unread_count": unread or 0,
+    })
+
+
+def rebuild_conversations(db: Session) -> int:
+    """
+    Recompute the conversations table from messages.
+    Used for the initial backfill and to repair drift. Returns the number of rows written.
+    """
+    m = models.Message
+    sides = union_all(
+        select(
+            m.sender_id.label("user_id"), m.receiver_id.label("peer_id"),
+            m.id.label("message_id"), m.timestamp.label("timestamp"), literal(0).label("unread"),
+        ).where(func.coalesce(m.deleted_for_sender, False) == False),
+        select(
+            m.receiver_id, m.sender_id,
+            m.id, m.timestamp, case((m.is_read == False, 1), else_=0),
+        ).where(func.coalesce(m.deleted_for_receiver, False) == False, m.receiver_id != m.sender_id),
+    ).subquery()
+
+    partition = (sides.c.user_id, sides.c.peer_id)
+    ranked = select(
+        sides.c.user_id,
+        sides.c.peer_id,
+        sides.c.message_id,
+        sides.c.timestamp,
+        func.sum(sides.c.unread).over(partition_by=partition).label("unread_count"),
+        func.row_number().over(
+            partition_by=partition,
+            order_by=(sides.c.timestamp.desc(), sides.c.message_id.desc())
+        ).label("rn"),
+    ).subquery()
+
+    latest = select(
+        ranked.c.user_id, ranked.c.peer_id, ranked.c.message_id, ranked.c.timestamp, ranked.c.unread_count
+    ).where(ranked.c.rn == 1, ranked.c.user_id.isnot(None), ranked.c.peer_id.isnot(None))
+
+    table = models.Conversation.__table__
+    db.execute(table.delete())
+    result = db.execute(
+        table.insert().from_select(
+            ["user_id", "peer_id", "last_visible_message_id", "last_activity_at", "unread_count"],
+            latest,
         )
-        .count()
     )
+    db.commit()
+    return result.rowcount
+
+
+def seed_conversations(db: Session):
+    """Backfill conversations on first start (table empty but messages exist)."""
+    if db.query(models.Conversation.id).first() or not db.query(models.Message.id).first():
+        return
+    rebuild_conversations(db)
+
+
+def get_conversations(db: Session, user_id: int):
+    """(conversation, last visible message, peer) rows for a user's chat list, most recent first."""
+    return (
+        db.query(models.Conversation, models.Message, models.User)
+        .join(models.Message, models.Message.id == models.Conversation.last_visible_message_id)
+        .join(models.User, models.User.id == models.Conversation.peer_id)
+        .filter(models.Conversation.user_id == user_id)
+        .order_by(models.Conversation.last_activity_at.desc(), models.Conversation.id.desc())
+        .all()
+    )
+
+
+def get_conversation_unread(db: Session, user_id: int, peer_id: int) -> int:
+    unread = db.query(models.Conversation.unread_count).filter(
+        models.Conversation.user_id == user_id,
+        models.Conversation.peer_id == peer_id
+    ).scalar()
+    return unread or 0
+
+# ------------------ System Notifications ------------------
+# Notifications for specific users get one NotificationReceipt per recipient when
+# sent. Broadcast (target_all) and role-targeted ones get none: they are matched
+# against the reader when the feed is read, and a receipt is written only when a
+# user marks one as read.
+
+def is_broadcast(notif) -> bool:
+    return bool(notif.target_all) or notif.target_role is not None
+
+
+def _broadcast():
+    N = admin_models.SystemNotification
+    return or_(N.target_all.is_(True), N.target_role.isnot(None))
+
+
+def broadcast_filter(user: models.User):
+    """SystemNotification criteria: broadcasts whose audience includes `user`."""
+    N = admin_models.SystemNotification
+    if not user.verified:
+        return false()
+    audience = N.target_role == user.role
+    if user.role != "Admin":
+        audience = or_(N.target_all.is_(True), audience)
+    criteria = [audience, N.send_in_app.isnot(False), N.sent_at.isnot(None)]
+    if user.created_at:
+        # Accounts created after a broadcast went out never received it
+        criteria.append(cast(N.sent_at, Date) >= user.created_at)
+    return and_(*criteria)
+
+
+def broadcast_audience(notif):
+    """User criteria: the audience of broadcast `notif` (same rules as broadcast_filter)."""
+    U = models.User
+    criteria = [U.verified == True]
+    if notif.target_all:
+        criteria.append(U.role != "Admin")
+    else:
+        criteria.append(U.role == notif.target_role)
+    if notif.sent_at:
+        criteria.append(or_(U.created_at.is_(None), U.created_at <= notif.sent_at.date()))
+    return and_(*criteria)
+
 
-    return direct_count + request_count
+def create_notification_receipts(db: Session, notification_id: int, user_ids):
+    """Receipts for a per-user notification, in one INSERT. The caller commits."""
+    rows = [
+        {"notification_id": notification_id, "user_id": user_id, "delivered_at": now_ph(), "is_read": False}
+        for user_id in dict.fromkeys(user_ids)
+    ]
+    if rows:
+        db.execute(insert(admin_models.NotificationReceipt).values(rows))
+
+
+def get_unread_system_notifications(db: Session, user: models.User):
+    """Unexpired SystemNotifications `user` has not read yet, oldest first."""
+    N, R = admin_models.SystemNotification, admin_models.NotificationReceipt
+    not_expired = or_(N.expires_at.is_(None), N.expires_at >= now_ph())
+
+    targeted = db.query(N).join(R, R.notification_id == N.id).filter(
+        R.user_id == user.id, R.is_read == False, ~_broadcast(), not_expired
+    )
+    already_read = exists().where(R.notification_id == N.id, R.user_id == user.id, R.is_read == True)
+    broadcasts = db.query(N).filter(_broadcast(), broadcast_filter(user), not_expired, ~already_read)
+
+    return targeted.union_all(broadcasts).order_by(N.id).all()
+
+
+def mark_system_notification_read(db: Session, notification_id: int, user: models.User):
+    """Mark a system notification read for `user`; returns read_at, or None if it is not theirs."""
+    N, R = admin_models.SystemNotification, admin_models.NotificationReceipt
+    receipt = db.query(R).filter(R.notification_id == notification_id, R.user_id == user.id).first()
+    if receipt is None:
+        targeted = db.query(N.id).filter(N.id == notification_id, _broadcast(), broadcast_filter(user)).first()
+        if targeted is None:
+            return None
+        receipt = R(notification_id=notification_id, user_id=user.id)
+        db.add(receipt)
+    receipt.is_read = True
+    receipt.read_at = now_ph()
+    db.commit()
+    return receipt.read_at
+
+
+# ------------------ Updates Badge Progress Every Donation Completion ------------------
+    
+def get_completed_donation_count(db: Session, user_id: int) -> int:
+    """Count all completed donations (direct + request) for a given user."""
+    totals = get_donation_totals(db, user_id)
+    return totals["request_count"] + totals["direct_count"]
 
 # ---------------- Helper ----------------
 def get_philippine_time():
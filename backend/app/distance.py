@@ -0,0 +1,50 @@
+"""
+Great-circle distance helpers shared by the geofence job, the charity
+notification feed and the available-donations feed.
+Use haversine() for a single pair and haversine_vector() to compute a whole
+result set in one call.
+"""
+
+import math
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+
+def haversine(lat1, lon1, lat2, lon2) -> float:
+    """Distance in km between two (lat, lon) points given in degrees."""
+    d_lat = math.radians(lat2 - lat1)
+    d_lon = math.radians(lon2 - lon1)
+    a = (
+        math.sin(d_lat / 2) ** 2
+        + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(d_lon / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _haversine_np(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Element-wise haversine over broadcastable arrays of degrees."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_vector(origins, destinations) -> np.ndarray:
+    """
+    Distances in km between paired points.
+
+    Args:
+        origins: (N, 2) array-like of (lat, lon), or a single (lat, lon) pair
+        destinations: (N, 2) array-like of (lat, lon), or a single (lat, lon) pair
+
+    Returns:
+        (N,) array where element i is the distance from origins[i] to destinations[i].
+        A single pair on either side is broadcast against the other.
+    """
+    origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+    destinations = np.asarray(destinations, dtype=float).reshape(-1, 2)
+    return _haversine_np(origins[:, 0], origins[:, 1], destinations[:, 0], destinations[:, 1])
+
@@ -0,0 +1,168 @@
+"""
+Transactional email outbox.
+
+Routes call enqueue_email(db, ...) instead of sending inline: the email becomes
+an `email_outbox` row in the same transaction as the change it belongs to, so it
+is sent if and only if that change commits, and the request returns without
+waiting on SMTP.
+
+A worker thread drains the table over the shared, reused SMTP connection
+(app/email_utils.smtp_client). It wakes right after a commit that queued email,
+and otherwise every EMAIL_OUTBOX_POLL_SECONDS for retries. Rows are claimed with
+SELECT ... FOR UPDATE SKIP LOCKED, so several workers/processes can run at once.
+
+Failed sends are retried with exponential backoff; after EMAIL_MAX_ATTEMPTS, or
+right away when the server rejects the message permanently (5xx), the row is
+marked "dead" and kept for inspection. Sent rows keep their headers only.
+Delivery is at least once: a crash between sending and committing the batch
+resends those emails.
+"""
+
+import os
+import smtplib
+import threading
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models import EmailOutbox
+from app.email_utils import build_message, smtp_client, smtp_configured
+from app.timezone_utils import now_ph
+
+EMAIL_OUTBOX_BATCH = int(os.getenv("EMAIL_OUTBOX_BATCH", "50"))
+EMAIL_OUTBOX_POLL_SECONDS = float(os.getenv("EMAIL_OUTBOX_POLL_SECONDS", "5"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+EMAIL_RETRY_BASE_SECONDS = int(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+EMAIL_RETRY_MAX_SECONDS = int(os.getenv("EMAIL_RETRY_MAX_SECONDS", "3600"))
+
+_QUEUED_KEY = "email_outbox_queued"
+
+
+def enqueue_email(db: Session, to_email: str, subject: str, html_content: str) -> EmailOutbox:
+    """Queue an email; it is sent after the caller commits `db` (and never if it rolls back)."""
+    email = EmailOutbox(to_email=to_email, subject=subject, html_content=html_content)
+    db.add(email)
+    return email
+
+
+def retry_delay(attempts: int) -> int:
+    """Seconds to wait before the next try after `attempts` failures."""
+    return min(EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1), EMAIL_RETRY_MAX_SECONDS)
+
+
+def _is_permanent(error: Exception) -> bool:
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500 \
+        and not isinstance(error, smtplib.SMTPAuthenticationError)
+
+
+class OutboxWorker:
+    def __init__(self):
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._warned = False
+
+    # ---------------- Public API ----------------
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+        smtp_client.close()
+
+    def wake(self):
+        self._wake.set()
+
+    # ---------------- Worker ----------------
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(EMAIL_OUTBOX_POLL_SECONDS)
+            self._wake.clear()
+            try:
+                while not self._stopped and self.process_batch() == EMAIL_OUTBOX_BATCH:
+                    pass
+            except Exception as e:
+                print(f"[EmailOutbox] ❌ Worker error: {e}")
+            smtp_client.close_if_idle()
+
+    def process_batch(self) -> int:
+        """Send up to EMAIL_OUTBOX_BATCH due emails; returns how many were claimed."""
+        if not smtp_configured():
+            if not self._warned:
+                print("[EmailOutbox] ⚠️ SMTP credentials not configured, emails stay queued")
+                self._warned = True
+            return 0
+
+        from app.database import SessionLocal
+        db = SessionLocal()
+        try:
+            now = now_ph()
+            batch = (
+                db.query(EmailOutbox)
+                .filter(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= now)
+                .order_by(EmailOutbox.id)
+                .limit(EMAIL_OUTBOX_BATCH)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            for email in batch:
+                self._send(email)
+            db.commit()
+            return len(batch)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _send(self, email: EmailOutbox):
+        try:
+            smtp_client.send(build_message(email.to_email, email.subject, email.html_content))
+        except Exception as e:
+            email.attempts = (email.attempts or 0) + 1
+            email.last_error = str(e)[:500]
+            if _is_permanent(e) or email.attempts >= EMAIL_MAX_ATTEMPTS:
+                email.status = "dead"
+                print(f"[EmailOutbox] ❌ Giving up on email {email.id} to {email.to_email}: {e}")
+            else:
+                email.next_attempt_at = now_ph() + timedelta(seconds=retry_delay(email.attempts))
+                print(f"[EmailOutbox] ⚠️ Email {email.id} to {email.to_email} failed (attempt {email.attempts}), retrying: {e}")
+            return
+        email.status = "sent"
+        email.sent_at = now_ph()
+        # Bodies can carry one-time passwords; only undelivered ones are kept
+        email.html_content = ""
+
+
+outbox_worker = OutboxWorker()
+
+
+# ------------------ Wake the worker after commit ------------------
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session, flush_context):
+    if any(isinstance(obj, EmailOutbox) for obj in session.new):
+        session.info[_QUEUED_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    if session.info.pop(_QUEUED_KEY, False):
+        outbox_worker.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(_QUEUED_KEY, None)
@@ -4,6 +4,8 @@ Handles all email-related functionality including SMTP configuration and email s
 """
 
 import smtplib
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Optional
@@ -19,11 +21,95 @@ SMTP_USER = os.getenv("SMTP_USER")  # Your Gmail address
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")  # App-specific password
 FROM_EMAIL = os.getenv("FROM_EMAIL", SMTP_USER)
 FRONTEND_URL = os.getenv("FRONTEND_URL")
+# SMTP_AUTH=0 skips STARTTLS and login (local relay or a test SMTP stub)
+SMTP_AUTH = os.getenv("SMTP_AUTH", "1").lower() not in ("0", "false", "no")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+# The connection is kept open between messages and closed after this much idle time
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", "60"))
+
+
+def smtp_configured() -> bool:
+    return not SMTP_AUTH or bool(SMTP_USER and SMTP_PASSWORD)
+
+
+def build_message(to_email: str, subject: str, html_content: str) -> MIMEMultipart:
+    message = MIMEMultipart("alternative")
+    message["Subject"] = subject
+    message["From"] = f"DoughNation <{FROM_EMAIL}>"
+    message["To"] = to_email
+    message.attach(MIMEText(html_content, "html"))
+    return message
+
+
+class SMTPClient:
+    """
+    One SMTP connection reused across messages, so STARTTLS and login happen once
+    per burst instead of once per email. Reconnects when the server has dropped it.
+    """
+
+    def __init__(self):
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        if SMTP_AUTH:
+            server.starttls()
+            server.login(SMTP_USER, SMTP_PASSWORD)
+        return server
+
+    def _reset(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+    def send(self, message: MIMEMultipart):
+        """Send one message; raises the smtplib error when it is refused."""
+        with self._lock:
+            if self._server is not None and time.monotonic() - self._last_used > SMTP_IDLE_SECONDS:
+                self._reset()
+            for attempt in (1, 2):
+                if self._server is None:
+                    self._server = self._connect()
+                try:
+                    self._server.send_message(message)
+                    self._last_used = time.monotonic()
+                    return
+                except smtplib.SMTPServerDisconnected:
+                    # Stale connection: reconnect once
+                    self._server = None
+                    if attempt == 2:
+                        raise
+                except smtplib.SMTPResponseException:
+                    raise
+                except OSError:
+                    # Network error mid-conversation; the connection is unusable
+                    self._reset()
+                    raise
+
+    def close_if_idle(self):
+        with self._lock:
+            if self._server is not None and time.monotonic() - self._last_used > SMTP_IDLE_SECONDS:
+                self._reset()
+
+    def close(self):
+        with self._lock:
+            self._reset()
+
+
+smtp_client = SMTPClient()
 
 
 def send_email(to_email: str, subject: str, html_content: str) -> bool:
     """
-    Send an email using SMTP
+    Send an email using SMTP, right away
+    
+    Use app.email_outbox.enqueue_email instead when the email goes with a database
+    change and the caller does not need to wait for delivery.
     
     Args:
         to_email: Recipient email address
@@ -33,29 +119,14 @@ def send_email(to_email: str, subject: str, html_content: str) -> bool:
     Returns:
         bool: True if sent successfully, False otherwise
     """
-    if not SMTP_USER or not SMTP_PASSWORD:
+    if not smtp_configured():
         print("⚠️  SMTP credentials not configured. Email not sent.")
         print(f"   Would have sent to: {to_email}")
         print(f"   Subject: {subject}")
         return False
     
     try:
-        # Create message
-        message = MIMEMultipart("alternative")
-        message["Subject"] = subject
-        message["From"] = f"DoughNation <{FROM_EMAIL}>"
-        message["To"] = to_email
-        
-        # Attach HTML content
-        html_part = MIMEText(html_content, "html")
-        message.attach(html_part)
-        
-        # Connect to SMTP server and send
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASSWORD)
-            server.send_message(message)
-        
+        smtp_client.send(build_message(to_email, subject, html_content))
         print(f"✅ Email sent successfully to {to_email}")
         return True
         
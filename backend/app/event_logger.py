@@ -2,15 +2,249 @@
 Helper utilities for logging system events and alerts.
 This module provides functions to create system event logs for security incidents,
 alerts, and system status changes.
+
+Events are written in the background: log_system_event only queues the row and
+returns, and a writer thread bulk-inserts queued rows every EVENT_LOG_FLUSH_MS
+or as soon as EVENT_LOG_BATCH_SIZE are waiting, on its own session. The caller's
+session and transaction are never touched.
+
+When the database cannot take a batch (or the queue is full) the rows are
+appended to a JSON-lines spool file (EVENT_LOG_SPOOL_PATH) and replayed by the
+next successful flush. A replay that fails part way leaves only the rows it did
+not write in the spool. Whatever is queued at shutdown is flushed by stop().
+
+EVENT_LOG_SYNC=1 writes each event immediately instead (still on its own session).
 """
 
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Callable
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from app.models import SystemEvent
-from datetime import datetime
-import json
-from typing import Optional, Dict, Any
 from app.timezone_utils import now_ph
 
+EVENT_LOG_FLUSH_MS = int(os.getenv("EVENT_LOG_FLUSH_MS", "500"))
+EVENT_LOG_BATCH_SIZE = int(os.getenv("EVENT_LOG_BATCH_SIZE", "200"))
+EVENT_LOG_QUEUE_SIZE = int(os.getenv("EVENT_LOG_QUEUE_SIZE", "10000"))
+EVENT_LOG_SPOOL_PATH = os.getenv(
+    "EVENT_LOG_SPOOL_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "system_events.spool.jsonl")
+)
+EVENT_LOG_SYNC = os.getenv("EVENT_LOG_SYNC", "0").lower() in ("1", "true", "yes")
+
+_COLUMNS = ("event_type", "description", "severity", "user_id", "timestamp", "event_metadata")
+
+
+# ------------------ Background writer ------------------
+
+class EventWriter:
+    def __init__(self):
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=EVENT_LOG_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()  # one flush / replay at a time
+        # Spool file access; separate so a request spooling on a full queue never waits for a DB write
+        self._spool_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self.stats = {"written": 0, "spooled": 0, "dropped": 0}
+
+    # ---------------- Public API ----------------
+    def start(self):
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the writer and flush everything still queued."""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def submit(self, row: dict):
+        if EVENT_LOG_SYNC:
+            self._write([row])
+            return
+        if not (self._thread and self._thread.is_alive()) and not self._stopped.is_set():
+            self.start()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # Never block the request; the row is replayed from the spool later
+            self._spool([row])
+
+    def flush(self):
+        """Write everything queued right now (used on shutdown and by the writer)."""
+        while True:
+            batch = self._drain(EVENT_LOG_BATCH_SIZE)
+            if not batch:
+                return
+            self._write(batch)
+
+    # ---------------- Internals ----------------
+    def _drain(self, limit: int) -> List[dict]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        interval = EVENT_LOG_FLUSH_MS / 1000
+        while not self._stopped.is_set():
+            try:
+                first = self._queue.get(timeout=interval)
+            except queue.Empty:
+                continue
+            # Wait up to one interval for the batch to fill, then write it
+            batch = [first]
+            deadline = time.monotonic() + interval
+            while len(batch) < EVENT_LOG_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stopped.is_set():
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, rows: List[dict]):
+        from app.database import SessionLocal
+
+        with self._lock:
+            db = SessionLocal()
+            try:
+                self._insert(db, rows)
+            except Exception as e:
+                db.rollback()
+                print(f"[EventLogger] ⚠️ Could not write {len(rows)} event(s), spooling: {e}")
+                self._spool(rows)
+                return
+            finally:
+                db.close()
+            self._replay_spool_locked()
+
+    def _insert(self, db: Session, rows: List[dict], progress: Optional[Callable[[int], None]] = None):
+        """
+        Bulk insert and commit `rows`; a row the database rejects (e.g. its user was deleted) is dropped.
+        `progress(n)` is called each time n more rows are committed or dropped.
+        """
+        try:
+            db.execute(insert(SystemEvent), rows)
+            db.commit()
+            self.stats["written"] += len(rows)
+            if progress:
+                progress(len(rows))
+            return
+        except IntegrityError:
+            db.rollback()
+        for row in rows:
+            try:
+                db.execute(insert(SystemEvent), [row])
+                db.commit()
+                self.stats["written"] += 1
+            except IntegrityError as e:
+                db.rollback()
+                self.stats["dropped"] += 1
+                print(f"[EventLogger] ❌ Dropped invalid event '{row['event_type']}': {e.orig}")
+            if progress:
+                progress(1)
+
+    @staticmethod
+    def _encode(rows: List[dict]) -> bytes:
+        return "".join(
+            json.dumps({**row, "timestamp": row["timestamp"].isoformat()}) + "\n" for row in rows
+        ).encode("utf-8")
+
+    def _spool(self, rows: List[dict]):
+        with self._spool_lock:
+            try:
+                with open(EVENT_LOG_SPOOL_PATH, "ab") as f:
+                    f.write(self._encode(rows))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.stats["spooled"] += len(rows)
+            except OSError as e:
+                self.stats["dropped"] += len(rows)
+                print(f"[EventLogger] ❌ Could not spool {len(rows)} event(s), dropped: {e}")
+
+    def _rewrite_spool(self, replayed_bytes: int, remaining: List[dict]):
+        """Replace the replayed head of the spool with `remaining`, keeping rows appended meanwhile."""
+        with self._spool_lock:
+            try:
+                with open(EVENT_LOG_SPOOL_PATH, "rb") as f:
+                    f.seek(replayed_bytes)
+                    appended = f.read()
+                if not remaining and not appended:
+                    os.remove(EVENT_LOG_SPOOL_PATH)
+                    return
+                tmp_path = EVENT_LOG_SPOOL_PATH + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(self._encode(remaining) + appended)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, EVENT_LOG_SPOOL_PATH)
+            except OSError as e:
+                print(f"[EventLogger] ❌ Could not rewrite the spool: {e}")
+
+    def _replay_spool_locked(self):
+        from app.database import SessionLocal
+
+        with self._spool_lock:
+            if not os.path.exists(EVENT_LOG_SPOOL_PATH):
+                return
+            with open(EVENT_LOG_SPOOL_PATH, "rb") as f:
+                data = f.read()
+
+        rows = []
+        for line in data.decode("utf-8", errors="replace").splitlines():
+            try:
+                row = json.loads(line)
+                row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+                rows.append({key: row.get(key) for key in _COLUMNS})
+            except (ValueError, KeyError, TypeError):
+                continue  # torn write from a crash
+
+        # Batches commit one by one, so count what is done; a failure keeps only the rest
+        done = 0
+
+        def progress(n):
+            nonlocal done
+            done += n
+
+        db = SessionLocal()
+        try:
+            for i in range(0, len(rows), EVENT_LOG_BATCH_SIZE):
+                self._insert(db, rows[i:i + EVENT_LOG_BATCH_SIZE], progress)
+        except Exception as e:
+            db.rollback()
+            print(f"[EventLogger] ⚠️ Spool replay failed after {done} event(s), will retry the rest: {e}")
+        finally:
+            db.close()
+        self._rewrite_spool(len(data), rows[done:])
+        if done == len(rows):
+            print(f"[EventLogger] ✅ Replayed {len(rows)} spooled event(s)")
+
+
+event_writer = EventWriter()
+# Scripts and workers killed without the FastAPI shutdown hook still flush
+atexit.register(event_writer.stop)
+
 
 def log_system_event(
     db: Session,
@@ -21,10 +255,11 @@ def log_system_event(
     metadata: Optional[Dict[str, Any]] = None
 ) -> SystemEvent:
     """
-    Log a system event to the database.
+    Queue a system event for the background writer and return immediately.
     
     Args:
-        db: Database session
+        db: Caller's database session (kept for compatibility; not used, the
+            event is written on the writer's own session)
         event_type: Type of event (e.g., "failed_login", "unauthorized_access", "sos_alert")
         description: Human-readable description of the event
         severity: Event severity level ("info", "warning", "critical")
@@ -32,7 +267,7 @@ def log_system_event(
         metadata: Additional data to store as JSON (optional)
     
     Returns:
-        The created SystemEvent object
+        The SystemEvent to be written (transient, so it has no id yet)
     
     Example:
         ```python
@@ -75,9 +310,7 @@ def log_system_event(
         event_metadata=json.dumps(metadata) if metadata else None
     )
     
-    db.add(event)
-    db.commit()
-    db.refresh(event)
+    event_writer.submit({column: getattr(event, column) for column in _COLUMNS})
     
     return event
 
@@ -0,0 +1,162 @@
+"""
+Event-driven scheduler for geofence notifications.
+
+Instead of sweeping every bakery on a fixed interval, bakeries are queued when
+something that affects their geofence notifications happens:
+- a donation is created or updated by check_threshold_and_create_donation
+- a charity's coordinates change
+- a wave boundary is reached (midnight, when the 2-day wave becomes the 1-day
+  wave, and the 9/12/15 o'clock re-notify times)
+
+A single worker thread keeps a priority queue of (run_at, bakery_id) and sleeps
+until the next entry is due, so idle periods cost nothing.
+"""
+
+import heapq
+import threading
+from datetime import datetime, timedelta, time
+from typing import Dict, List, Optional, Tuple
+
+from app.database import SessionLocal
+from app.models import User, Donation
+from app.timezone_utils import now_ph, PHILIPPINES_TZ
+from app.routes.cnotification import process_geofence_notifications
+from app.routes.geofence import bounding_box
+
+# Times of day at which unread geofence notifications are re-sent
+RENOTIFY_TIMES = [time(9, 0), time(12, 0), time(15, 0)]
+
+# A donation is in a wave 1 or 2 days before expiry; one expiring in 3 days joins at midnight
+WAVE_LOOKAHEAD_DAYS = 3
+
+# Widest geofence wave, in km
+MAX_WAVE_RADIUS_KM = 10
+
+
+def next_wave_boundary(now: datetime) -> datetime:
+    """Next re-notify time or midnight after `now`, in Philippines time."""
+    today = now.date()
+    candidates = [datetime.combine(today, t, tzinfo=PHILIPPINES_TZ) for t in RENOTIFY_TIMES]
+    candidates.append(datetime.combine(today + timedelta(days=1), time.min, tzinfo=PHILIPPINES_TZ))
+    return min(c for c in candidates if c > now)
+
+
+class GeofenceScheduler:
+    def __init__(self):
+        self._queue: List[Tuple[datetime, int]] = []
+        self._next_run: Dict[int, datetime] = {}  # bakery_id -> earliest queued run
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    # ---------------- Public API ----------------
+    def start(self):
+        """Start the worker thread and queue every bakery that currently has expiring donations."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="geofence-scheduler", daemon=True)
+        self._thread.start()
+
+        db = SessionLocal()
+        try:
+            for bakery_id in self._bakeries_with_upcoming_waves(db):
+                self.schedule(bakery_id)
+        finally:
+            db.close()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def schedule(self, bakery_id: int, run_at: Optional[datetime] = None):
+        """Queue a geofence evaluation for one bakery (immediately by default)."""
+        run_at = run_at or now_ph()
+        with self._cond:
+            queued = self._next_run.get(bakery_id)
+            if queued and queued <= run_at:
+                return
+            self._next_run[bakery_id] = run_at
+            heapq.heappush(self._queue, (run_at, bakery_id))
+            self._cond.notify()
+
+    def charity_moved(self, db, charity: User):
+        """Queue every bakery with expiring donations near a charity's (new) coordinates."""
+        if not (charity.latitude and charity.longitude):
+            return
+        min_lat, max_lat, min_lon, max_lon = bounding_box(charity.latitude, charity.longitude, MAX_WAVE_RADIUS_KM)
+        bakery_ids = self._bakeries_with_upcoming_waves(
+            db,
+            User.latitude.between(min_lat, max_lat),
+            User.longitude.between(min_lon, max_lon)
+        )
+        for bakery_id in bakery_ids:
+            self.schedule(bakery_id)
+
+    # ---------------- Internals ----------------
+    @staticmethod
+    def _bakeries_with_upcoming_waves(db, *filters):
+        today = now_ph().date()
+        rows = (
+            db.query(Donation.bakery_id)
+            .join(User, User.id == Donation.bakery_id)
+            .filter(
+                Donation.quantity > 0,
+                Donation.expiration_date > today,
+                Donation.expiration_date <= today + timedelta(days=WAVE_LOOKAHEAD_DAYS),
+                *filters
+            )
+            .distinct()
+            .all()
+        )
+        return [r[0] for r in rows]
+
+    def _pop_due(self) -> Optional[int]:
+        """Block until a bakery is due (or the scheduler stops) and return its id."""
+        with self._cond:
+            while not self._stopped:
+                if not self._queue:
+                    self._cond.wait()
+                    continue
+
+                run_at, bakery_id = self._queue[0]
+                if self._next_run.get(bakery_id) != run_at:
+                    # Superseded by an earlier entry for the same bakery
+                    heapq.heappop(self._queue)
+                    continue
+
+                delay = (run_at - now_ph()).total_seconds()
+                if delay > 0:
+                    self._cond.wait(timeout=delay)
+                    continue
+
+                heapq.heappop(self._queue)
+                del self._next_run[bakery_id]
+                return bakery_id
+        return None
+
+    def _run(self):
+        while True:
+            bakery_id = self._pop_due()
+            if bakery_id is None:
+                return
+
+            db = SessionLocal()
+            try:
+                process_geofence_notifications(db, bakery_id)
+
+                # Come back at the next wave boundary while the bakery still has expiring stock
+                has_upcoming = bakery_id in self._bakeries_with_upcoming_waves(db, Donation.bakery_id == bakery_id)
+                if has_upcoming:
+                    self.schedule(bakery_id, next_wave_boundary(now_ph()))
+            except Exception as e:
+                db.rollback()
+                print(f"[Geofence] ❌ Scheduled run failed for bakery {bakery_id}: {e}")
+            finally:
+                db.close()
+
+
+geofence_scheduler = GeofenceScheduler()
@@ -0,0 +1,110 @@
+"""
+Login admission control.
+
+Two sliding-window limits are checked before a login does any work:
+- failed attempts per identifier (email / employee id), reset by a successful login
+- attempts per client IP, successful or not (credential stuffing spreads over many identifiers)
+
+Counters live in memory, per worker process.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from fastapi import HTTPException, Request
+
+LOGIN_MAX_FAILURES = int(os.getenv("LOGIN_MAX_FAILURES", "10"))
+LOGIN_FAILURE_WINDOW = int(os.getenv("LOGIN_FAILURE_WINDOW_SECONDS", "900"))
+LOGIN_MAX_ATTEMPTS_PER_IP = int(os.getenv("LOGIN_MAX_ATTEMPTS_PER_IP", "60"))
+LOGIN_IP_WINDOW = int(os.getenv("LOGIN_IP_WINDOW_SECONDS", "300"))
+# Behind a reverse proxy, take the client IP from X-Forwarded-For (only enable when the proxy sets it)
+LOGIN_TRUST_FORWARDED_FOR = os.getenv("LOGIN_TRUST_FORWARDED_FOR", "0").lower() in ("1", "true", "yes")
+# Upper bound on tracked keys per limiter; the least recently used ones are dropped first
+MAX_TRACKED_KEYS = 100_000
+
+
+class SlidingWindowLimiter:
+    def __init__(self, limit: int, window: int, max_keys: int = MAX_TRACKED_KEYS):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._hits: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self, key: str, now: float):
+        hits = self._hits.get(key)
+        if hits is None:
+            return None
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        if not hits:
+            del self._hits[key]
+            return None
+        return hits
+
+    def retry_after(self, key: str) -> int:
+        """Seconds until `key` is allowed again; 0 when it is allowed now."""
+        if self.limit <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            hits = self._prune(key, now)
+            if hits is None or len(hits) < self.limit:
+                return 0
+            return max(1, int(hits[0] + self.window - now) + 1)
+
+    def hit(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            hits = self._prune(key, now)
+            if hits is None:
+                hits = self._hits[key] = deque()
+            hits.append(now)
+            self._hits.move_to_end(key)
+            while len(self._hits) > self.max_keys:
+                self._hits.popitem(last=False)
+
+    def reset(self, key: str):
+        with self._lock:
+            self._hits.pop(key, None)
+
+
+failures_by_identifier = SlidingWindowLimiter(LOGIN_MAX_FAILURES, LOGIN_FAILURE_WINDOW)
+attempts_by_ip = SlidingWindowLimiter(LOGIN_MAX_ATTEMPTS_PER_IP, LOGIN_IP_WINDOW)
+
+
+def client_ip(request: Request) -> str:
+    forwarded = request.headers.get("x-forwarded-for")
+    if LOGIN_TRUST_FORWARDED_FOR and forwarded:
+        return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def _too_many(retry_after: int):
+    return HTTPException(
+        status_code=429,
+        detail="Too many login attempts. Please try again later.",
+        headers={"Retry-After": str(retry_after)}
+    )
+
+
+def admit_login(request: Request, identifier: str):
+    """Raise 429 if this IP or identifier is over its limit; otherwise count the attempt."""
+    ip = client_ip(request)
+    identifier = (identifier or "").strip().lower()
+
+    wait = max(attempts_by_ip.retry_after(ip), failures_by_identifier.retry_after(identifier))
+    if wait:
+        print(f"[Login] ⛔ Throttled login for '{identifier}' from {ip} ({wait}s)")
+        raise _too_many(wait)
+    attempts_by_ip.hit(ip)
+
+
+def record_login_result(identifier: str, success: bool):
+    identifier = (identifier or "").strip().lower()
+    if success:
+        failures_by_identifier.reset(identifier)
+    else:
+        failures_by_identifier.hit(identifier)
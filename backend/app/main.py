@@ -7,7 +7,7 @@ from app.routes import (auth_routes, admin_routes, binventory_routes,
                         bdonation_routes, bnotification, cnotification, messages, charitydonation_routes,
                         direct_donation, CFeedback, BFeedback, Compute_TOT_Donations, complaint_routes, BReportGene, 
                         AdminReportGene, geofence, badges, RecentDonations, DashboardSearch, leaderboards, CReportGene,
-                        Messages1, leaderboard, superadmin_reports, superadmin_routes
+                        Messages1, leaderboard, superadmin_reports, superadmin_routes, notification_stream
                         )
 from app.database import engine, SessionLocal
 from app import models, crud, database, admin_models
@@ -15,20 +15,27 @@ from sqlalchemy.orm import Session
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from fastapi.staticfiles import StaticFiles
-from app.models import User
 from app.routes.binventory_routes import check_threshold_and_create_donation
-from app.routes.cnotification import process_geofence_notifications
+from app.geofence_scheduler import geofence_scheduler
+from app.event_logger import event_writer
+from app.email_outbox import outbox_worker
+from app.audit_export import audit_export_jobs
+from app.chat_manager import manager as chat_manager
+from app.notification_events import hub as notification_hub
+from app.principal_cache import principal_cache
 from fastapi_utils.tasks import repeat_every
 from app.crud import update_user_badges
-
-from apscheduler.schedulers.background import BackgroundScheduler
+from app import query_stats
 
 models.Base.metadata.create_all(bind=database.engine)
 
-app = FastAPI()
+# create_all skips tables that already exist, so indexes added to the models
+# later are created here (checkfirst: only the ones that are missing)
+for table in models.Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=database.engine, checkfirst=True)
 
-# Create scheduler
-scheduler = BackgroundScheduler()
+app = FastAPI()
 
 
 origins = [
@@ -44,6 +51,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in SQL query counting (QUERY_STATS=1), see app/query_stats.py
+if query_stats.QUERY_STATS_ENABLED:
+    query_stats.instrument_engine(engine)
+    app.add_middleware(query_stats.QueryStatsMiddleware)
+    app.include_router(query_stats.router)
+
 app.include_router(auth_routes.router)
 app.include_router(admin_routes.router)
 app.include_router(binventory_routes.router)
@@ -72,6 +85,7 @@ app.include_router(CReportGene.router)
 app.include_router(Messages1.router)
 app.include_router(superadmin_reports.router)
 app.include_router(superadmin_routes.router)
+app.include_router(notification_stream.router)
 
 @app.on_event("startup")
 def seed_admin():
@@ -80,6 +94,8 @@ def seed_admin():
     try:
         crud.seed_admin_user(db)
         crud.seed_badges(db)
+        crud.seed_donation_totals(db)
+        crud.seed_conversations(db)
     finally:
         db.close()
         
@@ -99,20 +115,61 @@ def auto_check_threshold_task() -> None:
     finally:
         db.close()
 
-def geofence_job():
-    db = SessionLocal()
-    try:
-        # Run for each bakery
-        bakeries = db.query(User).filter(User.role == "Bakery").all()
-        for bakery in bakeries:
-            process_geofence_notifications(db, bakery.id)
-    finally:
-        db.close()
+# Geofence notifications are event-driven (see app/geofence_scheduler.py)
+@app.on_event("startup")
+def start_geofence_scheduler():
+    geofence_scheduler.start()
+
+# Chat fan-out across workers (CHAT_BROKER, see app/chat_manager.py)
+@app.on_event("startup")
+async def start_chat_broker():
+    await chat_manager.start()
+
+@app.on_event("shutdown")
+async def stop_chat_broker():
+    await chat_manager.stop()
+
+# Notification push events (see app/notification_events.py)
+@app.on_event("startup")
+async def start_notification_hub():
+    await notification_hub.start()
 
-# Schedule it (every 5 minutes)
-scheduler.add_job(geofence_job, "interval", minutes=5)
-scheduler.start()
+@app.on_event("shutdown")
+async def stop_notification_hub():
+    await notification_hub.stop()
+
+# Cross-worker invalidation of cached auth principals (see app/principal_cache.py)
+@app.on_event("startup")
+async def start_principal_cache():
+    await principal_cache.start()
+
+@app.on_event("shutdown")
+async def stop_principal_cache():
+    await principal_cache.stop()
+
+# Background writer for system events (see app/event_logger.py)
+@app.on_event("startup")
+def start_event_writer():
+    event_writer.start()
+
+@app.on_event("shutdown")
+def stop_event_writer():
+    event_writer.stop()
+
+# Email outbox delivery (see app/email_outbox.py)
+@app.on_event("startup")
+def start_outbox_worker():
+    outbox_worker.start()
+
+@app.on_event("shutdown")
+def stop_outbox_worker():
+    outbox_worker.stop()
+
+# Audit log PDF export process pool (see app/audit_export.py)
+@app.on_event("shutdown")
+def stop_audit_export_jobs():
+    audit_export_jobs.shutdown()
 
 @app.on_event("shutdown")
 def shutdown_event():
-    scheduler.shutdown()
\ No newline at end of file
+    geofence_scheduler.stop()
\ No newline at end of file
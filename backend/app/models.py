@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, Date, DateTime, func, Enum, Text, TIMESTAMP
+from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, Date, DateTime, func, Enum, Text, TIMESTAMP, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime, date
@@ -8,6 +8,7 @@ from app.timezone_utils import now_ph
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (Index("ix_users_role_lat_lon", "role", "latitude", "longitude"),)  # geofence box lookups
 
     id = Column(Integer, primary_key=True, index=True)
     role = Column(String, nullable=False)  # Bakery, Charity, or Admin
@@ -89,7 +90,7 @@ class BakeryInventory(Base):
     image = Column(String, nullable=True)
     quantity = Column(Integer, nullable=False)
     creation_date = Column(Date, nullable=False)
-    expiration_date = Column(Date, nullable=True)
+    expiration_date = Column(Date, nullable=True, index=True)
     threshold = Column(Integer, nullable=False)
     uploaded = Column(String, nullable=False)
     description = Column(String, nullable=True)
@@ -101,6 +102,9 @@ class BakeryInventory(Base):
     donations = relationship("Donation", back_populates="inventory_item", cascade="all, delete-orphan") 
     direct_donations = relationship("DirectDonation", back_populates="bakery_inventory", cascade="all, delete-orphan")
 
+# Day an item enters the "soon" window; backs the incremental threshold scan
+Index("ix_bakery_inventory_soon_at", BakeryInventory.expiration_date - func.greatest(BakeryInventory.threshold, 1))
+
     
 class EmployeeRole(str, enum.Enum):
     """Employee roles with access control levels"""
@@ -221,8 +225,40 @@ class DirectDonation(Base):
     bakery_inventory = relationship("BakeryInventory")
     charity = relationship("User") 
 
+class DonationTotal(Base):
+    """Per-user, per-day rollup of completed donations (given for bakeries, received for charities)"""
+    __tablename__ = "donation_totals"
+    __table_args__ = (UniqueConstraint("user_id", "day", name="uq_donation_totals_user_day"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    day = Column(Date, nullable=False)  # DonationRequest.timestamp / DirectDonation.creation_date
+    request_count = Column(Integer, nullable=False, default=0)
+    request_quantity = Column(Integer, nullable=False, default=0)
+    direct_count = Column(Integer, nullable=False, default=0)
+    direct_quantity = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=now_ph, onupdate=now_ph)
+
+class ProductTemplate(Base):
+    """Bakery product templates, used instead of the per-bakery CSV when TEMPLATE_STORE=db"""
+    __tablename__ = "product_templates"
+    __table_args__ = (UniqueConstraint("bakery_id", "normalized_name", name="uq_product_templates_bakery_name"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    bakery_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    normalized_name = Column(String, nullable=False)  # lower-case, spaces removed
+    product_name = Column(String, nullable=False)
+    threshold = Column(Integer, nullable=False, default=0)
+    shelf_life_days = Column(Integer, nullable=False, default=0)
+    description = Column(String, default="")
+    image = Column(String, default="")
+
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Keyset pages of a conversation (see crud.get_message_history)
+        Index("ix_messages_pair_timestamp", "sender_id", "receiver_id", "timestamp", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -241,6 +277,33 @@ class Message(Base):
     sender = relationship("User", back_populates="sent_messages", foreign_keys=[sender_id])
     receiver = relationship("User", back_populates="received_messages", foreign_keys=[receiver_id])
 
+class ChatAttachment(Base):
+    """Chat media uploaded before the message that references it"""
+    __tablename__ = "chat_attachments"
+
+    id = Column(String, primary_key=True)  # uuid hex, returned to the uploader
+    uploader_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    file_url = Column(String, nullable=False)
+    content_type = Column(String, nullable=True)
+    size = Column(Integer, nullable=True)
+    message_id = Column(Integer, ForeignKey("messages.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, default=now_ph)
+
+class Conversation(Base):
+    """One row per (user, peer) chat as seen by `user`: its latest visible message and unread count"""
+    __tablename__ = "conversations"
+    __table_args__ = (
+        UniqueConstraint("user_id", "peer_id", name="uq_conversations_user_peer"),
+        Index("ix_conversations_user_activity", "user_id", "last_activity_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    peer_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    last_visible_message_id = Column(Integer, ForeignKey("messages.id", ondelete="SET NULL"), nullable=True)
+    last_activity_at = Column(DateTime, nullable=True)
+    unread_count = Column(Integer, nullable=False, default=0)
+
 class NotificationRead(Base):
     __tablename__ = "notification_reads"
 
@@ -364,6 +427,11 @@ class EmployeePasswordHistory(Base):
 
 class SystemEvent(Base):
     __tablename__ = "system_events"
+    __table_args__ = (
+        # Filtered keyset pages of the audit log (see superadmin_routes.get_audit_logs)
+        Index("ix_system_events_type_timestamp", "event_type", "timestamp", "id"),
+        Index("ix_system_events_user_timestamp", "user_id", "timestamp", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     event_type = Column(String, index=True, nullable=False)  # "failed_login", "unauthorized_access", "sos_alert", "geofence_breach", "uptime", "downtime"
@@ -375,6 +443,21 @@ class SystemEvent(Base):
     
     user = relationship("User", back_populates="events")
 
+class EmailOutbox(Base):
+    """Emails waiting for the outbox worker (app/email_outbox.py), written in the caller's transaction"""
+    __tablename__ = "email_outbox"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    html_content = Column(Text, nullable=False)
+    status = Column(String, default="pending", index=True)  # "pending", "sent", "dead"
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=now_ph, index=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=now_ph)
+    sent_at = Column(DateTime, nullable=True)
+
 class EmailVerification(Base):
     """Temporary storage for email verification OTPs during registration"""
     __tablename__ = "email_verifications"
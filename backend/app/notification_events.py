@@ -0,0 +1,448 @@
+"""
+Push delivery for the bakery and charity notification feeds.
+
+The feeds (/notifications/all, /notifications/charity) are fetched once when a
+page loads; afterwards the page listens on GET /notifications/stream (SSE) and
+applies incremental events instead of polling.
+
+Changes are picked up from the ORM: after each flush the rows that affect a feed
+(new, updated and deleted donations, direct donations, accepted requests,
+geofence hits, system notifications, inventory edits) are noted on the session, and after
+commit they are handed to the hub. The hub fans the change list out through the
+chat broker (so every worker sees it, see app/chat_manager.py) and each worker
+builds feed items for the subscribers it holds, on a worker thread with its own
+session. Nothing is built when nobody is listening.
+
+Events look like:
+    {"section": "donations", "item": {...same shape as the feed...}}
+    {"section": "donations", "removed": <donation_id>}   # drop it from that list
+    {"section": "products", "resync": true}    # refetch that section
+    {"section": "all", "resync": true}         # refetch the whole feed
+"""
+
+import asyncio
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, inspect, or_
+from sqlalchemy.orm import Session, joinedload
+
+from app import models, admin_models, crud
+from app.chat_manager import LocalBroker, create_broker
+from app.distance import haversine
+from app.timezone_utils import now_ph, today_ph
+
+NOTIFICATION_CHANNEL = os.getenv("NOTIFICATION_BROKER_CHANNEL", "notification_events")
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("NOTIFICATION_QUEUE_SIZE", "100"))
+# Changes per broker message, keeps Postgres NOTIFY payloads under their size limit
+PUBLISH_BATCH = 100
+
+_CHANGES_KEY = "notification_changes"
+
+
+# ------------------ Feed items ------------------
+# Shared with the feed endpoints so pushed items and fetched items have the same shape.
+
+def donation_item(donation, bakery, user_id: int, read: bool = False, distance_km=None) -> dict:
+    return {
+        "id": f"donation-{donation.id}-to-{user_id}",
+        "donation_id": donation.id,
+        "name": donation.name,
+        "quantity": donation.quantity,
+        "timestamp": donation.creation_date.isoformat(),
+        "read": read,
+        "bakery_name": bakery.name if bakery else "Unknown bakery",
+        "bakery_profile_picture": bakery.profile_picture if bakery else None,
+        "distance_km": None if read else distance_km
+    }
+
+
+def direct_donation_item(direct, bakery, user_id: int, read: bool = False) -> dict:
+    return {
+        "id": f"direct-{direct.id}-to-{user_id}",
+        "donation_id": direct.id,
+        "name": direct.name,
+        "quantity": direct.quantity,
+        "timestamp": now_ph().isoformat(),
+        "read": read,
+        "bakery_name": bakery.name if bakery else "Unknown bakery",
+        "bakery_profile_picture": bakery.profile_picture if bakery else None,
+        "type": "direct",
+        "message": f"{bakery.name if bakery else 'A bakery'} sent a donation"
+    }
+
+
+def accepted_request_item(request, bakery, user_id: int) -> dict:
+    return {
+        "id": f"request-{request.id}-to-{user_id}",
+        "request_id": request.id,
+        "donation_id": request.donation_id,
+        "inventory_id": request.bakery_inventory_id,
+        "name": request.donation_name,
+        "quantity": request.donation_quantity,
+        "timestamp": request.timestamp.isoformat(),
+        "read": False,
+        "bakery_name": request.bakery_name or (bakery.name if bakery else "A bakery"),
+        "bakery_profile_picture": request.bakery_profile_picture or (bakery.profile_picture if bakery else None),
+        "type": "request",
+        "status": request.status,
+        "message": f"{bakery.name if bakery else 'A bakery'} accepted your request"
+    }
+
+
+def geofence_item(notif_id: str, donation, bakery, read: bool = False, distance_km=None) -> dict:
+    return {
+        "id": int(donation.id),  # for frontend zoom
+        "notif_id": notif_id,  # for backend tracking
+        "type": "geofence",
+        "name": donation.name,
+        "quantity": donation.quantity,
+        "expiration_date": donation.expiration_date.isoformat(),
+        "bakery_name": bakery.name if bakery else "Unknown bakery",
+        "bakery_profile_picture": bakery.profile_picture if bakery else None,
+        "read": read,
+        "distance_km": distance_km
+    }
+
+
+def system_notification_item(notif, read: bool = False) -> dict:
+    return {
+        "id": f"system-{notif.id}",
+        "type": "system_notification",
+        "title": notif.title,
+        "message": notif.message,
+        "notification_type": notif.notification_type,
+        "priority": notif.priority,
+        "sent_at": notif.sent_at.isoformat() if notif.sent_at else None,
+        "read": read
+    }
+
+
+def _distance(a, b):
+    if a and b and a.latitude and a.longitude and b.latitude and b.longitude:
+        return round(haversine(a.latitude, a.longitude, b.latitude, b.longitude), 1)
+    return None
+
+
+# ------------------ Change tracking ------------------
+
+def _status_changed_to(obj, value) -> bool:
+    history = inspect(obj).attrs.status.history
+    return bool(history.added) and obj.status == value
+
+
+def _collect_changes(session: Session) -> List[tuple]:
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, models.Donation):
+            changes.append(("donation", obj.id))
+            changes.append(("products", obj.bakery_id))
+        elif isinstance(obj, models.DirectDonation):
+            changes.append(("direct_donation", obj.id))
+        elif isinstance(obj, models.BakeryInventory):
+            changes.append(("products", obj.bakery_id))
+        elif isinstance(obj, models.NotificationRead):
+            if (obj.notif_id or "").startswith("geofence-"):
+                changes.append(("geofence", obj.user_id, obj.notif_id))
+        elif isinstance(obj, admin_models.SystemNotification):
+            # Receipts are bulk-inserted in the same transaction; broadcasts have none
+            if obj.send_in_app is not False:
+                changes.append(("system", obj.id))
+
+    for obj in session.dirty:
+        if isinstance(obj, models.Donation):
+            # Claimed, used up or edited: charity feeds update or drop it
+            if session.is_modified(obj, include_collections=False):
+                changes.append(("donation_changed", obj.id))
+        elif isinstance(obj, models.DonationRequest):
+            if _status_changed_to(obj, "accepted"):
+                changes.append(("request_accepted", obj.id))
+        elif isinstance(obj, models.BakeryInventory):
+            if session.is_modified(obj, include_collections=False):
+                changes.append(("products", obj.bakery_id))
+        elif isinstance(obj, models.NotificationRead):
+            # Geofence re-notification resets read_at
+            if obj.read_at is None and (obj.notif_id or "").startswith("geofence-") \
+                    and inspect(obj).attrs.read_at.history.deleted:
+                changes.append(("geofence", obj.user_id, obj.notif_id))
+
+    for obj in session.deleted:
+        if isinstance(obj, models.Donation):
+            changes.append(("donation_removed", obj.id))
+        if isinstance(obj, (models.BakeryInventory, models.Donation)):
+            changes.append(("products", obj.bakery_id))
+    return changes
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session, flush_context):
+    changes = _collect_changes(session)
+    if changes:
+        session.info.setdefault(_CHANGES_KEY, []).extend(changes)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    changes = session.info.pop(_CHANGES_KEY, None)
+    if changes:
+        hub.publish_changes(list(dict.fromkeys(changes)))
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(_CHANGES_KEY, None)
+
+
+# ------------------ Building events ------------------
+
+def build_events(db: Session, changes: List[list], subscribers: Dict[int, str]) -> List[tuple]:
+    """(user_id, event) pairs for the subscribed users affected by `changes`."""
+    by_kind = defaultdict(list)
+    for kind, *args in changes:
+        by_kind[kind].append(args)
+
+    events = []
+    charity_ids = [uid for uid, role in subscribers.items() if (role or "").lower() == "charity"]
+    charities = {}
+    if charity_ids and (by_kind["donation"] or by_kind["donation_changed"] or by_kind["geofence"]):
+        charities = {
+            u.id: u for u in db.query(models.User).filter(models.User.id.in_(charity_ids))
+        }
+
+    # --- Bakery product notifications: cheap to recompute, so ask for a refetch ---
+    for bakery_id in {args[0] for args in by_kind["products"]}:
+        if bakery_id in subscribers:
+            events.append((bakery_id, {"section": "products", "resync": True}))
+
+    # --- New donations: every charity feed lists them ---
+    donation_ids = [args[0] for args in by_kind["donation"]]
+    if donation_ids and charity_ids:
+        rows = (
+            db.query(models.Donation, models.User)
+            .outerjoin(models.User, models.User.id == models.Donation.bakery_id)
+            .filter(models.Donation.id.in_(donation_ids), models.Donation.quantity > 0)
+            .all()
+        )
+        for donation, bakery in rows:
+            for charity_id in charity_ids:
+                item = donation_item(donation, bakery, charity_id, distance_km=_distance(bakery, charities.get(charity_id)))
+                events.append((charity_id, {"section": "donations", "item": item}))
+
+    # --- Updated / deleted donations: refresh or drop them from charity feeds ---
+    removed_ids = {args[0] for args in by_kind["donation_removed"]}
+    changed_ids = {args[0] for args in by_kind["donation_changed"]} - removed_ids
+    if charity_ids and (changed_ids or removed_ids):
+        today = today_ph()
+        rows = []
+        if changed_ids:
+            rows = (
+                db.query(models.Donation, models.User)
+                .outerjoin(models.User, models.User.id == models.Donation.bakery_id)
+                .filter(models.Donation.id.in_(changed_ids))
+                .all()
+            )
+        for donation, bakery in rows:
+            claimable = donation.quantity > 0 and (
+                donation.expiration_date is None or donation.expiration_date > today
+            )
+            for charity_id in charity_ids:
+                if claimable:
+                    item = donation_item(donation, bakery, charity_id, distance_km=_distance(bakery, charities.get(charity_id)))
+                    events.append((charity_id, {"section": "donations", "item": item}))
+                else:
+                    events.append((charity_id, {"section": "donations", "removed": donation.id}))
+
+        # Gone from the database: the feed would skip them in every section
+        for donation_id in removed_ids | (changed_ids - {donation.id for donation, _ in rows}):
+            for charity_id in charity_ids:
+                events.append((charity_id, {"section": "donations", "removed": donation_id}))
+                events.append((charity_id, {"section": "geofence_notifications", "removed": donation_id}))
+
+        # Geofence entries of updated donations are rebuilt with the hits below
+        if rows:
+            geofence_ids = {f"geofence-{donation.id}-to-{charity_id}" for donation, _ in rows for charity_id in charity_ids}
+            entries = db.query(models.NotificationRead.user_id, models.NotificationRead.notif_id).filter(
+                models.NotificationRead.user_id.in_(charity_ids),
+                models.NotificationRead.notif_id.in_(geofence_ids)
+            )
+            for user_id, notif_id in entries:
+                by_kind["geofence"].append([user_id, notif_id])
+
+    # --- Direct donations ---
+    direct_ids = [args[0] for args in by_kind["direct_donation"]]
+    if direct_ids:
+        rows = (
+            db.query(models.DirectDonation, models.User)
+            .outerjoin(models.BakeryInventory, models.BakeryInventory.id == models.DirectDonation.bakery_inventory_id)
+            .outerjoin(models.User, models.User.id == models.BakeryInventory.bakery_id)
+            .filter(models.DirectDonation.id.in_(direct_ids))
+            .all()
+        )
+        for direct, bakery in rows:
+            if direct.charity_id in subscribers:
+                item = direct_donation_item(direct, bakery, direct.charity_id)
+                events.append((direct.charity_id, {"section": "received_donations", "item": item}))
+
+    # --- Accepted requests ---
+    request_ids = [args[0] for args in by_kind["request_accepted"]]
+    if request_ids:
+        rows = (
+            db.query(models.DonationRequest, models.User)
+            .outerjoin(models.User, models.User.id == models.DonationRequest.bakery_id)
+            .filter(models.DonationRequest.id.in_(request_ids), models.DonationRequest.status == "accepted")
+            .all()
+        )
+        for request, bakery in rows:
+            if request.charity_id in subscribers:
+                item = accepted_request_item(request, bakery, request.charity_id)
+                events.append((request.charity_id, {"section": "received_donations", "item": item}))
+
+    # --- Geofence hits ("geofence-<donation_id>-to-<charity_id>") ---
+    hits = []
+    for user_id, notif_id in by_kind["geofence"]:
+        parts = notif_id.split("-")
+        if user_id in subscribers and len(parts) >= 4 and parts[1].isdigit():
+            hits.append((user_id, notif_id, int(parts[1])))
+    if hits:
+        read_at = {
+            (r.user_id, r.notif_id): r.read_at
+            for r in db.query(models.NotificationRead).filter(
+                models.NotificationRead.notif_id.in_({notif_id for _, notif_id, _ in hits})
+            )
+        }
+        rows = (
+            db.query(models.Donation, models.User)
+            .outerjoin(models.User, models.User.id == models.Donation.bakery_id)
+            .filter(models.Donation.id.in_({donation_id for _, _, donation_id in hits}))
+            .all()
+        )
+        donations = {donation.id: (donation, bakery) for donation, bakery in rows}
+        for user_id, notif_id, donation_id in hits:
+            if donation_id not in donations or (user_id, notif_id) not in read_at:
+                continue
+            donation, bakery = donations[donation_id]
+            item = geofence_item(
+                notif_id, donation, bakery,
+                read=read_at[(user_id, notif_id)] is not None,
+                distance_km=_distance(bakery, charities.get(user_id))
+            )
+            events.append((user_id, {"section": "geofence_notifications", "item": item}))
+
+    # --- System notifications ---
+    notif_ids = [args[0] for args in by_kind["system"]]
+    if notif_ids:
+        N, R = admin_models.SystemNotification, admin_models.NotificationReceipt
+        notifs = db.query(N).filter(
+            N.id.in_(notif_ids), or_(N.expires_at.is_(None), N.expires_at >= now_ph())
+        ).all()
+        targeted = [n.id for n in notifs if not crud.is_broadcast(n)]
+        if targeted:
+            receipts = db.query(R).options(joinedload(R.notification)).filter(
+                R.notification_id.in_(targeted), R.user_id.in_(list(subscribers))
+            ).all()
+            for receipt in receipts:
+                item = system_notification_item(receipt.notification, receipt.is_read)
+                events.append((receipt.user_id, {"section": "system_notifications", "item": item}))
+        for notif in notifs:
+            if not crud.is_broadcast(notif):
+                continue
+            audience = db.query(models.User.id).filter(
+                models.User.id.in_(list(subscribers)), crud.broadcast_audience(notif)
+            )
+            for (user_id,) in audience:
+                item = system_notification_item(notif)
+                events.append((user_id, {"section": "system_notifications", "item": item}))
+
+    return events
+
+
+def _build_events(changes, subscribers):
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        return build_events(db, changes, subscribers)
+    finally:
+        db.close()
+
+
+# ------------------ Hub ------------------
+
+class Subscription:
+    def __init__(self, user_id: int, role: str):
+        self.user_id = user_id
+        self.role = role
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def push(self, event: Optional[dict]):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # The client fell behind: drop what is queued and have it refetch the feed
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"section": "all", "resync": True})
+
+
+class NotificationHub:
+    def __init__(self, broker=None):
+        self.subscriptions: Dict[int, List[Subscription]] = {}
+        self.broker = broker or create_broker(channel=NOTIFICATION_CHANNEL)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Change batches are built one at a time so events keep commit order
+        self._build_lock = asyncio.Lock()
+
+    async def start(self):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            await self.broker.start(self._on_changes)
+
+    async def stop(self):
+        if self._loop is not None:
+            for subs in self.subscriptions.values():
+                for sub in subs:
+                    sub.push(None)  # ends the stream
+            await self.broker.stop()
+            self._loop = None
+
+    def subscribe(self, user_id: int, role: str) -> Subscription:
+        sub = Subscription(user_id, role)
+        self.subscriptions.setdefault(user_id, []).append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        subs = self.subscriptions.get(sub.user_id, [])
+        if sub in subs:
+            subs.remove(sub)
+        if not subs:
+            self.subscriptions.pop(sub.user_id, None)
+
+    def publish_changes(self, changes: List[tuple]):
+        """Called after commit, from any thread."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        if isinstance(self.broker, LocalBroker) and not self.subscriptions:
+            return
+        for i in range(0, len(changes), PUBLISH_BATCH):
+            batch = [list(c) for c in changes[i:i + PUBLISH_BATCH]]
+            loop.call_soon_threadsafe(
+                asyncio.ensure_future, self.broker.publish(0, {"changes": batch})
+            )
+
+    async def _on_changes(self, _user_id: int, message: dict):
+        if not self.subscriptions:
+            return
+        async with self._build_lock:
+            subscribers = {uid: subs[0].role for uid, subs in self.subscriptions.items() if subs}
+            try:
+                events = await asyncio.to_thread(_build_events, message.get("changes") or [], subscribers)
+            except Exception as e:
+                print(f"[Notifications] ❌ Failed to build events: {e}")
+                return
+        for user_id, evt in events:
+            for sub in list(self.subscriptions.get(user_id, [])):
+                sub.push(evt)
+
+
+hub = NotificationHub()
@@ -0,0 +1,164 @@
+"""
+Cache of authenticated principals for auth.get_current_user and friends.
+
+Every authenticated request used to decode the JWT and then SELECT the user or
+employee row. The row is now kept in a small TTL'd LRU keyed by
+(token type, subject):
+
+- users are cached as a snapshot of their columns and re-attached to the
+  request's session with Session.merge(load=False), so routes still get a
+  regular ORM instance (lazy loads and updates keep working) without a SELECT
+- employees are cached as the plain dict the auth helpers already return
+
+Entries are dropped whenever a User or Employee row is updated or deleted
+through the ORM (status, password, role, employee edits, ...). The invalidation
+is also published through the chat broker so other workers drop their copy;
+PRINCIPAL_CACHE_TTL bounds staleness for anything that bypasses the ORM.
+
+PRINCIPAL_CACHE_TTL=0 disables the cache.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app import models
+from app.chat_manager import create_broker
+
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "2048"))
+PRINCIPAL_CACHE_CHANNEL = os.getenv("PRINCIPAL_CACHE_CHANNEL", "principal_invalidations")
+
+_INVALIDATE_KEY = "principal_invalidations"
+
+
+class PrincipalCache:
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL, max_size: int = PRINCIPAL_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (expires_at, kind, id, value)
+        self._lock = threading.Lock()
+        self.broker = create_broker(channel=PRINCIPAL_CACHE_CHANNEL)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    # --- entries ---
+
+    def _get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[3]
+
+    def _put(self, key, kind: str, obj_id: int, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, kind, obj_id, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_user(self, db: Session, sub: str) -> Optional[models.User]:
+        """Cached user for a token subject, attached to `db`; None on a miss."""
+        values = self._get(("user", sub))
+        if values is None:
+            return None
+        user = models.User(**values)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
+    def put_user(self, sub: str, user: models.User):
+        values = {attr.key: getattr(user, attr.key) for attr in inspect(models.User).column_attrs}
+        self._put(("user", sub), "user", user.id, values)
+
+    def get_employee(self, employee_id) -> Optional[dict]:
+        value = self._get(("employee", str(employee_id)))
+        return dict(value) if value is not None else None
+
+    def put_employee(self, employee_id, principal: dict):
+        self._put(("employee", str(employee_id)), "employee", int(employee_id), dict(principal))
+
+    def invalidate(self, kind: str, obj_id: int):
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[1] == kind and entry[2] == obj_id]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # --- cross-worker invalidation ---
+
+    async def start(self):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            await self.broker.start(self._on_invalidate)
+
+    async def stop(self):
+        if self._loop is not None:
+            await self.broker.stop()
+            self._loop = None
+
+    async def _on_invalidate(self, _user_id: int, message: dict):
+        for kind, obj_id in message.get("keys") or []:
+            self.invalidate(kind, int(obj_id))
+
+    def publish_invalidations(self, keys):
+        """Drop `keys` here and on every other worker. Called after commit, from any thread."""
+        for kind, obj_id in keys:
+            self.invalidate(kind, obj_id)
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(
+                asyncio.ensure_future, self.broker.publish(0, {"keys": [list(k) for k in keys]})
+            )
+
+
+principal_cache = PrincipalCache()
+
+
+# ------------------ Invalidation hooks ------------------
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session, flush_context):
+    keys = set()
+    for obj in session.dirty:
+        if isinstance(obj, (models.User, models.Employee)) and session.is_modified(obj, include_collections=False):
+            keys.add(("user" if isinstance(obj, models.User) else "employee", obj.id))
+    for obj in session.deleted:
+        if isinstance(obj, models.User):
+            keys.add(("user", obj.id))
+        elif isinstance(obj, models.Employee):
+            keys.add(("employee", obj.id))
+    if keys:
+        session.info.setdefault(_INVALIDATE_KEY, set()).update(keys)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    keys = session.info.pop(_INVALIDATE_KEY, None)
+    if keys:
+        principal_cache.publish_invalidations(keys)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(_INVALIDATE_KEY, None)
@@ -0,0 +1,227 @@
+"""
+Opt-in per-request SQL instrumentation.
+
+Enable with QUERY_STATS=1. Every HTTP request then records how many statements
+it ran, how long they took and which statements were repeated (the usual sign
+of a query inside a loop). Results are returned in response headers:
+
+    X-DB-Query-Count   number of statements
+    X-DB-Time-Ms       total time spent in the database
+    X-DB-Max-Repeat    highest repeat count of a single statement
+
+and aggregated per route at GET /debug/query-stats (admins only; the route is
+only registered when QUERY_STATS=1).
+
+QUERY_BUDGET=<n> logs routes that run more than n statements; with
+QUERY_BUDGET_STRICT=1 such requests fail with a 500 instead, which makes a test
+run fail on a regression. Tests can also wrap code in `query_budget(n)`.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import auth
+
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS", "0").lower() in ("1", "true", "yes")
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "0"))  # 0 = no budget
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "0").lower() in ("1", "true", "yes")
+
+# A statement repeated this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("QUERY_STATS_REPEAT_THRESHOLD", "5"))
+
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"IN \((?:[^()]|\([^()]*\))*\)", re.IGNORECASE)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(statement: str) -> str:
+    """Statement with literals and IN lists collapsed, so repeats of the same query match."""
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _IN_LIST.sub("IN (?)", statement)
+    return _LITERAL.sub("?", statement)
+
+
+class RequestQueryStats:
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0  # seconds
+        self.statements = Counter()
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.db_time += elapsed
+        self.statements[fingerprint(statement)] += 1
+
+    @property
+    def max_repeat(self) -> int:
+        return max(self.statements.values(), default=0)
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD):
+        return [(s, n) for s, n in self.statements.most_common() if n >= threshold]
+
+
+_current: ContextVar[Optional[RequestQueryStats]] = ContextVar("query_stats", default=None)
+
+
+# ---------------- Engine hooks ----------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - start)
+
+
+def instrument_engine(engine: Engine):
+    """Attach the timing hooks to an engine (idempotent)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def track_queries():
+    """Collect stats for the statements run inside the block."""
+    stats = RequestQueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def query_budget(max_queries: int):
+    """Raise QueryBudgetExceeded if the block runs more than max_queries statements."""
+    with track_queries() as stats:
+        yield stats
+    if stats.count > max_queries:
+        raise QueryBudgetExceeded(
+            f"{stats.count} queries (budget {max_queries}); repeated: {stats.repeated(2)[:3]}"
+        )
+
+
+# ---------------- Per-route aggregates ----------------
+class RouteStatsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = defaultdict(lambda: {
+            "requests": 0,
+            "total_queries": 0,
+            "max_queries": 0,
+            "total_db_ms": 0.0,
+            "n_plus_one": Counter()
+        })
+
+    def add(self, route: str, stats: RequestQueryStats):
+        with self._lock:
+            entry = self._routes[route]
+            entry["requests"] += 1
+            entry["total_queries"] += stats.count
+            entry["max_queries"] = max(entry["max_queries"], stats.count)
+            entry["total_db_ms"] += stats.db_time * 1000
+            for statement, repeats in stats.repeated():
+                entry["n_plus_one"][statement] = max(entry["n_plus_one"][statement], repeats)
+
+    def snapshot(self):
+        with self._lock:
+            routes = []
+            for route, entry in self._routes.items():
+                routes.append({
+                    "route": route,
+                    "requests": entry["requests"],
+                    "avg_queries": round(entry["total_queries"] / entry["requests"], 1),
+                    "max_queries": entry["max_queries"],
+                    "avg_db_ms": round(entry["total_db_ms"] / entry["requests"], 2),
+                    "n_plus_one": [
+                        {"statement": s[:300], "max_repeats": n}
+                        for s, n in entry["n_plus_one"].most_common(5)
+                    ]
+                })
+        return sorted(routes, key=lambda r: r["max_queries"], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+route_stats = RouteStatsRegistry()
+
+
+# ---------------- ASGI middleware ----------------
+class QueryStatsMiddleware:
+    """Tracks the statements of each HTTP request and reports them in the response headers."""
+
+    def __init__(self, app, budget: int = QUERY_BUDGET, strict: bool = QUERY_BUDGET_STRICT):
+        self.app = app
+        self.budget = budget
+        self.strict = strict
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats()
+        token = _current.set(stats)
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                route = scope.get("route")
+                route_name = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+                route_stats.add(route_name, stats)
+
+                over_budget = self.budget and stats.count > self.budget
+                if over_budget:
+                    print(f"[QueryStats] ⚠️ {route_name} ran {stats.count} queries (budget {self.budget})")
+                    for statement, repeats in stats.repeated(2)[:3]:
+                        print(f"[QueryStats]    x{repeats}: {statement[:200]}")
+                    if self.strict:
+                        raise QueryBudgetExceeded(f"{route_name} ran {stats.count} queries (budget {self.budget})")
+
+                headers = list(message.get("headers", []))
+                headers += [
+                    (b"x-db-query-count", str(stats.count).encode()),
+                    (b"x-db-time-ms", f"{stats.db_time * 1000:.2f}".encode()),
+                    (b"x-db-max-repeat", str(stats.max_repeat).encode()),
+                ]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _current.reset(token)
+
+
+# ---------------- Debug endpoint ----------------
+router = APIRouter()
+
+
+@router.get("/debug/query-stats")
+def get_query_stats(reset: bool = False, current_admin=Depends(auth.get_current_admin)):
+    routes = route_stats.snapshot()
+    if reset:
+        route_stats.reset()
+    return {
+        "budget": QUERY_BUDGET or None,
+        "n_plus_one_threshold": N_PLUS_ONE_THRESHOLD,
+        "routes": routes
+    }
@@ -0,0 +1,120 @@
+"""
+Streaming CSV / NDJSON exports for report endpoints.
+
+Report endpoints take `format=json|csv|ndjson`. "json" keeps the usual response
+body. "csv" and "ndjson" return a StreamingResponse that writes rows as they are
+read: queries run on a server-side cursor (stream_results + yield_per), so a
+worker holds one batch of rows at a time no matter how long the export is, and
+the header goes out before the first batch is fetched.
+
+The rows are produced inside the response, after the endpoint's request-scoped
+session is gone, so each export opens its own session (and closes it when the
+stream ends or the client disconnects).
+"""
+
+import csv
+import heapq
+import io
+import json
+import os
+from typing import Callable, Iterable, Iterator, List
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Query, Session
+
+from app.timezone_utils import now_ph
+
+# Rows fetched per round trip on the server-side cursor
+EXPORT_BATCH_SIZE = int(os.getenv("REPORT_EXPORT_BATCH_SIZE", "500"))
+# Encoded bytes buffered before a chunk is written to the socket
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+# Query(...) pattern for the `format` parameter
+FORMAT_PATTERN = "^(json|csv|ndjson)$"
+
+_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+def stream(query: Query, batch_size: int = EXPORT_BATCH_SIZE) -> Query:
+    """Run `query` on a server-side cursor, fetching `batch_size` rows at a time."""
+    # Query.yield_per (rather than the execution option) also turns off the legacy
+    # row uniquing that joined eager loads would otherwise require
+    return query.yield_per(batch_size).execution_options(stream_results=True)
+
+
+def merge_newest_first(*sources: Iterable[tuple]) -> Iterator[dict]:
+    """Merge (sort_key, row) streams that are each ordered newest first."""
+    for _key, row in heapq.merge(*sources, key=lambda item: item[0], reverse=True):
+        yield row
+
+
+def _csv_chunks(rows: Iterable[dict], columns: List[str]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    # The header goes out right away
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _ndjson_chunks(rows: Iterable[dict]) -> Iterator[str]:
+    lines, size = [], 0
+    for row in rows:
+        line = json.dumps(row, default=str) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield "".join(lines)
+            lines, size = [], 0
+    if lines:
+        yield "".join(lines)
+
+
+def export_response(
+    fmt: str,
+    filename: str,
+    columns: List[str],
+    rows: Callable[[Session], Iterable[dict]],
+) -> StreamingResponse:
+    """
+    Stream `rows(db)` as CSV or NDJSON.
+
+    `rows` is called with a fresh session once the response starts; it should
+    build its queries with stream() and yield one dict per row.
+    """
+    def body():
+        from app.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            produced = rows(db)
+            chunks = _csv_chunks(produced, columns) if fmt == "csv" else _ndjson_chunks(produced)
+            for chunk in chunks:
+                yield chunk.encode("utf-8")
+        except Exception as e:
+            # Headers are already sent; the truncated body is all the client gets
+            print(f"[Export] ❌ {filename} export failed: {e}")
+            raise
+        finally:
+            db.close()
+
+    stamp = now_ph().strftime("%Y%m%d-%H%M%S")
+    return StreamingResponse(
+        body(),
+        media_type=_MEDIA_TYPES[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}-{stamp}.{fmt}"',
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
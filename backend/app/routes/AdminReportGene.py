@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import desc
 from datetime import datetime, date
-from app import database, models, auth
+from app import database, models, auth, report_export
 from app.timezone_utils import today_ph, get_day_start_ph, get_day_end_ph, to_ph_timezone
 
 router = APIRouter(
@@ -103,11 +103,94 @@ def manage_users_report(
     } 
 
 
+def _donation_queries(db: Session, start_datetime, end_datetime):
+    """(donation request query, direct donation query) for donations completed in the range, newest first."""
+    # Query ONLY COMPLETED donation requests (tracking_status = "complete")
+    donation_requests = (
+        db.query(models.DonationRequest)
+        .options(joinedload(models.DonationRequest.bakery), joinedload(models.DonationRequest.charity))
+        .filter(models.DonationRequest.tracking_status == "complete")
+        .filter(models.DonationRequest.tracking_completed_at >= start_datetime)
+        .filter(models.DonationRequest.tracking_completed_at <= end_datetime)
+        .order_by(desc(models.DonationRequest.tracking_completed_at))
+    )
+
+    # Query ONLY COMPLETED direct donations (btracking_status = "complete")
+    direct_donations = (
+        db.query(models.DirectDonation)
+        .options(
+            joinedload(models.DirectDonation.bakery_inventory).joinedload(models.BakeryInventory.bakery),
+            joinedload(models.DirectDonation.charity)
+        )
+        .filter(models.DirectDonation.btracking_status == "complete")
+        .filter(models.DirectDonation.btracking_completed_at >= start_datetime)
+        .filter(models.DirectDonation.btracking_completed_at <= end_datetime)
+        .order_by(desc(models.DirectDonation.btracking_completed_at))
+    )
+    return donation_requests, direct_donations
+
+
+def _request_donation_row(req):
+    # Get donor (bakery) name
+    donor_name = req.bakery.name if req.bakery else "Unknown"
+    
+    # Get receiver (charity) name
+    receiver_name = req.charity.name if req.charity else "Unknown"
+
+    return {
+        "id": req.id,
+        "type": "Request",
+        "donation_name": req.donation_name or "N/A",
+        "donor_name": donor_name,
+        "receiver_name": receiver_name,
+        "quantity": req.donation_quantity or 0,
+        "status": req.status,
+        "tracking_status": req.tracking_status,
+        "is_completed": True,  # Always true since we're filtering completed
+        "completed_at": to_ph_iso(req.tracking_completed_at),
+        "timestamp": to_ph_iso(req.tracking_completed_at),
+        "expiration_date": req.donation_expiration.isoformat() if req.donation_expiration else None,
+    }
+
+
+def _direct_donation_row(dd):
+    # Get donor (bakery) name from inventory relationship
+    donor_name = "Unknown"
+    if dd.bakery_inventory and dd.bakery_inventory.bakery:
+        donor_name = dd.bakery_inventory.bakery.name
+    elif dd.donated_by:
+        donor_name = dd.donated_by
+
+    # Get receiver (charity) name
+    receiver_name = dd.charity.name if dd.charity else "Unknown"
+
+    return {
+        "id": dd.id,
+        "type": "Direct",
+        "donation_name": dd.name,
+        "donor_name": donor_name,
+        "receiver_name": receiver_name,
+        "quantity": dd.quantity or 0,
+        "tracking_status": dd.btracking_status,
+        "is_completed": True,  # Always true since we're filtering completed
+        "completed_at": to_ph_iso(dd.btracking_completed_at),
+        "timestamp": to_ph_iso(dd.btracking_completed_at),
+        "expiration_date": dd.expiration_date.isoformat() if dd.expiration_date else None,
+    }
+
+
+DONATION_COLUMNS = [
+    "id", "type", "donation_name", "donor_name", "receiver_name", "quantity",
+    "status", "tracking_status", "is_completed", "completed_at", "timestamp", "expiration_date",
+]
+
+
 @router.get("/donation_list")
 def donation_list_report(
     start_date: date = Query(..., description="Start date (YYYY-MM-DD)"),
     end_date: date = Query(..., description="End date (YYYY-MM-DD)"),
     db: Session = Depends(database.get_db),
+    export_format: str = Query("json", alias="format", pattern=report_export.FORMAT_PATTERN),
     current_user: models.User = Depends(check_admin),
 ):
     # Validate date range
@@ -121,86 +204,27 @@ def donation_list_report(
     start_datetime = get_day_start_ph(start_date)
     end_datetime = get_day_end_ph(end_date)
 
-    # Query ONLY COMPLETED donation requests (tracking_status = "complete")
-    donation_requests = (
-        db.query(models.DonationRequest)
-        .filter(models.DonationRequest.tracking_status == "complete")
-        .filter(models.DonationRequest.tracking_completed_at >= start_datetime)
-        .filter(models.DonationRequest.tracking_completed_at <= end_datetime)
-        .order_by(desc(models.DonationRequest.tracking_completed_at))
-        .all()
-    )
+    # CSV / NDJSON: stream both sources newest first straight off the cursor
+    if export_format != "json":
+        def rows(export_db):
+            donation_requests, direct_donations = _donation_queries(export_db, start_datetime, end_datetime)
+            return report_export.merge_newest_first(
+                ((req.tracking_completed_at, _request_donation_row(req))
+                 for req in report_export.stream(donation_requests)),
+                ((dd.btracking_completed_at, _direct_donation_row(dd))
+                 for dd in report_export.stream(direct_donations)),
+            )
+        return report_export.export_response(export_format, "donation_list", DONATION_COLUMNS, rows)
 
-    # Query ONLY COMPLETED direct donations (btracking_status = "complete")
-    direct_donations = (
-        db.query(models.DirectDonation)
-        .filter(models.DirectDonation.btracking_status == "complete")
-        .filter(models.DirectDonation.btracking_completed_at >= start_datetime)
-        .filter(models.DirectDonation.btracking_completed_at <= end_datetime)
-        .order_by(desc(models.DirectDonation.btracking_completed_at))
-        .all()
-    )
+    donation_requests, direct_donations = _donation_queries(db, start_datetime, end_datetime)
 
     # Process donation requests
-    request_data = []
-    request_total_quantity = 0
-
-    for req in donation_requests:
-        # Get donor (bakery) name
-        donor_name = req.bakery.name if req.bakery else "Unknown"
-        
-        # Get receiver (charity) name
-        receiver_name = req.charity.name if req.charity else "Unknown"
-        
-        quantity = req.donation_quantity or 0
-        request_total_quantity += quantity
-
-        request_data.append({
-            "id": req.id,
-            "type": "Request",
-            "donation_name": req.donation_name or "N/A",
-            "donor_name": donor_name,
-            "receiver_name": receiver_name,
-            "quantity": quantity,
-            "status": req.status,
-            "tracking_status": req.tracking_status,
-            "is_completed": True,  # Always true since we're filtering completed
-            "completed_at": to_ph_iso(req.tracking_completed_at),
-            "timestamp": to_ph_iso(req.tracking_completed_at),
-            "expiration_date": req.donation_expiration.isoformat() if req.donation_expiration else None,
-        })
+    request_data = [_request_donation_row(req) for req in donation_requests.all()]
+    request_total_quantity = sum(row["quantity"] for row in request_data)
 
     # Process direct donations
-    direct_data = []
-    direct_total_quantity = 0
-
-    for dd in direct_donations:
-        # Get donor (bakery) name from inventory relationship
-        donor_name = "Unknown"
-        if dd.bakery_inventory and dd.bakery_inventory.bakery:
-            donor_name = dd.bakery_inventory.bakery.name
-        elif dd.donated_by:
-            donor_name = dd.donated_by
-
-        # Get receiver (charity) name
-        receiver_name = dd.charity.name if dd.charity else "Unknown"
-        
-        quantity = dd.quantity or 0
-        direct_total_quantity += quantity
-
-        direct_data.append({
-            "id": dd.id,
-            "type": "Direct",
-            "donation_name": dd.name,
-            "donor_name": donor_name,
-            "receiver_name": receiver_name,
-            "quantity": quantity,
-            "tracking_status": dd.btracking_status,
-            "is_completed": True,  # Always true since we're filtering completed
-            "completed_at": to_ph_iso(dd.btracking_completed_at),
-            "timestamp": to_ph_iso(dd.btracking_completed_at),
-            "expiration_date": dd.expiration_date.isoformat() if dd.expiration_date else None,
-        })
+    direct_data = [_direct_donation_row(dd) for dd in direct_donations.all()]
+    direct_total_quantity = sum(row["quantity"] for row in direct_data)
 
     # Combine all completed donations
     all_donations = request_data + direct_data
@@ -2,9 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func
 from app.database import get_db
-from app import database, models, auth
+from app import database, models, auth, report_export
 from datetime import datetime, timedelta
 from app.timezone_utils import now_ph, today_ph
+from app.routes.binventory_routes import effective_inventory_status_expr
 
 router = APIRouter(
     prefix="/reports",
@@ -18,25 +19,34 @@ def check_bakery_or_employee(current_auth = Depends(auth.get_current_user_or_emp
 
 from sqlalchemy.orm import joinedload
 
-@router.get("/donation_history")
-def donation_history(
-    start_date: str | None = Query(None, description="Start date (YYYY-MM-DD)"),
-    end_date: str | None = Query(None, description="End date (YYYY-MM-DD)"),
-    db: Session = Depends(get_db),
-    auth_data = Depends(check_bakery_or_employee),  # Allow bakeries and employees
-):
-    current_auth, bakery_id = auth_data
-    results = []
+def _request_history_row(d):
+    return {
+        "id": d.id,
+        "type": "request",
+        "completed_at": d.tracking_completed_at.strftime("%m-%d-%Y") if d.tracking_completed_at else None,
+        "product_name": (
+            d.donation_name or (d.inventory_item.name if d.inventory_item else "Unknown")
+        ),
+        "quantity": d.donation_quantity or 0,
+        "charity_name": d.charity.name if d.charity else "Unknown",
+        "donated_by": d.rdonated_by or "Unknown",
+    }
 
-    # Parse date filters if provided
-    date_start = None
-    date_end = None
-    from app.timezone_utils import PHILIPPINES_TZ
-    if start_date:
-        date_start = datetime.strptime(start_date, "%Y-%m-%d").replace(tzinfo=PHILIPPINES_TZ)
-    if end_date:
-        date_end = datetime.strptime(end_date, "%Y-%m-%d").replace(tzinfo=PHILIPPINES_TZ)
+def _direct_history_row(d):
+    return {
+        "id": d.id,
+        "type": "direct",
+        "completed_at": d.btracking_completed_at.strftime("%m-%d-%Y") if d.btracking_completed_at else None,
+        "product_name": d.name or "Unknown",
+        "quantity": d.quantity or 0,
+        "charity_name": d.charity.name if d.charity else "Unknown",
+        "donated_by": d.donated_by or "Unknown",  
+    }
 
+HISTORY_COLUMNS = ["id", "type", "completed_at", "product_name", "quantity", "charity_name", "donated_by"]
+
+def _history_queries(db: Session, bakery_id: int, date_start=None, date_end=None):
+    """(donation request query, direct donation query) for a bakery's completed donations."""
     # For bakeries — donations they sent
     query_requests = db.query(models.DonationRequest).filter(
         models.DonationRequest.bakery_id == bakery_id,
@@ -54,13 +64,9 @@ def donation_history(
             func.date(models.DonationRequest.tracking_completed_at) <= date_end
         )
     
-    donation_requests = (
-        query_requests
-        .options(
-            joinedload(models.DonationRequest.charity),
-            joinedload(models.DonationRequest.inventory_item)
-        )
-        .all()
+    query_requests = query_requests.options(
+        joinedload(models.DonationRequest.charity),
+        joinedload(models.DonationRequest.inventory_item)
     )
 
     query_direct = (
@@ -83,40 +89,57 @@ def donation_history(
             func.date(models.DirectDonation.btracking_completed_at) <= date_end
         )
     
-    direct_donations = (
-        query_direct
-        .options(
-            joinedload(models.DirectDonation.charity),
-            joinedload(models.DirectDonation.bakery_inventory)
-        )
-        .all()
+    query_direct = query_direct.options(
+        joinedload(models.DirectDonation.charity),
+        joinedload(models.DirectDonation.bakery_inventory)
     )
+    return query_requests, query_direct
+
+@router.get("/donation_history")
+def donation_history(
+    start_date: str | None = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: str | None = Query(None, description="End date (YYYY-MM-DD)"),
+    export_format: str = Query("json", alias="format", pattern=report_export.FORMAT_PATTERN),
+    db: Session = Depends(get_db),
+    auth_data = Depends(check_bakery_or_employee),  # Allow bakeries and employees
+):
+    current_auth, bakery_id = auth_data
+    results = []
+
+    # Parse date filters if provided
+    date_start = None
+    date_end = None
+    from app.timezone_utils import PHILIPPINES_TZ
+    if start_date:
+        date_start = datetime.strptime(start_date, "%Y-%m-%d").replace(tzinfo=PHILIPPINES_TZ)
+    if end_date:
+        date_end = datetime.strptime(end_date, "%Y-%m-%d").replace(tzinfo=PHILIPPINES_TZ)
+
+    # CSV / NDJSON: stream both sources newest first straight off the cursor
+    if export_format != "json":
+        def rows(export_db):
+            query_requests, query_direct = _history_queries(export_db, bakery_id, date_start, date_end)
+            requests_newest = report_export.stream(
+                query_requests.order_by(models.DonationRequest.tracking_completed_at.desc())
+            )
+            direct_newest = report_export.stream(
+                query_direct.order_by(models.DirectDonation.btracking_completed_at.desc())
+            )
+            return report_export.merge_newest_first(
+                ((d.tracking_completed_at, _request_history_row(d)) for d in requests_newest),
+                ((d.btracking_completed_at, _direct_history_row(d)) for d in direct_newest),
+            )
+        return report_export.export_response(export_format, "donation_history", HISTORY_COLUMNS, rows)
+
+    query_requests, query_direct = _history_queries(db, bakery_id, date_start, date_end)
 
     # Add donation requests
-    for d in donation_requests:
-        results.append({
-            "id": d.id,
-            "type": "request",
-            "completed_at": d.tracking_completed_at.strftime("%m-%d-%Y") if d.tracking_completed_at else None,
-            "product_name": (
-                d.donation_name or (d.inventory_item.name if d.inventory_item else "Unknown")
-            ),
-            "quantity": d.donation_quantity or 0,
-            "charity_name": d.charity.name if d.charity else "Unknown",
-            "donated_by": d.rdonated_by or "Unknown",
-        })
+    for d in query_requests.all():
+        results.append(_request_history_row(d))
 
     # Add direct donations
-    for d in direct_donations:
-        results.append({
-            "id": d.id,
-            "type": "direct",
-            "completed_at": d.btracking_completed_at.strftime("%m-%d-%Y") if d.btracking_completed_at else None,
-            "product_name": d.name or "Unknown",
-            "quantity": d.quantity or 0,
-            "charity_name": d.charity.name if d.charity else "Unknown",
-            "donated_by": d.donated_by or "Unknown",  
-        })
+    for d in query_direct.all():
+        results.append(_direct_history_row(d))
 
     # Sort latest first
     results.sort(key=lambda x: x["completed_at"], reverse=True)
@@ -484,7 +507,7 @@ def period_summary(
     available_total = (
         db.query(func.sum(models.BakeryInventory.quantity))
         .filter(models.BakeryInventory.bakery_id == bakery_id)
-        .filter(models.BakeryInventory.status == "available")
+        .filter(effective_inventory_status_expr(today_ph()) == "available")
         .filter(models.BakeryInventory.expiration_date >= period_start,
                 models.BakeryInventory.expiration_date < period_end_inclusive)
         .scalar() or 0
@@ -613,7 +636,7 @@ def weekly_summary(
     available_total = (
         db.query(func.sum(models.BakeryInventory.quantity))
         .filter(models.BakeryInventory.bakery_id == bakery_id)
-        .filter(models.BakeryInventory.status == "available")
+        .filter(effective_inventory_status_expr(today_ph()) == "available")
         .filter(models.BakeryInventory.expiration_date >= period_start,
                 models.BakeryInventory.expiration_date < period_end_inclusive)
         .scalar() or 0
@@ -780,7 +803,7 @@ def monthly_summary(
     available_total = (
         db.query(func.sum(models.BakeryInventory.quantity))
         .filter(models.BakeryInventory.bakery_id == bakery_id)
-        .filter(models.BakeryInventory.status == "available")
+        .filter(effective_inventory_status_expr(today_ph()) == "available")
         .filter(models.BakeryInventory.expiration_date >= start_date,
                 models.BakeryInventory.expiration_date < end_date_inclusive)
         .scalar() or 0
@@ -1,10 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func
-from app import database, models, auth
+from app import database, models, auth, report_export
 from datetime import datetime, timedelta
 from app.timezone_utils import now_ph, today_ph
-from sqlalchemy.orm import joinedload
 
 router = APIRouter(
     prefix="/report",
@@ -16,88 +15,131 @@ def check_charity(current_user: models.User = Depends(auth.get_current_user)):
         raise HTTPException(status_code=403, detail="Not authorized")
     return current_user
 
-@router.get("/donation_history")
-def donation_history(
-    user_id: int = None,  # optional: view another user's donation history
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_user),
-):
-    target_user_id = user_id or current_user.id
-    results = []
-
-    # Fetch user role for the target user
-    target_user = db.query(models.User).filter(models.User.id == target_user_id).first()
-    if not target_user:
-        return results
+HISTORY_COLUMNS = ["id", "type", "completed_at", "product_name", "quantity", "bakery_name"]
 
+def _history_queries(db: Session, target_user):
+    """
+    (donation request query, direct donation query, row builders) for a user's
+    completed donations: sent for a bakery, received for a charity.
+    """
     if target_user.role == "Bakery":
         # All donations sent by bakery (no date limit)
-        donation_requests = db.query(models.DonationRequest).filter(
-            models.DonationRequest.bakery_id == target_user_id,
+        donation_requests = db.query(models.DonationRequest).options(
+            joinedload(models.DonationRequest.inventory_item)
+        ).filter(
+            models.DonationRequest.bakery_id == target_user.id,
             models.DonationRequest.tracking_status == "complete",
             models.DonationRequest.tracking_completed_at != None,
-        ).all()
+        )
 
         direct_donations = db.query(models.DirectDonation).filter(
-            models.DirectDonation.bakery_inventory.has(bakery_id=target_user_id),
+            models.DirectDonation.bakery_inventory.has(bakery_id=target_user.id),
             models.DirectDonation.btracking_status == "complete",
             models.DirectDonation.btracking_completed_at != None,
-        ).all()
+        )
 
-        for d in donation_requests:
-            results.append({
+        def request_row(d):
+            return {
                 "id": d.id,
                 "type": "request",
                 "completed_at": d.tracking_completed_at.strftime("%m-%d-%Y") if d.tracking_completed_at else None,
                 "product_name": d.donation_name or (d.inventory_item.name if d.inventory_item else "Unknown"),
                 "quantity": d.donation_quantity or 0,
                 "bakery_name": target_user.name,  # ✅ the bakery itself (sender)
-            })
+            }
 
-        for d in direct_donations:
-            results.append({
+        def direct_row(d):
+            return {
                 "id": d.id,
                 "type": "direct",
                 "completed_at": d.btracking_completed_at.strftime("%m-%d-%Y") if d.btracking_completed_at else None,
                 "product_name": d.name,
                 "quantity": d.quantity,
                 "bakery_name": target_user.name,  # ✅ consistent key
-            })
+            }
 
-    elif target_user.role == "Charity":
+    else:
         # All donations received by charity (no date limit)
-        donation_requests = db.query(models.DonationRequest).filter(
-            models.DonationRequest.charity_id == target_user_id,
+        donation_requests = db.query(models.DonationRequest).options(
+            joinedload(models.DonationRequest.inventory_item),
+            joinedload(models.DonationRequest.bakery)
+        ).filter(
+            models.DonationRequest.charity_id == target_user.id,
             models.DonationRequest.tracking_status == "complete",
             models.DonationRequest.tracking_completed_at != None,
-        ).all()
+        )
 
-        direct_donations = db.query(models.DirectDonation).filter(
-            models.DirectDonation.charity_id == target_user_id,
+        direct_donations = db.query(models.DirectDonation).options(
+            joinedload(models.DirectDonation.bakery_inventory).joinedload(models.BakeryInventory.bakery)
+        ).filter(
+            models.DirectDonation.charity_id == target_user.id,
             models.DirectDonation.btracking_status == "complete",
             models.DirectDonation.btracking_completed_at != None,
-        ).all()
+        )
 
-        for d in donation_requests:
-            results.append({
+        def request_row(d):
+            return {
                 "id": d.id,
                 "type": "request",
                 "completed_at": d.tracking_completed_at.strftime("%m-%d-%Y") if d.tracking_completed_at else None,
                 "product_name": d.donation_name or (d.inventory_item.name if d.inventory_item else "Unknown"),
                 "quantity": d.donation_quantity or 0,
                 "bakery_name": d.bakery.name if d.bakery else "Unknown",  # ✅ now shows bakery donor
-            })
+            }
 
-        for d in direct_donations:
+        def direct_row(d):
             bakery_name = getattr(getattr(d.bakery_inventory, "bakery", None), "name", "Unknown")
-            results.append({
+            return {
                 "id": d.id,
                 "type": "direct",
                 "completed_at": d.btracking_completed_at.strftime("%m-%d-%Y") if d.btracking_completed_at else None,
                 "product_name": d.name,
                 "quantity": d.quantity,
                 "bakery_name": bakery_name,  # ✅ same naming
-            })
+            }
+
+    return donation_requests, direct_donations, request_row, direct_row
+
+@router.get("/donation_history")
+def donation_history(
+    user_id: int = None,  # optional: view another user's donation history
+    export_format: str = Query("json", alias="format", pattern=report_export.FORMAT_PATTERN),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user),
+):
+    target_user_id = user_id or current_user.id
+    results = []
+
+    # Fetch user role for the target user
+    target_user = db.query(models.User).filter(models.User.id == target_user_id).first()
+    if not target_user or target_user.role not in ("Bakery", "Charity"):
+        target_user = None
+    if export_format == "json" and not target_user:
+        return results
+
+    # CSV / NDJSON: stream both sources newest first straight off the cursor
+    if export_format != "json":
+        def rows(export_db):
+            if target_user is None:
+                return iter(())
+            donation_requests, direct_donations, request_row, direct_row = _history_queries(export_db, target_user)
+            requests_newest = report_export.stream(
+                donation_requests.order_by(models.DonationRequest.tracking_completed_at.desc())
+            )
+            direct_newest = report_export.stream(
+                direct_donations.order_by(models.DirectDonation.btracking_completed_at.desc())
+            )
+            return report_export.merge_newest_first(
+                ((d.tracking_completed_at, request_row(d)) for d in requests_newest),
+                ((d.btracking_completed_at, direct_row(d)) for d in direct_newest),
+            )
+        return report_export.export_response(export_format, "donation_history", HISTORY_COLUMNS, rows)
+
+    donation_requests, direct_donations, request_row, direct_row = _history_queries(db, target_user)
+    for d in donation_requests.all():
+        results.append(request_row(d))
+    for d in direct_donations.all():
+        results.append(direct_row(d))
 
     # Sort by most recent first
     results.sort(key=lambda x: x["completed_at"], reverse=True)
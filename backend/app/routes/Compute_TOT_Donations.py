@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from app.database import get_db
-from app import models, auth, database
+from app import models, auth, database, crud
 from datetime import datetime
 from app.timezone_utils import today_ph
 
@@ -19,25 +19,10 @@ def get_charity_totals(
 
     charity_id = current_user.id 
 
-    # Count completed DonationRequests received by this charity
-    normal_total = (
-        db.query(func.count(models.DonationRequest.id))
-        .filter(
-            models.DonationRequest.charity_id == charity_id,
-            models.DonationRequest.tracking_status == "complete"
-        )
-        .scalar()
-    )
-
-    # Count completed DirectDonations received by this charity
-    direct_total = (
-        db.query(func.count(models.DirectDonation.id))
-        .filter(
-            models.DirectDonation.charity_id == charity_id,
-            models.DirectDonation.btracking_status == "complete"
-        )
-        .scalar()
-    )
+    # Completed donations received, read from the donation_totals rollup
+    totals = crud.get_donation_totals(db, charity_id)
+    normal_total = totals["request_count"]
+    direct_total = totals["direct_count"]
 
     grand_total = normal_total + direct_total
 
@@ -56,27 +41,10 @@ def get_bakery_totals(
     # Get bakery_id from either user or employee
     bakery_id = auth.get_bakery_id_from_auth(current_auth)
 
-    # Count completed DonationRequests for this bakery via inventory
-    normal_total = (
-        db.query(func.count(models.DonationRequest.id))
-        .join(models.BakeryInventory, models.DonationRequest.bakery_inventory_id == models.BakeryInventory.id)
-        .filter(
-            models.BakeryInventory.bakery_id == bakery_id,
-            models.DonationRequest.tracking_status == "complete"
-        )
-        .scalar()
-    )
-
-    # Count completed DirectDonations for this bakery via inventory
-    direct_total = (
-        db.query(func.count(models.DirectDonation.id))
-        .join(models.BakeryInventory, models.DirectDonation.bakery_inventory_id == models.BakeryInventory.id)
-        .filter(
-            models.BakeryInventory.bakery_id == bakery_id,
-            models.DirectDonation.btracking_status == "complete"
-        )
-        .scalar()
-    )
+    # Completed donations sent, read from the donation_totals rollup
+    totals = crud.get_donation_totals(db, bakery_id)
+    normal_total = totals["request_count"]
+    direct_total = totals["direct_count"]
 
     grand_total = normal_total + direct_total
 
@@ -154,26 +122,7 @@ def get_bakery_analytics(
         .scalar()
     )
 
-    completed_requests_count = (
-        db.query(func.count(models.DonationRequest.id))
-        .filter(
-            models.DonationRequest.bakery_id == bakery_id,
-            models.DonationRequest.tracking_status == "complete"
-        )
-        .scalar()
-    )
-
-    completed_direct_count = (
-        db.query(func.count(models.DirectDonation.id))
-        .join(models.BakeryInventory)
-        .filter(
-            models.BakeryInventory.bakery_id == bakery_id,
-            models.DirectDonation.btracking_status == "complete"
-        )
-        .scalar()
-    )
-
-    donated_count = completed_requests_count + completed_direct_count
+    donated_count = crud.get_completed_donation_count(db, bakery_id)
 
     # Fetch all registered charities
     all_charities = db.query(models.User).filter(
@@ -1,12 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Request, Form, Header
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, func, not_
-from app import models, database
+from sqlalchemy import func
+from app import models, database, crud, chat_attachments
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime
 from app.timezone_utils import now_ph
 from typing import Optional, List
 import base64, os, json
-from uuid import uuid4
 
 router = APIRouter()
 UPLOAD_DIR = "uploads"
@@ -49,20 +49,47 @@ def get_current_user(authorization: Optional[str] = Header(None), db: Session =
         raise HTTPException(status_code=401, detail="User not found")
     return user
 
+# --- Upload a chat attachment (referenced later by attachment_id) ---
+@router.post("/messages/attachments")
+async def upload_attachment(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Streams the file to UPLOAD_DIR off the event loop and returns an id to send with the message."""
+    try:
+        attachment = await run_in_threadpool(
+            chat_attachments.save_upload, db, current_user.id, file.file, file.filename, file.content_type
+        )
+    except chat_attachments.AttachmentError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "status": "ok",
+        "attachment_id": attachment.id,
+        "url": attachment.file_url,
+        "kind": chat_attachments.media_kind(attachment.content_type),
+        "size": attachment.size
+    }
+
+
 # --- Send a message (accepts JSON or multipart/form-data) ---
 @router.post("/messages/send")
 async def send_message(request: Request, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     """
     Accepts either:
-      - application/json: { receiver_id, content }
+      - application/json: { receiver_id, content, attachment_id? }
       - multipart/form-data with fields receiver_id, content and file (UploadFile)
-    Saves file to UPLOAD_DIR and creates message row.
+    Files are written to UPLOAD_DIR in a worker thread, never on the event loop.
     """
     content_type = (request.headers.get("content-type") or "").lower()
     receiver_id = None
     content = None
     file_url = None
     is_card = False
+    attachment = None
+    image_field = None
+    video_field = None
 
     # multipart/form-data
     if content_type.startswith("multipart/form-data"):
@@ -71,13 +98,11 @@ async def send_message(request: Request, db: Session = Depends(get_db), current_
         content = form.get("content")
         file_obj = form.get("file")
         if file_obj:
-            # file_obj is UploadFile
-            filename = f"{uuid4().hex}_{file_obj.filename}"
-            path = os.path.join(UPLOAD_DIR, filename)
-            with open(path, "wb") as f:
-                f.write(await file_obj.read())
-            # store relative path (leading slash optional)
-            file_url = f"/{UPLOAD_DIR}/{filename}"
+            # file_obj is UploadFile; stream it to disk in chunks
+            try:
+                file_url = await run_in_threadpool(chat_attachments.store_upload, file_obj.file, file_obj.filename)
+            except chat_attachments.AttachmentError as e:
+                raise HTTPException(status_code=400, detail=str(e))
             ct = getattr(file_obj, "content_type", "") or ""
             image_field = "image" if "image" in ct else None
             video_field = "video" if "video" in ct else None
@@ -86,22 +111,23 @@ async def send_message(request: Request, db: Session = Depends(get_db), current_
         body = await request.json()
         receiver_id = int(body.get("receiver_id"))
         content = body.get("content")
-        # frontend does not send base64 media in JSON (files sent via multipart),
-        # but if provided as 'media' + 'media_type' (base64) it will be handled:
+        attachment_id = body.get("attachment_id")
+        # legacy: base64 media in JSON as 'media' + 'media_type'
         media_b64 = body.get("media")
         media_type = body.get("media_type")
-        if media_b64:
-            ext = "mp4" if media_type and "video" in media_type else "png"
-            filename = f"{uuid4().hex}.{ext}"
-            path = os.path.join(UPLOAD_DIR, filename)
-            with open(path, "wb") as f:
-                f.write(base64.b64decode(media_b64))
-            file_url = f"/{UPLOAD_DIR}/{filename}"
+        if attachment_id:
+            try:
+                attachment = chat_attachments.claim_attachment(db, attachment_id, current_user.id)
+            except chat_attachments.AttachmentError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            file_url = attachment.file_url
+            kind = chat_attachments.media_kind(attachment.content_type)
+            image_field = "image" if kind == "image" else None
+            video_field = "video" if kind == "video" else None
+        elif media_b64:
+            file_url = await run_in_threadpool(chat_attachments.store_base64, media_b64, media_type)
             image_field = "image" if media_type and "image" in media_type else None
             video_field = "video" if media_type and "video" in media_type else None
-        else:
-            image_field = None
-            video_field = None
 
     if not receiver_id or not (content or file_url):
         raise HTTPException(status_code=400, detail="Message must have receiver_id and content or a file")
@@ -117,7 +143,7 @@ async def send_message(request: Request, db: Session = Depends(get_db), current_
     new_msg = models.Message(
         sender_id=current_user.id,
         receiver_id=receiver_id,
-        content=content,
+        content=content or "",  # attachment-only messages have no text
         image=file_url if file_url and image_field else None,
         video=file_url if file_url and video_field else None,
         timestamp=now_ph(),
@@ -125,6 +151,10 @@ async def send_message(request: Request, db: Session = Depends(get_db), current_
         is_read=False
     )
     db.add(new_msg)
+    db.flush()
+    if attachment:
+        attachment.message_id = new_msg.id
+    crud.record_message(db, new_msg)
     db.commit()
     db.refresh(new_msg)
 
@@ -183,6 +213,9 @@ async def delete_message(
             msg.deleted_for_receiver = True
         else:
             raise HTTPException(status_code=403, detail="Cannot delete this message")
+        db.flush()
+        peer_id = msg.receiver_id if msg.sender_id == current_user.id else msg.sender_id
+        crud.refresh_conversation(db, current_user.id, peer_id)
     else:
         # delete for everyone - mark as deleted instead of removing
         if msg.sender_id != current_user.id:
@@ -215,20 +248,18 @@ async def accept_donation(message_id: int = Form(...), db: Session = Depends(get
 
 # --- Fetch history with polling ---
 @router.get("/messages/history")
-def get_history(peer_id: int = Query(...), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def get_history(
+    peer_id: int = Query(...),
+    before_id: Optional[int] = Query(None, description="Return messages older than this message id"),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
     user_id = current_user.id
-    msgs = db.query(models.Message).filter(
-        or_(
-            and_(models.Message.sender_id == user_id, models.Message.receiver_id == peer_id),
-            and_(models.Message.sender_id == peer_id, models.Message.receiver_id == user_id)
-        )
-    ).order_by(models.Message.timestamp).all()
+    msgs, has_more = crud.get_message_history(db, user_id, peer_id, before_id=before_id, limit=limit)
 
     history = []
     for m in msgs:
-        if (m.sender_id == user_id and getattr(m, "deleted_for_sender", False)) or \
-           (m.receiver_id == user_id and getattr(m, "deleted_for_receiver", False)):
-            continue
         history.append({
             "id": m.id,
             "sender_id": m.sender_id,
@@ -243,71 +274,29 @@ def get_history(peer_id: int = Query(...), db: Session = Depends(get_db), curren
             "deleted_for_all": getattr(m, "deleted_for_all", False)
         })
 
-    # Mark unread as read
-    unread = db.query(models.Message).filter(
-        models.Message.receiver_id == user_id,
-        models.Message.sender_id == peer_id,
-        models.Message.is_read == False
-    ).all()
-    for u in unread:
-        u.is_read = True
-    if unread:
-        db.commit()
+    # Mark unread as read up to the newest message shown (older pages are already covered)
+    if before_id is None and msgs:
+        if crud.mark_history_read(db, user_id, peer_id, msgs[-1].id):
+            db.commit()
 
-    return {"status": "ok", "messages": history}
+    return {
+        "status": "ok",
+        "messages": history,
+        "has_more": has_more,
+        "next_before_id": msgs[0].id if has_more else None
+    }
 
 # --- Active chats ---
 @router.get("/messages/active_chats")
 def get_active_chats(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     user_id = current_user.id
-
-    # messages involving the user but ignore messages deleted for this user
-    msgs = (
-        db.query(models.Message)
-        .filter(or_(models.Message.sender_id == user_id, models.Message.receiver_id == user_id))
-        .filter(
-            not_(
-                or_(
-                    and_(models.Message.sender_id == user_id, models.Message.deleted_for_sender == True),
-                    and_(models.Message.receiver_id == user_id, models.Message.deleted_for_receiver == True),
-                )
-            )
-        )
-        .order_by(models.Message.timestamp.desc())
-        .all()
-    )
-
-    seen = set()
-    chats = []
     notif_types = ("confirmed_donation", "donation_unavailable", "donation_cancelled", "donation_card")
 
-    for m in msgs:
-        peer_id = m.receiver_id if m.sender_id == user_id else m.sender_id
-        if not peer_id or peer_id in seen:
-            continue
-
-        # pick the latest visible message BETWEEN the two users
-        last = (
-            db.query(models.Message)
-            .filter(
-                or_(
-                    and_(models.Message.sender_id == user_id, models.Message.receiver_id == peer_id),
-                    and_(models.Message.sender_id == peer_id, models.Message.receiver_id == user_id),
-                )
-            )
-            .filter(
-                not_(
-                    or_(
-                        and_(models.Message.sender_id == user_id, models.Message.deleted_for_sender == True),
-                        and_(models.Message.receiver_id == user_id, models.Message.deleted_for_receiver == True),
-                    )
-                )
-            )
-            .order_by(models.Message.timestamp.desc())
-            .first()
-        )
-
-        if not last:
+    # One row per peer with the latest message visible to this user (see crud.record_message)
+    chats = []
+    for conversation, last, peer in crud.get_conversations(db, user_id):
+        # REQUIRE last to have visible content or media. If it doesn't, skip the peer.
+        if not (last.content or last.image or last.video):
             continue
 
         # safe-parse last.content (may be int/string/json/dict)
@@ -320,88 +309,11 @@ def get_active_chats(db: Session = Depends(get_db), current_user: models.User =
         except Exception:
             parsed = {}
 
-        # determine if current user is directly involved in the message
-        involved = (last.sender_id == user_id or last.receiver_id == user_id)
-
-        # Extra handling for donation_card: some cards include explicit targets
-        card_targets = set()
-        if isinstance(parsed, dict) and parsed.get("type") == "donation_card":
-            for key in ("target_user_id", "bakery_id", "product_owner_id", "receiver_id", "recipient_id", "owner_id"):
-                try:
-                    v = parsed.get(key)
-                    if v is not None and str(v).strip() != "":
-                        card_targets.add(int(v))
-                except Exception:
-                    pass
-
-        # If last is a notification-type and current user is not involved, try to find a non-notification last message
-        if isinstance(parsed, dict) and parsed.get("type") in notif_types and not involved:
-            if parsed.get("type") == "donation_card":
-                # if card has explicit targets and current user is not in them, try to find a normal message
-                if card_targets and (user_id not in card_targets):
-                    pair_msgs = (
-                        db.query(models.Message)
-                        .filter(
-                            or_(
-                                and_(models.Message.sender_id == user_id, models.Message.receiver_id == peer_id),
-                                and_(models.Message.sender_id == peer_id, models.Message.receiver_id == user_id),
-                            )
-                        )
-                        .filter(
-                            not_(
-                                or_(
-                                    and_(models.Message.sender_id == user_id, models.Message.deleted_for_sender == True),
-                                    and_(models.Message.receiver_id == user_id, models.Message.deleted_for_receiver == True),
-                                )
-                            )
-                        )
-                        .order_by(models.Message.timestamp.desc())
-                        .limit(200)
-                        .all()
-                    )
-                    found = None
-                    for pm in pair_msgs:
-                        try:
-                            pc = json.loads(pm.content) if isinstance(pm.content, str) else (pm.content if isinstance(pm.content, dict) else {})
-                        except Exception:
-                            pc = {}
-                        if not (isinstance(pc, dict) and pc.get("type") in notif_types):
-                            # accept the first non-notification with visible content/media
-                            if pm.content or pm.image or pm.video:
-                                found = pm
-                                break
-                    if found:
-                        last = found
-                        # re-parse last content
-                        try:
-                            if isinstance(last.content, str):
-                                parsed = json.loads(last.content)
-                            elif isinstance(last.content, dict):
-                                parsed = last.content
-                            else:
-                                parsed = {}
-                        except Exception:
-                            parsed = {}
-                    else:
-                        # no relevant last message for this pair -> skip peer
-                        continue
-                else:
-                    # no explicit card_targets (broadcast-like card) -> skip for unrelated user
-                    continue
-            else:
-                # other notification types (confirmed_donation, etc.) - skip if not involved
-                continue
-
-        # REQUIRE last to have visible content or media. If it doesn't, skip the peer.
-        if not (last.content or last.image or last.video):
-            continue
-
         # compute display_snippet and display_timestamp for this user (friendly labels)
         display_snippet = None
         display_timestamp = last.timestamp.isoformat()
         try:
             if isinstance(parsed, dict) and parsed.get("type") in notif_types:
-                # show donation notification only to involved users (or explicit targets handled above)
                 if parsed.get("type") == "donation_card":
                     display_snippet = "Donation Request"
                 elif parsed.get("type") == "confirmed_donation":
@@ -422,35 +334,6 @@ def get_active_chats(db: Session = Depends(get_db), current_user: models.User =
         except Exception:
             display_snippet = (last.content if last.content else None)
 
-        # load peer user record
-        peer = db.query(models.User).filter(models.User.id == peer_id).first()
-        if not peer:
-            continue
-
-        # unread count (exclude messages deleted for this user)
-        unread_q = (
-            db.query(models.Message)
-            .filter(
-                models.Message.receiver_id == user_id,
-                models.Message.sender_id == peer_id,
-                models.Message.is_read == False
-            )
-            .filter(
-                not_(
-                    or_(
-                        and_(models.Message.sender_id == user_id, models.Message.deleted_for_sender == True),
-                        and_(models.Message.receiver_id == user_id, models.Message.deleted_for_receiver == True),
-                    )
-                )
-            )
-        )
-        try:
-            unread_count = unread_q.count()
-        except Exception:
-            unread_count = 0
-
-        seen.add(peer_id)
-
         chats.append({
             "peer": {
                 "id": peer.id,
@@ -472,15 +355,9 @@ def get_active_chats(db: Session = Depends(get_db), current_user: models.User =
             },
             "display_snippet": display_snippet,
             "display_timestamp": display_timestamp,
-            "unread": unread_count
+            "unread": conversation.unread_count
         })
 
-    # sort chats by display_timestamp desc (most recent visible conversation first)
-    try:
-        chats.sort(key=lambda c: c.get("display_timestamp") or c["last_message"]["timestamp"], reverse=True)
-    except Exception:
-        pass
-
     return {"status": "ok", "chats": chats}
 
 # --- Search users ---
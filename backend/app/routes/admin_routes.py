@@ -5,7 +5,10 @@ from pydantic import BaseModel
 from app import models, database
 from app.timezone_utils import now_ph
 from app.auth import get_current_admin  # Only allow admins
-from app.email_utils import send_account_verified_email, send_email  # ✅ NEW: Import email function
+from app.email_utils import send_account_verified_email  # ✅ NEW: Import email function
+from app.email_outbox import enqueue_email
+from app.geofence_scheduler import geofence_scheduler
+from app.principal_cache import principal_cache
 from app import admin_models  # Import admin models for SystemNotification
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
@@ -42,6 +45,10 @@ def verify_user(user_id: int, db: Session = Depends(database.get_db), admin=Depe
     user.status = "Active"
     db.commit()
     
+    # Pick the charity up in nearby geofence waves right away
+    if user.role == "Charity":
+        geofence_scheduler.charity_moved(db, user)
+    
     # ✅ NEW: Send verification email to user
     try:
         send_account_verified_email(user.email, user.name, user.role)
@@ -68,13 +75,20 @@ def reject_user(user_id: int, body: RejectUserRequest, db: Session = Depends(dat
     rejection_reason = body.reason
     
     # Delete associated employees first (to avoid NOT NULL constraint violation)
+    employee_ids = []
     if user.role == "Bakery":
+        employees = db.query(models.Employee.id).filter(models.Employee.bakery_id == user_id)
+        employee_ids = [employee_id for (employee_id,) in employees]
         db.query(models.Employee).filter(models.Employee.bakery_id == user_id).delete(synchronize_session=False)
     
     # Delete the user
     db.delete(user)
     db.commit()
     
+    # Bulk deletes skip the flush hooks, so drop the employees' cached principals here
+    if employee_ids:
+        principal_cache.publish_invalidations([("employee", employee_id) for employee_id in employee_ids])
+    
     # Send rejection email
     try:
         html_content = f"""
@@ -133,11 +147,13 @@ def reject_user(user_id: int, body: RejectUserRequest, db: Session = Depends(dat
         </div>
         """
         
-        send_email(
+        enqueue_email(
+            db,
             to_email=user_email,
             subject="DoughNation Account Registration - Not Approved",
             html_content=html_content
         )
+        db.commit()
     except Exception as e:
         print(f"Failed to send rejection email to {user_email}: {e}")
         # Don't fail the request if email fails
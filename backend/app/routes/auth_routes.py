@@ -1,10 +1,12 @@
 from typing import Optional
-from fastapi import APIRouter, Depends, UploadFile, Form, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, Form, File, HTTPException, Request
 from sqlalchemy.orm import Session
 from datetime import date, datetime, timedelta
 from app import crud, auth, database, schemas, models
 from app.auth import create_access_token, get_current_user, verify_password
 from app.event_logger import log_system_event
+from app import login_throttle
+from app.geofence_scheduler import geofence_scheduler
 from passlib.context import CryptContext
 from app.timezone_utils import now_ph, to_ph_timezone
 import random
@@ -28,11 +30,16 @@ async def register(
     proof_of_validity: UploadFile = File(...),
     db: Session = Depends(database.get_db)
 ):
-    return crud.create_user(
+    user = crud.create_user(
         db, role, name, email, contact_person, contact_number, address,
         password, confirm_password, profile_picture, proof_of_validity
     )
 
+    # A new charity may already be inside a bakery's active geofence wave
+    if user.role == "Charity":
+        geofence_scheduler.charity_moved(db, user)
+    return user
+
 # ==================== EMAIL VERIFICATION WITH OTP (For Registration) ====================
 
 @router.post("/send-email-verification")
@@ -145,8 +152,25 @@ def verify_email_otp(data: dict, db: Session = Depends(database.get_db)):
         "valid": True
     }
 
+# Statuses that count as a failed credential check for login throttling
+_LOGIN_FAILURE_STATUSES = (401, 404)
+
+
 @router.post("/login", response_model=schemas.Token)
-def unified_login(user: schemas.UserLogin, db: Session = Depends(database.get_db)):
+async def unified_login(user: schemas.UserLogin, request: Request, db: Session = Depends(database.get_db)):
+    # Throttling and admission happen on the event loop, before any thread is taken
+    login_throttle.admit_login(request, user.email)
+    try:
+        result = await auth.run_on_password_pool(_unified_login, user, db)
+    except HTTPException as e:
+        if e.status_code in _LOGIN_FAILURE_STATUSES:
+            login_throttle.record_login_result(user.email, success=False)
+        raise
+    login_throttle.record_login_result(user.email, success=True)
+    return result
+
+
+def _unified_login(user: schemas.UserLogin, db: Session):
     """
     🔑 UNIFIED LOGIN SYSTEM
     
@@ -1351,10 +1375,24 @@ def get_employee_name(bakery_id: int, db: Session = Depends(database.get_db)):
 
 
 @router.post("/employee-login", response_model=schemas.EmployeeTokenResponse)
-def employee_login(
+async def employee_login(
     credentials: schemas.EmployeeLogin,
+    request: Request,
     db: Session = Depends(database.get_db)
 ):
+    identifier = f"employee:{credentials.employee_id}"
+    login_throttle.admit_login(request, identifier)
+    try:
+        result = await auth.run_on_password_pool(_employee_login, credentials, db)
+    except HTTPException as e:
+        if e.status_code in _LOGIN_FAILURE_STATUSES:
+            login_throttle.record_login_result(identifier, success=False)
+        raise
+    login_throttle.record_login_result(identifier, success=True)
+    return result
+
+
+def _employee_login(credentials: schemas.EmployeeLogin, db: Session):
     """
     Employee login using name and password.
     
@@ -1720,6 +1758,10 @@ async def admin_manual_register(
     db.commit()
     db.refresh(new_user)
     
+    # A new charity may already be inside a bakery's active geofence wave
+    if new_user.role == "Charity":
+        geofence_scheduler.charity_moved(db, new_user)
+    
     # 🆕 CREATE EMPLOYEE RECORD FOR BAKERIES (matching self-registration behavior)
     if role == "Bakery":
         try:
@@ -1824,6 +1866,10 @@ def admin_update_user(
         user.contact_number = contact_number
     if address:
         user.address = address
+    coords_changed = (
+        (latitude is not None and latitude != user.latitude)
+        or (longitude is not None and longitude != user.longitude)
+    )
     if latitude is not None:
         user.latitude = latitude
     if longitude is not None:
@@ -1856,6 +1902,12 @@ def admin_update_user(
     db.commit()
     db.refresh(user)
     
+    # Re-evaluate nearby geofences when a charity or bakery moves
+    if coords_changed and user.role == "Charity":
+        geofence_scheduler.charity_moved(db, user)
+    elif coords_changed and user.role == "Bakery":
+        geofence_scheduler.schedule(user.id)
+    
     # Log the event
     if status_changed:
         log_system_event(
@@ -2011,8 +2063,8 @@ async def contact_support(
     Contact support endpoint for users who cannot access their accounts.
     Sends a notification to all admin accounts and emails to admin email.
     """
-    from app.email_utils import send_email
-    from app.admin_models import SystemNotification, NotificationReceipt
+    from app.email_outbox import enqueue_email
+    from app.admin_models import SystemNotification
     
     # Get all admin users
     admins = db.query(models.User).filter(models.User.role == "Admin").all()
@@ -2044,12 +2096,7 @@ async def contact_support(
         db.flush()  # Get the notification ID
         
         # Create notification receipt
-        receipt = NotificationReceipt(
-            notification_id=notification.id,
-            user_id=admin.id,
-            is_read=False
-        )
-        db.add(receipt)
+        crud.create_notification_receipts(db, notification.id, [admin.id])
     
     db.commit()
     
@@ -2092,11 +2139,13 @@ async def contact_support(
     """
     
     try:
-        send_email(
+        enqueue_email(
+            db,
             to_email=admin_email,
             subject=email_subject,
             html_content=email_body
         )
+        db.commit()
     except Exception as e:
         print(f"Failed to send email to admin: {e}")
         # Don't fail the request if email fails - notification is still created
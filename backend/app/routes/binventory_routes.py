@@ -1,121 +1,42 @@
 from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
-import os, shutil, csv
+import os, shutil
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import func, or_, and_, case
 
 from app import models, database, schemas, auth, crud
 from app.timezone_utils import today_ph
-from app.routes.cnotification import process_geofence_notifications
+from app.geofence_scheduler import geofence_scheduler
+from app.template_store import template_store, CSV_DIR
 from app.product_id_generator import get_product_info, get_next_sequence_number, get_product_code 
 
 router = APIRouter()
 UPLOAD_DIR = "uploads"
-CSV_DIR = "bakery_templates"  # New directory for bakery-specific CSVs
-
-# Ensure CSV directory exists
-os.makedirs(CSV_DIR, exist_ok=True)
 
 # === CSV HELPER FUNCTIONS ===
+# Parsing, caching, locking and atomic writes live in app.template_store
 def get_bakery_csv_path(bakery_id: int):
     """Get the CSV file path for a specific bakery"""
-    filename = f"bakery_{bakery_id}_products.csv"
-    return os.path.join(CSV_DIR, filename)
+    return os.path.join(CSV_DIR, f"bakery_{bakery_id}_products.csv")
 
 
 def initialize_bakery_csv(bakery_id: int):
     """Create CSV file with headers if it doesn't exist"""
-    csv_path = get_bakery_csv_path(bakery_id)
-    
-    if not os.path.exists(csv_path):
-        print(f"[CSV] Creating new CSV for bakery {bakery_id}")
-        with open(csv_path, 'w', newline='', encoding='utf-8-sig') as f:
-            writer = csv.DictWriter(f, fieldnames=['Product Name', 'Threshold', 'Expiration', 'Description', 'Image'])
-            writer.writeheader()
-        print(f"[CSV] ✅ Created: {csv_path}")
-    
-    return csv_path
+    template_store.initialize(bakery_id)
+    return get_bakery_csv_path(bakery_id)
 
 
 def load_bakery_templates(bakery_id: int):
-    """Load product templates from bakery's CSV file"""
-    csv_path = get_bakery_csv_path(bakery_id)
-    templates = {}
-    
-    if not os.path.exists(csv_path):
-        print(f"[CSV] No CSV found for bakery {bakery_id}")
-        return templates
-    
-    encodings = ['utf-8-sig', 'utf-8', 'latin-1', 'cp1252']
-    
-    for encoding in encodings:
-        try:
-            with open(csv_path, 'r', encoding=encoding) as f:
-                reader = csv.DictReader(f)
-                
-                for row in reader:
-                    product_name = row.get('Product Name', '').strip()
-                    if not product_name:
-                        continue
-                    
-                    # Normalize name for matching
-                    normalized_name = product_name.lower().replace(' ', '')
-                    
-                    try:
-                        threshold = int(row.get('Threshold', 0))
-                        expiration = int(row.get('Expiration', 0))
-                    except ValueError:
-                        continue
-                    
-                    templates[normalized_name] = {
-                        'shelf_life_days': expiration,
-                        'threshold': threshold,
-                        'description': row.get('Description', '').strip(),
-                        'original_name': product_name,
-                        'image': row.get('Image', '')
-                    }
-            
-            print(f"[CSV] ✅ Loaded {len(templates)} templates for bakery {bakery_id}")
-            return templates
-            
-        except UnicodeDecodeError:
-            continue
-        except Exception as e:
-            print(f"[CSV] ❌ Error loading CSV: {e}")
-            continue
-    
-    return templates
+    """Load product templates for a bakery (cached until the file changes)"""
+    return template_store.templates(bakery_id)
 
 
 def save_product_to_csv(bakery_id: int, product_name: str, threshold: int, shelf_life_days: int, description: str = "", image: str = ""):
-    """Save or update a product template in bakery's CSV"""
-    csv_path = initialize_bakery_csv(bakery_id)
-    
-    # Load existing templates
-    templates = load_bakery_templates(bakery_id)
-    normalized_name = product_name.strip().lower().replace(' ', '')
-    
-    # Check if product already exists
-    if normalized_name in templates:
-        print(f"[CSV] Product '{product_name}' already exists for bakery {bakery_id}, skipping...")
-        return False
-    
-    # Add new product to CSV
+    """Save a new product template in bakery's CSV"""
     try:
-        with open(csv_path, 'a', newline='', encoding='utf-8-sig') as f:
-            writer = csv.DictWriter(f, fieldnames=['Product Name', 'Threshold', 'Expiration', 'Description', 'Image'])
-            writer.writerow({
-                'Product Name': product_name.strip(),
-                'Threshold': threshold,
-                'Expiration': shelf_life_days,
-                'Description': description.strip(),
-                'Image': image
-            })
-        
-        print(f"[CSV] ✅ Added '{product_name}' to bakery {bakery_id} CSV")
-        return True
-        
+        template_store.initialize(bakery_id)
+        return template_store.add(bakery_id, product_name, threshold, shelf_life_days, description, image)
     except Exception as e:
         print(f"[CSV] ❌ Error saving to CSV: {e}")
         return False
@@ -123,61 +44,8 @@ def save_product_to_csv(bakery_id: int, product_name: str, threshold: int, shelf
 
 def update_product_in_csv(bakery_id: int, old_product_name: str, new_product_name: str, threshold: int, shelf_life_days: int, description: str = "", image: str = ""):
     """Update an existing product template in bakery's CSV"""
-    csv_path = get_bakery_csv_path(bakery_id)
-    
-    if not os.path.exists(csv_path):
-        print(f"[CSV] No CSV found for bakery {bakery_id}")
-        return False
-    
     try:
-        # Read all rows
-        rows = []
-        fieldnames = ['Product Name', 'Threshold', 'Expiration', 'Description', 'Image']
-        
-        with open(csv_path, 'r', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                rows.append(row)
-        
-        # Find and update the matching product
-        normalized_old_name = old_product_name.strip().lower().replace(' ', '')
-        updated = False
-        
-        for row in rows:
-            existing_name = row.get('Product Name', '').strip()
-            normalized_existing = existing_name.lower().replace(' ', '')
-            
-            if normalized_existing == normalized_old_name:
-                # Update the row
-                row['Product Name'] = new_product_name.strip()
-                row['Threshold'] = str(threshold)
-                row['Expiration'] = str(shelf_life_days)
-                row['Description'] = description.strip()
-                row['Image'] = image
-                updated = True
-                print(f"[CSV] 🔄 Updating '{old_product_name}' to '{new_product_name}' in bakery {bakery_id} CSV")
-                break
-        
-        if not updated:
-            print(f"[CSV] ⚠️ Product '{old_product_name}' not found in CSV, adding as new")
-            # If not found, add as new entry
-            rows.append({
-                'Product Name': new_product_name.strip(),
-                'Threshold': str(threshold),
-                'Expiration': str(shelf_life_days),
-                'Description': description.strip(),
-                'Image': image
-            })
-        
-        # Write all rows back to CSV
-        with open(csv_path, 'w', newline='', encoding='utf-8-sig') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
-        
-        print(f"[CSV] ✅ Successfully updated CSV for bakery {bakery_id}")
-        return True
-        
+        return template_store.update(bakery_id, old_product_name, new_product_name, threshold, shelf_life_days, description, image)
     except Exception as e:
         print(f"[CSV] ❌ Error updating CSV: {e}")
         return False
@@ -185,18 +53,13 @@ def update_product_in_csv(bakery_id: int, old_product_name: str, new_product_nam
 
 def get_template_from_csv(bakery_id: int, product_name: str):
     """Get template for a specific product from bakery's CSV"""
-    templates = load_bakery_templates(bakery_id)
-    normalized_name = product_name.strip().lower().replace(' ', '')
-    
-    print(f"[CSV] 🔍 Looking for '{product_name}' in bakery {bakery_id} CSV")
-    
-    template = templates.get(normalized_name)
-    
+    template = template_store.get(bakery_id, product_name)
+
     if template:
-        print(f"[CSV] ✅ Found template for '{product_name}'")
+        print(f"[CSV] ✅ Found template for '{product_name}' in bakery {bakery_id}")
     else:
-        print(f"[CSV] ❌ No template found for '{product_name}'")
-    
+        print(f"[CSV] ❌ No template found for '{product_name}' in bakery {bakery_id}")
+
     return template
 
 
@@ -322,8 +185,8 @@ def add_inventory(
     except Exception as e:
         print(f"[CSV] Error: {e}")
 
-    check_threshold_and_create_donation(db)
-    check_inventory_status(db)
+    check_threshold_and_create_donation(db, [new_item.id])
+    check_inventory_status(db, current_user.id)
 
     return new_item
 
@@ -333,38 +196,36 @@ def list_inventory(
     current_auth = Depends(auth.get_current_user_or_employee)
 ):
     bakery_id = auth.get_bakery_id_from_auth(current_auth)
-    check_inventory_status(db)
 
     inventory_items = crud.list_inventory(db, bakery_id=bakery_id)
     updated_items = []
     
-    from app.timezone_utils import today_ph
     today = today_ph()
 
+    # Completion dates of donated items, fetched once for the whole list
+    donated_ids = [item.id for item in inventory_items if item.status and item.status.lower() == "donated"]
+    completion_dates = {}
+    if donated_ids:
+        completion_dates = dict(
+            db.query(
+                models.DirectDonation.bakery_inventory_id,
+                func.min(models.DirectDonation.created_at)
+            ).filter(
+                models.DirectDonation.bakery_inventory_id.in_(donated_ids),
+                models.DirectDonation.btracking_status.ilike("complete")
+            ).group_by(models.DirectDonation.bakery_inventory_id).all()
+        )
+
     for item in inventory_items:
+        # Status is derived at read time; nothing is written back here
+        item_status = effective_inventory_status(item, today)
+
         # ✅ BACKEND VALIDATION: Hide donated products after 7 days
-        if item.status and item.status.lower() == "donated":
-            # Find donation completion date
-            donation_request = db.query(models.DonationRequest).join(models.Donation).filter(
-                models.Donation.bakery_inventory_id == item.id,
-                models.DonationRequest.tracking_status.ilike("complete")
-            ).first()
-            
-            direct_donation = db.query(models.DirectDonation).filter(
-                models.DirectDonation.bakery_inventory_id == item.id,
-                models.DirectDonation.btracking_status.ilike("complete")
-            ).first()
-            
-            completion_date = None
-            if donation_request and hasattr(donation_request, 'updated_at'):
-                completion_date = donation_request.updated_at
-            elif direct_donation and hasattr(direct_donation, 'created_at'):
-                completion_date = direct_donation.created_at
+        if item_status and item_status.lower() == "donated":
+            completion_date = completion_dates.get(item.id)
             
             if completion_date:
-                if isinstance(completion_date, str):
-                    completion_date = datetime.strptime(completion_date.split('T')[0], "%Y-%m-%d").date()
-                elif isinstance(completion_date, datetime):
+                if isinstance(completion_date, datetime):
                     completion_date = completion_date.date()
                 
                 days_since_donation = (today - completion_date).days
@@ -373,25 +234,15 @@ def list_inventory(
         
         # ✅ BACKEND VALIDATION: Hide expired/unavailable products after 3 days
         if item.expiration_date:
-            exp_date = item.expiration_date
-            if isinstance(exp_date, str):
-                exp_date = datetime.strptime(exp_date.split('T')[0], "%Y-%m-%d").date()
-            elif isinstance(exp_date, datetime):
-                exp_date = exp_date.date()
-            
-            days_since_expiration = (today - exp_date).days
+            days_since_expiration = (today - item.expiration_date).days
             
             if days_since_expiration > 3:
                 continue  # Skip this item
-        
-        pending_request = db.query(models.DonationRequest).join(models.Donation).filter(
-            models.Donation.bakery_inventory_id == item.id,
-            models.DonationRequest.status == "pending"
-        ).first()
 
         item_dict = item.__dict__.copy()
-        item_dict["is_requested"] = item.status.lower() == "requested"
-        item_dict["is_donated"] = item.status.lower() == "donated"
+        item_dict["status"] = item_status
+        item_dict["is_requested"] = item_status.lower() == "requested"
+        item_dict["is_donated"] = item_status.lower() == "donated"
 
         updated_items.append(item_dict)
 
@@ -499,8 +350,8 @@ def update_inventory(
     except Exception as e:
         print(f"[CSV] Warning: Could not update CSV: {e}")
 
-    check_threshold_and_create_donation(db)
-    check_inventory_status(db)
+    check_threshold_and_create_donation(db, [inventory_id])
+    check_inventory_status(db, current_user.id)
 
     return updated_item
 
@@ -514,7 +365,7 @@ def delete_inventory(
         raise HTTPException(status_code=403, detail="Only bakeries can delete inventory")
 
     crud.delete_inventory(db=db, inventory_id=inventory_id, bakery_id=current_user.id)
-    check_inventory_status(db)
+    check_inventory_status(db, current_user.id)
 
     return {"message": "Inventory item deleted successfully"}
 
@@ -559,51 +410,75 @@ def get_server_time():
 
 
 # === HELPER FUNCTIONS (Unchanged) ===
-def check_threshold_and_create_donation(db: Session):
+# Date of the last periodic threshold scan in this process (None → next scan is a full one)
+_last_threshold_scan = None
+
+
+def _inventory_donation_state(p, today):
+    """Donation state of an inventory row on a given day: "fresh", "soon" or "expired"."""
+    if p.expiration_date is None:
+        return "fresh"
+
+    days_remaining = (p.expiration_date - today).days
+    if days_remaining <= 0:
+        return "expired"
+    if p.threshold == 0 and days_remaining <= 1:
+        return "soon"
+    if days_remaining <= p.threshold:
+        return "soon"
+    return "fresh"
+
+
+def check_threshold_and_create_donation(db: Session, inventory_ids=None):
+    """
+    Create, refresh or remove the Donation row of inventory items based on their threshold.
+
+    With inventory_ids, only those items are synced (used right after an item changes).
+    Without, only items whose "soon" or "expired" boundary fell between the previous
+    periodic scan and today are synced; the first scan in a process covers everything.
+    """
+    global _last_threshold_scan
     today = today_ph()
-    
+
+    query = db.query(models.BakeryInventory)
+    if inventory_ids is not None:
+        if not inventory_ids:
+            return
+        query = query.filter(models.BakeryInventory.id.in_(inventory_ids))
+    else:
+        if _last_threshold_scan is not None:
+            if _last_threshold_scan >= today:
+                return
+            soon_at = models.BakeryInventory.expiration_date - func.greatest(models.BakeryInventory.threshold, 1)
+            query = query.filter(or_(
+                models.BakeryInventory.expiration_date.between(_last_threshold_scan + timedelta(days=1), today),
+                soon_at.between(_last_threshold_scan + timedelta(days=1), today)
+            ))
+        _last_threshold_scan = today
+
+    products = query.all()
+    if not products:
+        return
+
+    # One query for the existing Donation rows of every scanned item
+    existing_by_item = {
+        d.bakery_inventory_id: d
+        for d in db.query(models.Donation).filter(
+            models.Donation.bakery_inventory_id.in_([p.id for p in products])
+        )
+    }
+
     bakery_ids_triggered = set()
-    products = db.query(models.BakeryInventory).all()
+    new_donations = []
 
     for p in products:
-        exp_date = p.expiration_date
-        threshold_days = p.threshold
-        
-        if exp_date is None:
-            days_remaining = None
-        else:
-            days_remaining = (exp_date - today).days
-        
-        if days_remaining is None:
-            item_status = "fresh"
-        elif days_remaining <= 0:
-            item_status = "expired"
-        elif threshold_days == 0 and days_remaining <= 1:
-            item_status = "soon"
-        elif days_remaining <= threshold_days:
-            item_status = "soon"
-        else:
-            item_status = "fresh"
-
-        if item_status == "expired":
-            existing = db.query(models.Donation).filter(
-                models.Donation.bakery_inventory_id == p.id
-            ).first()
-            if existing:
-                db.delete(existing)
-            continue
+        item_status = _inventory_donation_state(p, today)
+        existing = existing_by_item.get(p.id)
 
-        if p.quantity <= 0 or p.status == "donated":
-            existing = db.query(models.Donation).filter(
-                models.Donation.bakery_inventory_id == p.id
-            ).first()
+        if item_status == "expired" or p.quantity <= 0 or p.status == "donated":
             if existing:
                 db.delete(existing)
             continue
-    
-        existing = db.query(models.Donation).filter(
-            models.Donation.bakery_inventory_id == p.id
-        ).first()
 
         if item_status == "soon":
             if existing:
@@ -615,9 +490,8 @@ def check_threshold_and_create_donation(db: Session):
                 existing.expiration_date = p.expiration_date
                 existing.uploaded = p.uploaded
                 existing.description = p.description
-                bakery_ids_triggered.add(p.bakery_id)
             else:
-                donation = models.Donation(
+                new_donations.append(models.Donation(
                     bakery_inventory_id=p.id,
                     bakery_id=p.bakery_id,
                     name=p.name,
@@ -628,54 +502,65 @@ def check_threshold_and_create_donation(db: Session):
                     expiration_date=p.expiration_date,
                     uploaded=p.uploaded,
                     description=p.description
-                )
-                db.add(donation)
-                bakery_ids_triggered.add(p.bakery_id)
+                ))
+            bakery_ids_triggered.add(p.bakery_id)
         else:
             if existing:
                 db.delete(existing)
 
+    if new_donations:
+        db.add_all(new_donations)
     db.commit()
 
+    # Geofence evaluation runs on the scheduler thread, not inside this request
     for b_id in bakery_ids_triggered:
-        process_geofence_notifications(db, b_id)
+        geofence_scheduler.schedule(b_id)
 
 
-def check_inventory_status(db: Session):
-    today = today_ph()
+def effective_inventory_status(item, today):
+    """Status of an inventory item as of `today`, derived from its expiration date."""
+    # Skip if no expiration date OR if already donated
+    if not item.expiration_date or item.status == "donated":
+        return item.status
 
-    products = db.query(models.BakeryInventory).all()
+    if item.expiration_date <= today:
+        # Only change to unavailable if NOT donated
+        return "unavailable"
 
-    for p in products:
-        # Skip if no expiration date OR if already donated
-        if not p.expiration_date or p.status == "donated":
-            continue
+    # Only restore to available if currently unavailable (not if donated)
+    if item.quantity > 0 and item.status == "unavailable":
+        return "available"
 
-        exp_date = p.expiration_date
+    return item.status
 
-        if isinstance(exp_date, datetime):
-            exp_date = exp_date.date()
-        elif isinstance(exp_date, str):
-            try:
-                exp_date = datetime.strptime(exp_date, "%Y-%m-%d").date()
-            except Exception:
-                continue
 
-        if exp_date <= today:
-            # Only change to unavailable if NOT donated
-            if p.status != "unavailable" and p.status != "donated":
-                p.status = "unavailable"
-        else:
-            # Only restore to available if currently unavailable (not if donated)
-            if p.quantity > 0 and p.status == "unavailable":
-                p.status = "available"
+def effective_inventory_status_expr(today):
+    """SQL form of effective_inventory_status, for queries that filter or group on it."""
+    item = models.BakeryInventory
+    return case(
+        (or_(item.expiration_date.is_(None), item.status == "donated"), item.status),
+        (item.expiration_date <= today, "unavailable"),
+        (and_(item.quantity > 0, item.status == "unavailable"), "available"),
+        else_=item.status
+    )
 
-    db.commit()
 
-@router.get("/server-time")
-def get_server_time():
-    return {"date": today_ph().isoformat()}
+def check_inventory_status(db: Session, bakery_id: int):
+    """Persist the derived status for one bakery's inventory."""
+    today = today_ph()
+
+    products = db.query(models.BakeryInventory).filter(
+        models.BakeryInventory.bakery_id == bakery_id,
+        models.BakeryInventory.expiration_date.isnot(None),
+        models.BakeryInventory.status != "donated"
+    ).all()
 
+    for p in products:
+        status = effective_inventory_status(p, today)
+        if status != p.status:
+            p.status = status
+
+    db.commit()
 
 @router.get("/inventory/template/{product_name}")
 def get_product_template(
@@ -2,8 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 from datetime import datetime, timedelta
-from app import models, database, auth, admin_models
+from app import models, database, auth, crud
 from app.timezone_utils import now_ph, today_ph
+from app.notification_events import system_notification_item
 
 router = APIRouter()
 
@@ -109,16 +110,10 @@ def mark_notification_as_read(
     # Handle system notifications
     if notif_id.startswith("system-"):
         system_notif_id = int(notif_id.replace("system-", ""))
-        receipt = db.query(admin_models.NotificationReceipt).filter(
-            admin_models.NotificationReceipt.notification_id == system_notif_id,
-            admin_models.NotificationReceipt.user_id == user_id
-        ).first()
+        read_at = crud.mark_system_notification_read(db, system_notif_id, auth.get_bakery_user(db, current_auth))
         
-        if receipt:
-            receipt.is_read = True
-            receipt.read_at = now_ph()
-            db.commit()
-            return {"status": "ok", "id": notif_id, "read_at": receipt.read_at}
+        if read_at:
+            return {"status": "ok", "id": notif_id, "read_at": read_at}
         else:
             raise HTTPException(status_code=404, detail="Notification receipt not found")
 
@@ -264,29 +259,9 @@ def get_all_notifications(
     # System Notifications (Admin announcements)
     system_notifications = []
     
-    # Get all system notifications for this user
-    receipts = db.query(admin_models.NotificationReceipt).filter(
-        admin_models.NotificationReceipt.user_id == user_id,
-        admin_models.NotificationReceipt.is_read == False
-    ).all()
-    
-    for receipt in receipts:
-        notif = receipt.notification
-        
-        # Skip expired notifications
-        if notif.expires_at and notif.expires_at < now_ph():
-            continue
-            
-        system_notifications.append({
-            "id": f"system-{notif.id}",
-            "type": "system_notification",
-            "title": notif.title,
-            "message": notif.message,
-            "notification_type": notif.notification_type,
-            "priority": notif.priority,
-            "sent_at": notif.sent_at.isoformat() if notif.sent_at else None,
-            "read": receipt.is_read
-        })
+    # Unread, unexpired system notifications: this bakery's receipts plus matching broadcasts
+    for notif in crud.get_unread_system_notifications(db, auth.get_bakery_user(db, current_auth)):
+        system_notifications.append(system_notification_item(notif, read=False))
 
     return {
         "products": products_resp["notifications"],
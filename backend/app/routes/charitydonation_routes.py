@@ -14,8 +14,8 @@ from app import models, database
 import os,json
 
 from app.routes.binventory_routes import check_threshold_and_create_donation
-from app.routes.cnotification import haversine
-from app.crud import update_user_badges
+from app.distance import haversine_vector
+from app.crud import update_user_badges, set_request_tracking_status, set_direct_tracking_status, record_message
 
 router = APIRouter()
 UPLOAD_DIR = "uploads/feedback"
@@ -53,7 +53,7 @@ def update_inventory_status(db: Session, inventory_id: int):
         inventory_item.status = "available"
         # Recreate donation if it was deleted but quantity returned
         if not donation:
-            check_threshold_and_create_donation(db)
+            check_threshold_and_create_donation(db, [inventory_id])
     else:
         inventory_item.status = "unavailable"
 
@@ -75,20 +75,29 @@ def get_available_donations(
         .all()
     )
 
+    # Distances from the charity to every listed bakery in a single call
+    distances = [None] * len(donations)
+    if current_user.latitude is not None and current_user.longitude is not None:
+        located = [
+            i for i, (_, bakery) in enumerate(donations)
+            if bakery.latitude is not None and bakery.longitude is not None
+        ]
+        if located:
+            computed = haversine_vector(
+                [(donations[i][1].latitude, donations[i][1].longitude) for i in located],
+                (current_user.latitude, current_user.longitude)
+            )
+            for i, distance in zip(located, computed):
+                distances[i] = round(float(distance), 1)
+
     donation_list = []
-    for donation, bakery in donations:
+    for (donation, bakery), distance_km in zip(donations, distances):
         donation_dict = donation.__dict__.copy()
         donation_dict["bakery_name"] = bakery.name
         donation_dict["bakery_profile_picture"] = bakery.profile_picture 
         if donation_dict.get("image"):
             donation_dict["image"] = donation_dict["image"]
 
-        distance_km = None
-        if (
-            current_user.latitude is not None and current_user.longitude is not None
-            and bakery.latitude is not None and bakery.longitude is not None
-        ):
-            distance_km = round(haversine(bakery.latitude, bakery.longitude, current_user.latitude, current_user.longitude), 1)
         donation_dict["distance_km"] = distance_km
 
         donation_list.append(schemas.DonationRead(**donation_dict))
@@ -398,7 +407,9 @@ def accept_donation(
                     is_read=False,
                     is_card=True
                 )
-                db.add(cancellation_message) 
+                db.add(cancellation_message)
+                db.flush()
+                record_message(db, cancellation_message)
         except Exception as e:
             print(f"Error sending cancellation message for request {cancel_info['request_id']}: {e}")
             continue
@@ -410,7 +421,7 @@ def accept_donation(
     update_inventory_status(db, donation_request.bakery_inventory_id)
     
     # Trigger threshold check
-    check_threshold_and_create_donation(db)
+    check_threshold_and_create_donation(db, [donation_request.bakery_inventory_id])
 
     return {
         "message": "Donation accepted successfully",
@@ -537,7 +548,7 @@ async def submit_feedback(
         db.refresh(feedback)
 
     request_obj.feedback_submitted = True
-    request_obj.tracking_status = "complete"
+    set_request_tracking_status(db, request_obj, "complete")
     if not request_obj.tracking_completed_at: 
         request_obj.tracking_completed_at = date.today()
     db.commit()
@@ -665,7 +676,7 @@ async def submit_direct_feedback(
         db.refresh(feedback)
 
     donation.feedback_submitted = True
-    donation.btracking_status = "complete"
+    set_direct_tracking_status(db, donation, "complete")
     if not donation.btracking_completed_at: 
         donation.btracking_completed_at = date.today()
     db.commit()
@@ -1,17 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import or_, func
 from datetime import datetime, timedelta, time
-from app import models, database, auth, admin_models
+from app import models, database, auth, crud
 from app.timezone_utils import now_ph, today_ph, to_ph_timezone
 
 # For geofence
-from math import radians, cos, sin, asin, sqrt # For geofence calculation helper
+from app.distance import haversine_vector
 from fastapi import BackgroundTasks
-import math, json
+import json
 from app.database import get_db
 
 from app.models import User, Donation, DonationRequest, NotificationRead
+from app.routes.geofence import charities_within
+from app.notification_events import (
+    donation_item, direct_donation_item, accepted_request_item, geofence_item, system_notification_item
+)
 
 router = APIRouter()
 
@@ -28,16 +32,10 @@ def mark_notification_as_read(
     # Handle system notifications
     if notif_id.startswith("system-"):
         system_notif_id = int(notif_id.replace("system-", ""))
-        receipt = db.query(admin_models.NotificationReceipt).filter(
-            admin_models.NotificationReceipt.notification_id == system_notif_id,
-            admin_models.NotificationReceipt.user_id == user_id
-        ).first()
+        read_at = crud.mark_system_notification_read(db, system_notif_id, current_user)
         
-        if receipt:
-            receipt.is_read = True
-            receipt.read_at = now_ph()
-            db.commit()
-            return {"status": "ok", "id": notif_id, "read_at": receipt.read_at}
+        if read_at:
+            return {"status": "ok", "id": notif_id, "read_at": read_at}
         else:
             raise HTTPException(status_code=404, detail="Notification receipt not found")
     
@@ -67,72 +65,104 @@ def mark_notification_as_read(
 
 
 # --- Fetch all message notifications ---
+def _users_by_id(db: Session, user_ids):
+    """Load the given users in one query, keyed by id."""
+    user_ids = {uid for uid in user_ids if uid is not None}
+    if not user_ids:
+        return {}
+    return {u.id: u for u in db.query(models.User).filter(models.User.id.in_(user_ids)).all()}
+
+
+def _message_preview(m, is_card):
+    try:
+        # If flagged as card OR content looks like JSON
+        if is_card or (isinstance(m.content, str) and m.content.strip().startswith("{")):
+            parsed = m.content if isinstance(m.content, dict) else json.loads(m.content)
+
+            type_labels = {
+                "confirmed_donation": "Confirmed Donation",
+                "pending_donation": "Pending Donation",
+                "rejected_donation": "Rejected Donation",
+            }
+            return f" {type_labels.get(parsed.get('type'), 'Donation Update')}"
+
+        # Fallback for plain text
+        return m.content[:30] + ("..." if len(m.content) > 30 else "")
+    except Exception as e:
+        print("[WARN] failed to parse message content:", e)
+        return "Donation update"
+
+
 @router.get("/notifications/charity")
 def get_message_notifications(
     db: Session = Depends(database.get_db),
     current_user=Depends(auth.get_current_user)
 ):
+    """
+    Charity notification feed. Every section is loaded with a fixed number of
+    batched queries (joins / IN lists), independent of how many rows it returns.
+    """
     user_id = current_user.id
+    today = today_ph()
 
+    # All read receipts of this user, split by kind below
+    read_rows = db.query(models.NotificationRead).filter(
+        models.NotificationRead.user_id == user_id,
+        or_(
+            models.NotificationRead.notif_id.like("msg-%"),
+            models.NotificationRead.notif_id.like("donation-%"),
+            models.NotificationRead.notif_id.like("geofence-%")
+        )
+    ).order_by(models.NotificationRead.id).all()
+
+    last_read_by_msg = {}
+    read_ids = set()
+    geofence_entries = []
+    for r in read_rows:
+        if r.notif_id.startswith("msg-"):
+            if r.read_at and (r.notif_id not in last_read_by_msg or r.read_at > last_read_by_msg[r.notif_id]):
+                last_read_by_msg[r.notif_id] = r.read_at
+        elif r.notif_id.startswith("donation-"):
+            donation_id = r.notif_id.split("-")[1]
+            if donation_id.isdigit():
+                read_ids.add(int(donation_id))
+        else:
+            geofence_entries.append(r)
+
+    # --- Messages ---
     messages = db.query(models.Message).filter(
         or_(models.Message.sender_id == user_id, models.Message.receiver_id == user_id)
     ).order_by(models.Message.timestamp.desc()).limit(200).all()
 
-    latest_by_sender = {}
-
+    latest_unread = {}
     for m in messages:
         if m.sender_id == user_id:
             continue
 
         notif_id = f"msg-{m.sender_id}"
-
-        # Fetch last read time for this sender
-        last_read = db.query(models.NotificationRead).filter_by(
-            user_id=user_id, notif_id=notif_id
-        ).order_by(models.NotificationRead.read_at.desc()).first()
-
-        if last_read and m.timestamp <= last_read.read_at:
+        last_read = last_read_by_msg.get(notif_id)
+        if last_read and m.timestamp <= last_read:
             # Message already accounted for in read notification
             continue
 
         # Only keep the latest message per sender
-        if notif_id in latest_by_sender:
-            continue
+        latest_unread.setdefault(notif_id, m)
 
-        sender = db.query(models.User).filter(models.User.id == m.sender_id).first()
-        receiver = db.query(models.User).filter(models.User.id == m.receiver_id).first()
+    users = _users_by_id(
+        db,
+        {m.sender_id for m in latest_unread.values()} | {m.receiver_id for m in latest_unread.values()}
+    )
 
+    latest_messages = []
+    for notif_id, m in latest_unread.items():
+        sender = users.get(m.sender_id)
+        receiver = users.get(m.receiver_id)
         is_card = getattr(m, "is_card", False)
 
-        preview = None
-
-        try:
-            # If flagged as card OR content looks like JSON
-            if is_card or (isinstance(m.content, str) and m.content.strip().startswith("{")):
-                parsed = m.content if isinstance(m.content, dict) else json.loads(m.content)
-
-                type_labels = {
-                    "confirmed_donation": "Confirmed Donation",
-                    "pending_donation": "Pending Donation",
-                    "rejected_donation": "Rejected Donation",
-                }
-
-                donation_type = parsed.get("type")
-                label = type_labels.get(donation_type, "Donation Update")
-
-                bakery_name = parsed.get("bakery_name") or sender.name or "A bakery"
-                preview = f" {label}"
-            else:
-                # Fallback for plain text
-                preview = m.content[:30] + ("..." if len(m.content) > 30 else "")
-        except Exception as e:
-            print("[WARN] failed to parse message content:", e)
-            preview = "Donation update"
-
-        latest_by_sender[notif_id] = {
+        latest_messages.append({
             "id": notif_id,
             "type": "message_card" if is_card else "message",
-            "preview": preview,
+            "preview": _message_preview(m, is_card),
             "sender_id": m.sender_id,
             "receiver_id": m.receiver_id,
             "sender_name": sender.name if sender else f"User {m.sender_id}",
@@ -141,157 +171,126 @@ def get_message_notifications(
             "receiver_profile_picture": receiver.profile_picture if receiver else None,
             "timestamp": m.timestamp.isoformat(),
             "read": False
-        }
+        })
 
-    latest_messages = sorted(latest_by_sender.values(), key=lambda x: x["timestamp"], reverse=True)
+    latest_messages.sort(key=lambda x: x["timestamp"], reverse=True)
 
-    # --- Donations (NEW logic for dynamic notifications) ---
+    # --- Donations (still claimable only; expired rows are dropped by the threshold scan anyway) ---
     donations = []
-    # All NotificationRead entries for donations
-    read_entries = db.query(models.NotificationRead).filter(
-        models.NotificationRead.user_id == user_id,
-        models.NotificationRead.notif_id.like("donation-%")
-    ).all()
-    read_ids = {int(r.notif_id.split("-")[1]) for r in read_entries if r.notif_id.startswith("donation-")}
-
-    # All donations in DB
-    all_donations = db.query(models.Donation).order_by(models.Donation.creation_date.desc()).all()
-    for donation in all_donations:
-        bakery = db.query(models.User).filter(models.User.id == donation.bakery_id).first()
-        # Only for this user: if this donation hasn't been marked as read yet
-        if donation.id not in read_ids:
-            # Calculate distance
-            distance_km = None
-            if bakery and current_user and bakery.latitude and bakery.longitude and current_user.latitude and current_user.longitude:
-                distance_km = round(haversine(
-                    bakery.latitude, bakery.longitude,
-                    current_user.latitude, current_user.longitude
-                ), 1)
-                
-            donations.append({
-                "id": f"donation-{donation.id}-to-{user_id}",
-                "donation_id": donation.id,
-                "name": donation.name,
-                "quantity": donation.quantity,
-                "timestamp": donation.creation_date.isoformat(),
-                "read": False,
-                "bakery_name": bakery.name if bakery else "Unknown bakery",
-                "bakery_profile_picture": bakery.profile_picture if bakery else None,
-                "distance_km": distance_km  #distance 
-            })
-        else:
-            # Already read
-            donations.append({
-                "id": f"donation-{donation.id}-to-{user_id}",
-                "donation_id": donation.id,
-                "name": donation.name,
-                "quantity": donation.quantity,
-                "timestamp": donation.creation_date.isoformat(),
-                "read": True,
-                "bakery_name": bakery.name if bakery else "Unknown bakery",
-                "bakery_profile_picture": bakery.profile_picture if bakery else None,
-                "distance_km": None  # Already read
-            })
+    donation_rows = (
+        db.query(models.Donation, models.User)
+        .outerjoin(models.User, models.User.id == models.Donation.bakery_id)
+        .filter(
+            models.Donation.quantity > 0,
+            or_(models.Donation.expiration_date == None, models.Donation.expiration_date > today)
+        )
+        .order_by(models.Donation.creation_date.desc())
+        .all()
+    )
+
+    # Distance only depends on the bakery, so compute it once per bakery in a single call
+    bakery_distances = {}
+    if current_user.latitude and current_user.longitude:
+        located_bakeries = {
+            bakery.id: bakery for _, bakery in donation_rows
+            if bakery and bakery.latitude and bakery.longitude
+        }
+        if located_bakeries:
+            distances = haversine_vector(
+                [(b.latitude, b.longitude) for b in located_bakeries.values()],
+                (current_user.latitude, current_user.longitude)
+            )
+            bakery_distances = {bid: round(float(d), 1) for bid, d in zip(located_bakeries, distances)}
+
+    for donation, bakery in donation_rows:
+        donations.append(donation_item(
+            donation, bakery, user_id,
+            read=donation.id in read_ids,
+            distance_km=bakery_distances.get(donation.bakery_id)
+        ))
 
     # --- Direct/Received Donations ---
     received_donations = []
 
     # Direct donations (Bakery -> Charity)
     all_received = (
-        db.query(models.DirectDonation)
-        .filter_by(charity_id=user_id)
+        db.query(models.DirectDonation, models.User)
+        .outerjoin(models.BakeryInventory, models.BakeryInventory.id == models.DirectDonation.bakery_inventory_id)
+        .outerjoin(models.User, models.User.id == models.BakeryInventory.bakery_id)
+        .filter(models.DirectDonation.charity_id == user_id)
         .order_by(models.DirectDonation.id.desc())
         .all()
     )
 
-    for rd in all_received:
-        inventory = db.query(models.BakeryInventory).filter_by(id=rd.bakery_inventory_id).first()
-        bakery = db.query(models.User).filter_by(id=inventory.bakery_id).first() if inventory else None
-        received_donations.append({
-            "id": f"direct-{rd.id}-to-{user_id}",
-            "donation_id": rd.id,
-            "name": rd.name,
-            "quantity": rd.quantity,
-            "timestamp": now_ph().isoformat(),
-            "read": rd.id in read_ids,
-            "bakery_name": bakery.name if bakery else "Unknown bakery",
-            "bakery_profile_picture": bakery.profile_picture if bakery else None,
-            "type": "direct",
-            "message": f"{bakery.name if bakery else 'A bakery'} sent a donation"
-        })
+    for rd, bakery in all_received:
+        received_donations.append(direct_donation_item(rd, bakery, user_id, read=rd.id in read_ids))
 
     # Accepted requests (Charity -> Bakery)
     accepted_requests = (
-        db.query(models.DonationRequest)
-        .filter_by(charity_id=user_id, status="accepted")
+        db.query(models.DonationRequest, models.User)
+        .outerjoin(models.User, models.User.id == models.DonationRequest.bakery_id)
+        .filter(models.DonationRequest.charity_id == user_id, models.DonationRequest.status == "accepted")
         .order_by(models.DonationRequest.id.desc())
         .all()
     )
 
-    for ar in accepted_requests:
-        bakery = db.query(models.User).filter_by(id=ar.bakery_id).first()
-        received_donations.append({
-            "id": f"request-{ar.id}-to-{user_id}",
-            "request_id": ar.id,
-            "donation_id": ar.donation_id,
-            "inventory_id": ar.bakery_inventory_id,  
-            "name": ar.donation_name,
-            "quantity": ar.donation_quantity,
-            "timestamp": ar.timestamp.isoformat(),
-            "read": False,
-            "bakery_name": ar.bakery_name or (bakery.name if bakery else "A bakery"),
-            "bakery_profile_picture": ar.bakery_profile_picture or (bakery.profile_picture if bakery else None),
-            "type": "request",
-            "status": ar.status,
-            "message": f"{bakery.name if bakery else 'A bakery'} accepted your request"
-        })
+    for ar, bakery in accepted_requests:
+        received_donations.append(accepted_request_item(ar, bakery, user_id))
 
     # Sort donations: unread first, then by newest
     donations.sort(key=lambda d: (d["read"], -datetime.fromisoformat(d["timestamp"]).timestamp()))
     received_donations.sort(key=lambda d: (d["read"], -datetime.fromisoformat(d["timestamp"]).timestamp()))
 
     # --- Geofence Notifications ---
-    geofence_notifs = []
-    geofence_entries = db.query(models.NotificationRead).filter(
-        models.NotificationRead.user_id == user_id,
-        models.NotificationRead.notif_id.like("geofence-%")
-    ).all()
-
+    # notif_id looks like "geofence-<donation_id>-to-<charity_id>"
+    parsed_entries = []
     for entry in geofence_entries:
-        try:
-            # notif_id looks like "geofence-<donation_id>-to-<charity_id>"
-            parts = entry.notif_id.split("-")
-            donation_id = parts[1] if len(parts) >= 4 else None
-
-            # Fetch related donation
-            donation = db.query(models.Donation).filter_by(id=int(donation_id)).first() if donation_id and donation_id.isdigit() else None
-            if not donation:
-                continue
-
-            bakery = db.query(models.User).filter_by(id=donation.bakery_id).first()
-            charity = db.query(models.User).filter_by(id=int(parts[-1])).first() if len(parts) >= 4 else None
-
-            # Calculate distance
-            distance_km = None
-            if bakery and charity and bakery.latitude and bakery.longitude and charity.latitude and charity.longitude:
-                distance_km = round(haversine(
-                    bakery.latitude, bakery.longitude,
-                    charity.latitude, charity.longitude
-                ), 1)
+        parts = entry.notif_id.split("-")
+        if len(parts) < 4 or not parts[1].isdigit() or not parts[-1].isdigit():
+            continue
+        parsed_entries.append((entry, int(parts[1]), int(parts[-1])))
+
+    geofence_donations = {}
+    if parsed_entries:
+        geofence_donations = {
+            d.id: d for d in db.query(models.Donation).filter(
+                models.Donation.id.in_({donation_id for _, donation_id, _ in parsed_entries})
+            ).all()
+        }
+    geofence_users = _users_by_id(
+        db,
+        {d.bakery_id for d in geofence_donations.values()} | {charity_id for _, _, charity_id in parsed_entries}
+    )
 
+    geofence_rows = []
+    for entry, donation_id, charity_id in parsed_entries:
+        donation = geofence_donations.get(donation_id)
+        if not donation:
+            continue
+        geofence_rows.append((entry, donation, geofence_users.get(donation.bakery_id), geofence_users.get(charity_id)))
+
+    # Calculate all bakery → charity distances in one call
+    located = [
+        i for i, (_, _, bakery, charity) in enumerate(geofence_rows)
+        if bakery and charity and bakery.latitude and bakery.longitude and charity.latitude and charity.longitude
+    ]
+    geofence_distances = {}
+    if located:
+        distances = haversine_vector(
+            [(geofence_rows[i][2].latitude, geofence_rows[i][2].longitude) for i in located],
+            [(geofence_rows[i][3].latitude, geofence_rows[i][3].longitude) for i in located]
+        )
+        geofence_distances = {i: round(float(d), 1) for i, d in zip(located, distances)}
+
+    geofence_notifs = []
+    for i, (entry, donation, bakery, charity) in enumerate(geofence_rows):
+        try:
             # ✅ Keep notif_id for DB, add numeric id for frontend highlight
-            geofence_notifs.append({
-                "id": int(donation.id),  # for frontend zoom
-                "notif_id": entry.notif_id,  # for backend tracking
-                "type": "geofence",
-                "name": donation.name,
-                "quantity": donation.quantity,
-                "expiration_date": donation.expiration_date.isoformat(),
-                "bakery_name": bakery.name if bakery else "Unknown bakery",
-                "bakery_profile_picture": bakery.profile_picture if bakery else None,
-                "read": entry.read_at is not None,
-                "distance_km": distance_km
-            })
+            geofence_notifs.append(geofence_item(
+                entry.notif_id, donation, bakery,
+                read=entry.read_at is not None,
+                distance_km=geofence_distances.get(i)
+            ))
 
         except Exception as e:
             print("[Geofence] Parse error:", e)
@@ -300,29 +299,9 @@ def get_message_notifications(
     # System Notifications (Admin announcements)
     system_notifications = []
     
-    # Get all system notifications for this user
-    receipts = db.query(admin_models.NotificationReceipt).filter(
-        admin_models.NotificationReceipt.user_id == user_id,
-        admin_models.NotificationReceipt.is_read == False
-    ).all()
-    
-    for receipt in receipts:
-        notif = receipt.notification
-        
-        # Skip expired notifications
-        if notif.expires_at and notif.expires_at < now_ph():
-            continue
-            
-        system_notifications.append({
-            "id": f"system-{notif.id}",
-            "type": "system_notification",
-            "title": notif.title,
-            "message": notif.message,
-            "notification_type": notif.notification_type,
-            "priority": notif.priority,
-            "sent_at": notif.sent_at.isoformat() if notif.sent_at else None,
-            "read": receipt.is_read
-        })
+    # Unread, unexpired system notifications: this user's receipts plus matching broadcasts
+    for notif in crud.get_unread_system_notifications(db, current_user):
+        system_notifications.append(system_notification_item(notif, read=False))
 
     return {
         "messages": latest_messages,
@@ -333,22 +312,6 @@ def get_message_notifications(
     }
 
 
-# Geofence Helper
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371  # km
-    d_lat = math.radians(lat2 - lat1)
-    d_lon = math.radians(lon2 - lon1)
-    a = (
-        math.sin(d_lat/2)**2
-        + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(d_lon/2)**2
-    )
-    distance = 2 * R * math.asin(math.sqrt(a))
-    
-    # Debug print
-    print(f"[Distance] Bakery ({lat1},{lon1}) → Charity ({lat2},{lon2}) = {distance:.2f} km")
-    
-    return distance
-
 @router.post("/notifications/geofence/run")
 def run_geofence_notifications(db: Session = Depends(get_db)):
     today = today_ph()
@@ -361,6 +324,11 @@ def run_geofence_notifications(db: Session = Depends(get_db)):
         .all()
     )
 
+    max_radius = max(
+        db.query(func.max(User.notification_radius_km)).filter(User.role == "Charity").scalar() or 0,
+        10
+    )
+
     for donation in expiring:
         # Skip if already linked to a pending/accepted request
         active_req = (
@@ -379,17 +347,9 @@ def run_geofence_notifications(db: Session = Depends(get_db)):
         if not bakery or not (bakery.latitude and bakery.longitude):
             continue
 
-        # Iterate all charities
-        charities = db.query(User).filter(User.role == "Charity").all()
-        for charity in charities:
-            if not (charity.latitude and charity.longitude):
-                continue
-
-            distance = haversine(
-                bakery.latitude, bakery.longitude,
-                charity.latitude, charity.longitude
-            )
-
+        # Only charities inside the widest notification radius can match
+        nearby = charities_within(db, bakery.latitude, bakery.longitude, max_radius)
+        for charity, distance in nearby:
             if distance <= (charity.notification_radius_km or 10):
                 notif_id = f"geofence-{donation.id}-to-{charity.id}"
 
@@ -439,8 +399,9 @@ def process_geofence_notifications(db: Session, bakery_id: int):
         print(f"[Geofence] ❌ Bakery {bakery_id} missing coords")
         return
 
-    charities = db.query(User).filter(User.role == "Charity").all()
-    print(f"[Geofence] Checking {len(charities)} charities for notifications")
+    # Every donation shares the bakery's coordinates, so one box query covers both waves
+    nearby = charities_within(db, bakery.latitude, bakery.longitude, 10)
+    print(f"[Geofence] {len(nearby)} charities within 10km")
 
     for donation in expiring:
         print(f"\n[Geofence] Donation {donation.id} - {donation.name} exp {donation.expiration_date}")
@@ -462,31 +423,18 @@ def process_geofence_notifications(db: Session, bakery_id: int):
             db.commit()
             continue
 
-        for charity in charities:
-            if not (charity.latitude and charity.longitude):
-                print(f"  ⚠️ Charity {charity.id} missing coords → skipped")
-                continue
-
-            distance = haversine(bakery.latitude, bakery.longitude, charity.latitude, charity.longitude)
-
-            # --- Wave logic ---
-            if donation.expiration_date == two_days_from_now:
-                # First wave → 5 km
-                if distance > 5:
-                    print(f"   ❌ Charity {charity.id} outside/not 5km (first wave)")
-                    continue
-
-            elif donation.expiration_date == one_day_from_now:
-                # Second wave → 10 km, remove old 10km notifications first
-                db.query(NotificationRead).filter(
-                    NotificationRead.notif_id == f"geofence-{donation.id}-to-{charity.id}"
-                ).delete()
-                if distance > 10:
-                    print(f"   ❌ Charity {charity.id} outside/not 10km (second wave)")
-                    continue
-                else:
-                    print(f"   🗑 Removed old 2-day notif for donation {donation.id} → Charity {charity.id}")
+        # --- Wave logic ---
+        if donation.expiration_date == two_days_from_now:
+            # First wave → 5 km
+            wave = [(charity, distance) for charity, distance in nearby if distance <= 5]
+        else:
+            # Second wave → 10 km, remove old notifications first
+            db.query(NotificationRead).filter(
+                NotificationRead.notif_id.like(f"geofence-{donation.id}-to-%")
+            ).delete(synchronize_session=False)
+            wave = nearby
 
+        for charity, distance in wave:
             notif_id = f"geofence-{donation.id}-to-{charity.id}"
             notif = db.query(NotificationRead).filter_by(user_id=charity.id, notif_id=notif_id).first()
 
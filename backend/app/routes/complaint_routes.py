@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app import crud, schemas, database, auth, models
-from app.email_utils import send_email
+from app.email_outbox import enqueue_email
 from pydantic import BaseModel
 from datetime import datetime
 from app.timezone_utils import now_ph
@@ -79,7 +79,7 @@ def update_complaint_status(
         
         if user:
             # Create a system notification for the user
-            from app.admin_models import SystemNotification, NotificationReceipt
+            from app.admin_models import SystemNotification
             notification = SystemNotification(
                 title=f"Complaint Update: {complaint.subject}",
                 message=f"Your complaint is now under review. We are looking into your concern and will get back to you soon.",
@@ -95,12 +95,7 @@ def update_complaint_status(
             db.flush()  # Get the notification ID
             
             # Create notification receipt for the user
-            receipt = NotificationReceipt(
-                notification_id=notification.id,
-                user_id=user.id,
-                is_read=False
-            )
-            db.add(receipt)
+            crud.create_notification_receipts(db, notification.id, [user.id])
             db.commit()
     
     return complaint
@@ -143,7 +138,7 @@ def reply_to_complaint(
     complaint.replied_by = current_user.id
     
     # Create a system notification for the user
-    from app.admin_models import SystemNotification, NotificationReceipt
+    from app.admin_models import SystemNotification
     notification = SystemNotification(
         title=f"Complaint Response: {complaint.subject}",
         message=f"Admin has replied to your complaint.\n\nStatus: {reply.status}\n\nResponse: {reply.message}",
@@ -159,18 +154,14 @@ def reply_to_complaint(
     db.flush()  # Get the notification ID
     
     # Create notification receipt for the user
-    receipt = NotificationReceipt(
-        notification_id=notification.id,
-        user_id=user.id,
-        is_read=False
-    )
-    db.add(receipt)
+    crud.create_notification_receipts(db, notification.id, [user.id])
     
     db.commit()
     
     # Send email to user
     try:
-        send_email(
+        enqueue_email(
+            db,
             to_email=user.email,
             subject=f"Reply to Your Complaint: {complaint.subject}",
             html_content=f"""
@@ -201,6 +192,7 @@ def reply_to_complaint(
             </div>
             """
         )
+        db.commit()
     except Exception as e:
         print(f"Failed to send email: {e}")
         # Don't fail the request if email fails
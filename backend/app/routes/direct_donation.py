@@ -10,7 +10,7 @@ from sqlalchemy import func, true
 from app.database import get_db
 from app.auth import get_current_user
 from app.models import User 
-from app.crud import update_user_badges
+from app.crud import update_user_badges, set_request_tracking_status, set_direct_tracking_status
 from app.auth import get_bakery_id_from_auth, get_donor_name_from_auth
 
 from app import models, schemas, database, auth
@@ -92,7 +92,7 @@ async def create_direct_donation(
             print(f"Removed auto-donation for fully donated item: {inventory_item.name}")
 
     db.commit()
-    check_threshold_and_create_donation(db)
+    check_threshold_and_create_donation(db, [inventory_item.id])
     db.refresh(direct_donation)
 
     return direct_donation
@@ -167,8 +167,8 @@ def update_direct_tracking(
     if not donation:
         raise HTTPException(status_code=404, detail="Direct donation not found")
 
-    # Update direct donation status
-    donation.btracking_status = data.btracking_status
+    # Update direct donation status (keeps donation_totals in the same transaction)
+    set_direct_tracking_status(db, donation, data.btracking_status)
 
     # Auto set timestamp if complete
     if data.btracking_status.lower() == "complete" and not donation.btracking_completed_at:
@@ -178,19 +178,13 @@ def update_direct_tracking(
     db.refresh(donation)
 
     # Update all related donation_requests
-    if data.btracking_status.lower() == "complete":
-        db.query(models.DonationRequest).filter(
-            models.DonationRequest.donation_id == direct_donation_id
-        ).update({
-            "tracking_status": data.btracking_status,
-            "tracking_completed_at": now_ph()  # <-- FIX: also stamp request side
-        })
-    else:
-        db.query(models.DonationRequest).filter(
-            models.DonationRequest.donation_id == direct_donation_id
-        ).update({
-            "tracking_status": data.btracking_status
-        })
+    related_requests = db.query(models.DonationRequest).filter(
+        models.DonationRequest.donation_id == direct_donation_id
+    ).all()
+    for related in related_requests:
+        set_request_tracking_status(db, related, data.btracking_status)
+        if data.btracking_status.lower() == "complete":
+            related.tracking_completed_at = now_ph()  # <-- FIX: also stamp request side
 
     db.commit()
     
@@ -301,7 +295,7 @@ def update_tracking_status(
     if not donation_request:
         raise HTTPException(status_code=404, detail="Donation request not found")
 
-    donation_request.tracking_status = data.tracking_status
+    set_request_tracking_status(db, donation_request, data.tracking_status)
 
     if data.tracking_status.lower() == "complete" and not donation_request.tracking_completed_at:
         donation_request.tracking_completed_at = date.today()
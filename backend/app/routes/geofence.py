@@ -4,6 +4,7 @@ from app import database, models
 from datetime import datetime, timedelta
 from app.timezone_utils import now_ph
 import math
+from app.distance import EARTH_RADIUS_KM, haversine_vector
 import httpx
 import os
 
@@ -13,16 +14,47 @@ router = APIRouter(prefix="/geofence", tags=["geofence"])
 
 GOOGLE_API_KEY = os.getenv("VITE_GOOGLE_MAPS_API_KEY")
 
-# --- Haversine formula ---
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371  # km
-    d_lat = math.radians(lat2 - lat1)
-    d_lon = math.radians(lon2 - lon1)
-    a = (
-        math.sin(d_lat / 2) ** 2
-        + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(d_lon / 2) ** 2
-    )
-    return 2 * R * math.asin(math.sqrt(a))
+# --- Bounding-box prefilter ---
+def bounding_box(lat, lon, radius_km):
+    """
+    Return (min_lat, max_lat, min_lon, max_lon) of a box enclosing the radius_km circle.
+    Uses the same sphere as haversine, so no charity haversine keeps is cut off by the box.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    d_lat = math.degrees(angle)
+    cos_lat = math.cos(math.radians(lat))
+    if abs(lat) + d_lat >= 90 or angle >= math.pi / 2 or math.sin(angle) >= cos_lat:
+        d_lon = 180  # the circle reaches a pole: every longitude
+    else:
+        # Widest longitude offset of the circle (reached slightly off the parallel)
+        d_lon = math.degrees(math.asin(math.sin(angle) / cos_lat))
+    return lat - d_lat, lat + d_lat, lon - d_lon, lon + d_lon
+
+def charities_within(db: Session, lat, lon, radius_km):
+    """
+    Charities within radius_km of (lat, lon) as (charity, distance_km) pairs, nearest first.
+    A lat/lon box filter (backed by ix_users_role_lat_lon) narrows the candidates in SQL,
+    so haversine only runs on charities that can actually be in range.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    candidates = db.query(models.User).filter(
+        models.User.role == "Charity",
+        models.User.latitude.between(min_lat, max_lat),
+        models.User.longitude.between(min_lon, max_lon)
+    ).all()
+
+    if not candidates:
+        return []
+
+    distances = haversine_vector((lat, lon), [(c.latitude, c.longitude) for c in candidates])
+    matches = [
+        (charity, float(distance))
+        for charity, distance in zip(candidates, distances)
+        if distance <= radius_km
+    ]
+
+    matches.sort(key=lambda m: m[1])
+    return matches
 
 # --- Geocode address using Google Maps ---
 async def geocode_address(address: str):
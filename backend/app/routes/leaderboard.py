@@ -1,11 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, case
+from sqlalchemy import func, desc, case, select
 from typing import List, Optional
-from datetime import datetime, date
 
 from app.database import get_db
-from app.models import User, Donation, DonationRequest, DirectDonation, BakeryInventory
+from app.models import User, Donation, DonationRequest, DirectDonation, BakeryInventory, DonationTotal
 from app.auth import get_current_user
 
 router = APIRouter(prefix="/leaderboard", tags=["Leaderboard"])
@@ -24,9 +23,56 @@ def get_current_admin(current_user: User = Depends(get_current_user), db: Sessio
     return current_user
 
 
+def _ranked_leaderboard(db: Session, role: str, limit: Optional[int], offset: Optional[int]):
+    """
+    Build the leaderboard for one side (bakery or charity) in a single statement.
+
+    Per-user totals are summed from the donation_totals rollup (bakeries hold
+    what they gave, charities what they received), joined to the verified users
+    of the given role and ranked with a window function, so the rank stays
+    global when the page is cut with LIMIT/OFFSET at the database level.
+    """
+    day_count = DonationTotal.request_count + DonationTotal.direct_count
+
+    totals = select(
+        DonationTotal.user_id,
+        func.sum(day_count).label("total_count"),
+        func.sum(DonationTotal.request_quantity + DonationTotal.direct_quantity).label("total_quantity"),
+        func.max(case((day_count > 0, DonationTotal.day))).label("latest_date")
+    ).group_by(DonationTotal.user_id).subquery()
+
+    total_count = func.coalesce(totals.c.total_count, 0)
+    total_quantity = func.coalesce(totals.c.total_quantity, 0)
+    ordering = (total_quantity.desc(), User.id)
+
+    query = db.query(
+        User.id,
+        User.name,
+        User.profile_picture,
+        User.verified,
+        total_count.label("total_count"),
+        total_quantity.label("total_quantity"),
+        totals.c.latest_date,
+        func.row_number().over(order_by=ordering).label("rank")
+    ).outerjoin(
+        totals, totals.c.user_id == User.id
+    ).filter(
+        User.role.ilike(role),
+        User.verified == True
+    ).order_by(*ordering)
+
+    if offset:
+        query = query.offset(offset)
+    if limit:
+        query = query.limit(limit)
+
+    return query.all()
+
+
 @router.get("/summary")
 def get_leaderboard_summary(
-    limit: Optional[int] = 10,
+    limit: Optional[int] = Query(10, ge=0),
+    offset: Optional[int] = Query(0, ge=0),
     current_user: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
@@ -42,85 +88,27 @@ def get_leaderboard_summary(
     - latest_donation_date: Date of most recent donation
     - rank: Position in leaderboard based on total quantity
     """
-    
-    # Get all verified bakeries only
-    bakeries = db.query(User).filter(
-        User.role.ilike("bakery"),
-        User.verified == True
-    ).all()
-    
-    leaderboard_data = []
-    
-    for bakery in bakeries:
-        # Count completed donation requests
-        request_donations = db.query(
-            func.count(DonationRequest.id).label('count'),
-            func.sum(DonationRequest.donation_quantity).label('quantity'),
-            func.max(DonationRequest.timestamp).label('latest_date')
-        ).filter(
-            DonationRequest.bakery_id == bakery.id,
-            DonationRequest.tracking_status.ilike('complete')
-        ).first()
-        
-        # Count completed direct donations
-        direct_donations = db.query(
-            func.count(DirectDonation.id).label('count'),
-            func.sum(DirectDonation.quantity).label('quantity'),
-            func.max(DirectDonation.creation_date).label('latest_date')
-        ).join(
-            BakeryInventory,
-            DirectDonation.bakery_inventory_id == BakeryInventory.id
-        ).filter(
-            BakeryInventory.bakery_id == bakery.id,
-            DirectDonation.btracking_status.ilike('complete')
-        ).first()
-        
-        # Aggregate totals
-        total_donations = (request_donations.count or 0) + (direct_donations.count or 0)
-        total_quantity = (request_donations.quantity or 0) + (direct_donations.quantity or 0)
-        
-        # Get latest donation date
-        dates = []
-        if request_donations.latest_date:
-            if isinstance(request_donations.latest_date, datetime):
-                dates.append(request_donations.latest_date.date())
-            elif isinstance(request_donations.latest_date, date):
-                dates.append(request_donations.latest_date)
-                
-        if direct_donations.latest_date:
-            if isinstance(direct_donations.latest_date, datetime):
-                dates.append(direct_donations.latest_date.date())
-            elif isinstance(direct_donations.latest_date, date):
-                dates.append(direct_donations.latest_date)
-        
-        latest_donation_date = max(dates) if dates else None
-        
-        leaderboard_data.append({
-            "bakery_id": bakery.id,
-            "bakery_name": bakery.name,
-            "total_donations": total_donations,
-            "total_quantity": int(total_quantity) if total_quantity else 0,
-            "latest_donation_date": latest_donation_date.isoformat() if latest_donation_date else None,
-            "profile_picture": bakery.profile_picture,
-            "verified": bakery.verified
-        })
-    
-    # Sort by total_quantity (descending) and assign ranks
-    leaderboard_data.sort(key=lambda x: x['total_quantity'], reverse=True)
-    
-    for idx, entry in enumerate(leaderboard_data, start=1):
-        entry['rank'] = idx
-    
-    # Apply limit if specified
-    if limit:
-        leaderboard_data = leaderboard_data[:limit]
-    
-    return leaderboard_data
+    rows = _ranked_leaderboard(db, "bakery", limit, offset)
+
+    return [
+        {
+            "bakery_id": row.id,
+            "bakery_name": row.name,
+            "total_donations": int(row.total_count),
+            "total_quantity": int(row.total_quantity),
+            "latest_donation_date": row.latest_date.isoformat() if row.latest_date else None,
+            "profile_picture": row.profile_picture,
+            "verified": row.verified,
+            "rank": int(row.rank)
+        }
+        for row in rows
+    ]
 
 
 @router.get("/charities")
 def get_charity_leaderboard(
-    limit: Optional[int] = 10,
+    limit: Optional[int] = Query(10, ge=0),
+    offset: Optional[int] = Query(0, ge=0),
     current_user: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
@@ -136,77 +124,21 @@ def get_charity_leaderboard(
     - latest_received_date: Date of most recent received donation
     - rank: Position in leaderboard based on total quantity received
     """
-    
-    # Get all verified charities only
-    charities = db.query(User).filter(
-        User.role.ilike("charity"),
-        User.verified == True
-    ).all()
-    
-    charity_data = []
-    
-    for charity in charities:
-        # Count completed donation requests received
-        request_received = db.query(
-            func.count(DonationRequest.id).label('count'),
-            func.sum(DonationRequest.donation_quantity).label('quantity'),
-            func.max(DonationRequest.timestamp).label('latest_date')
-        ).filter(
-            DonationRequest.charity_id == charity.id,
-            DonationRequest.tracking_status.ilike('complete')
-        ).first()
-        
-        # Count completed direct donations received
-        direct_received = db.query(
-            func.count(DirectDonation.id).label('count'),
-            func.sum(DirectDonation.quantity).label('quantity'),
-            func.max(DirectDonation.creation_date).label('latest_date')
-        ).filter(
-            DirectDonation.charity_id == charity.id,
-            DirectDonation.btracking_status.ilike('complete')
-        ).first()
-        
-        # Aggregate totals
-        total_received = (request_received.count or 0) + (direct_received.count or 0)
-        total_quantity_received = (request_received.quantity or 0) + (direct_received.quantity or 0)
-        
-        # Get latest received date
-        dates = []
-        if request_received.latest_date:
-            if isinstance(request_received.latest_date, datetime):
-                dates.append(request_received.latest_date.date())
-            elif isinstance(request_received.latest_date, date):
-                dates.append(request_received.latest_date)
-                
-        if direct_received.latest_date:
-            if isinstance(direct_received.latest_date, datetime):
-                dates.append(direct_received.latest_date.date())
-            elif isinstance(direct_received.latest_date, date):
-                dates.append(direct_received.latest_date)
-        
-        latest_received_date = max(dates) if dates else None
-        
-        charity_data.append({
-            "charity_id": charity.id,
-            "charity_name": charity.name,
-            "total_received": total_received,
-            "total_quantity_received": int(total_quantity_received) if total_quantity_received else 0,
-            "latest_received_date": latest_received_date.isoformat() if latest_received_date else None,
-            "profile_picture": charity.profile_picture,
-            "verified": charity.verified
-        })
-    
-    # Sort by total_quantity_received (descending) and assign ranks
-    charity_data.sort(key=lambda x: x['total_quantity_received'], reverse=True)
-    
-    for idx, entry in enumerate(charity_data, start=1):
-        entry['rank'] = idx
-    
-    # Apply limit if specified
-    if limit:
-        charity_data = charity_data[:limit]
-    
-    return charity_data
+    rows = _ranked_leaderboard(db, "charity", limit, offset)
+
+    return [
+        {
+            "charity_id": row.id,
+            "charity_name": row.name,
+            "total_received": int(row.total_count),
+            "total_quantity_received": int(row.total_quantity),
+            "latest_received_date": row.latest_date.isoformat() if row.latest_date else None,
+            "profile_picture": row.profile_picture,
+            "verified": row.verified,
+            "rank": int(row.rank)
+        }
+        for row in rows
+    ]
 
 
 @router.get("/top-performers")
@@ -220,10 +152,10 @@ def get_top_performers(
     """
     
     # Get top 3 bakeries
-    bakeries_leaderboard = get_leaderboard_summary(limit=3, current_user=current_user, db=db)
+    bakeries_leaderboard = get_leaderboard_summary(limit=3, offset=0, current_user=current_user, db=db)
     
     # Get top 3 charities
-    charities_leaderboard = get_charity_leaderboard(limit=3, current_user=current_user, db=db)
+    charities_leaderboard = get_charity_leaderboard(limit=3, offset=0, current_user=current_user, db=db)
     
     return {
         "top_bakeries": bakeries_leaderboard,
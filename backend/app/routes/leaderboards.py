@@ -16,56 +16,30 @@ def get_bakery_leaderboard(
     if current_user.role != "Admin":
         raise HTTPException(status_code=403, detail="Access denied")
 
-    # ---- 1️⃣ Direct donations ----
-    direct_donations = (
-        db.query(
-            models.User.id.label("bakery_id"),
-            models.User.name.label("bakery_name"),
-            func.coalesce(func.sum(models.DirectDonation.quantity), 0).label("total_direct")
-        )
-        .join(models.BakeryInventory, models.DirectDonation.bakery_inventory_id == models.BakeryInventory.id)
-        .join(models.User, models.BakeryInventory.bakery_id == models.User.id)
-        .filter(models.DirectDonation.btracking_status == "complete")
-        .filter(models.User.role == "Bakery")
-        .group_by(models.User.id, models.User.name)
-        .subquery()
+    # ---- 1️⃣ Totals per bakery from the donation_totals rollup ----
+    total_donated = (
+        func.sum(models.DonationTotal.request_quantity)
+        + func.sum(models.DonationTotal.direct_quantity)
     )
 
-    # ---- 2️⃣ Requested donations ----
-    request_donations = (
+    results = (
         db.query(
             models.User.id.label("bakery_id"),
             models.User.name.label("bakery_name"),
-            func.coalesce(func.sum(models.DonationRequest.donation_quantity), 0).label("total_requested")
+            total_donated.label("total_donated")
         )
-        .join(models.User, models.DonationRequest.bakery_id == models.User.id)
-        .filter(models.DonationRequest.tracking_status == "complete")
+        .join(models.DonationTotal, models.DonationTotal.user_id == models.User.id)
         .filter(models.User.role == "Bakery")
         .group_by(models.User.id, models.User.name)
-        .subquery()
-    )
-
-    # ---- 3️⃣ Combine totals ----
-    results = (
-        db.query(
-            func.coalesce(direct_donations.c.bakery_id, request_donations.c.bakery_id).label("bakery_id"),
-            func.coalesce(direct_donations.c.bakery_name, request_donations.c.bakery_name).label("bakery_name"),
-            (
-                func.coalesce(direct_donations.c.total_direct, 0)
-                + func.coalesce(request_donations.c.total_requested, 0)
-            ).label("total_donated")
-        )
-        .outerjoin(request_donations, direct_donations.c.bakery_id == request_donations.c.bakery_id)
-        .order_by(
-            (
-                func.coalesce(direct_donations.c.total_direct, 0)
-                + func.coalesce(request_donations.c.total_requested, 0)
-            ).desc()
+        .having(
+            func.sum(models.DonationTotal.request_count)
+            + func.sum(models.DonationTotal.direct_count) > 0
         )
+        .order_by(total_donated.desc())
         .all()
     )
 
-    # ---- 4️⃣ Format leaderboard ----
+    # ---- 2️⃣ Format leaderboard ----
     leaderboard = [
         {
             "rank": idx + 1,
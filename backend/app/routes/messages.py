@@ -1,39 +1,66 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, func
-from app import models, database
-from datetime import datetime
+from sqlalchemy import func
+from app import models, database, crud, chat_attachments, auth
 from app.timezone_utils import now_ph
 from app.chat_manager import manager
 
-import base64, os, json
-from uuid import uuid4
+import asyncio, os, json
+from concurrent.futures import ThreadPoolExecutor
 
 router = APIRouter(prefix="/ws", tags=["Messages"])
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Database work of the chat socket runs here instead of on the event loop, so a
+# slow query only delays its own client. Each call gets its own short-lived session.
+CHAT_DB_WORKERS = int(os.getenv("CHAT_DB_WORKERS", "16"))
+_db_executor = ThreadPoolExecutor(max_workers=CHAT_DB_WORKERS, thread_name_prefix="chat-db")
+
+
+def _with_session(fn, *args):
+    db = database.SessionLocal()
+    try:
+        return fn(db, *args)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def run_db(fn, *args):
+    """Run fn(db, *args) on the chat DB executor with a fresh session."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, _with_session, fn, *args)
+
+
+@router.get("/stats")
+def get_ws_stats(current_admin=Depends(auth.get_current_admin)):
+    """Connection, queue depth and dropped-frame counters of this worker."""
+    return manager.get_stats()
+
+
 @router.websocket("/messages/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: int):
     connection_error = None
     try:
         print(f"[WS] Accepting connection for user {user_id}")
         await websocket.accept()
-        
+
         # Log connection details
         client = websocket.client
         print(f"[WS] Client connecting from: {client.host}:{client.port}")
-        
+
         # Check headers
         headers = dict(websocket.headers)
         print(f"[WS] Connection headers: {headers}")
-        
+
         # Check origin
         origin = headers.get('origin', 'unknown')
         print(f"[WS] Connection origin: {origin}")
-        
+
         await manager.connect(int(user_id), websocket)
-        db = database.SessionLocal()
         print(f"[WS] User {user_id} successfully connected")
     except Exception as e:
         connection_error = str(e)
@@ -44,19 +71,25 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int):
 
     try:
         # Send active chats immediately
-        await send_active_chats(db, int(user_id), websocket)
+        await send_active_chats(int(user_id), websocket)
 
         while True:
             data = await websocket.receive_json()
+            manager.touch(websocket)
             msg_type = data.get("type")
 
-            # Send message 
+            # Heartbeat reply to the server's {"type": "ping"}
+            if msg_type == "pong":
+                continue
+
+            # Send message
             if msg_type == "message":
                 receiver_id = int(data.get("receiver_id"))
                 content = data.get("content")
-                media = data.get("media")          # base64 string
+                attachment_id = data.get("attachment_id")  # from POST /messages/attachments
+                media = data.get("media")          # legacy: base64 string
                 media_type = data.get("media_type")  # "image/png" or "video/mp4"
-                file_url = None
+                image = video = None
                 is_card = False
 
                 # Check if content is a donation card
@@ -68,103 +101,58 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int):
                     pass  # plain text message
 
                 # Require at least one of them
-                if receiver_id and (content or media):
-                    # Handle media if exists
-                    if media:
-                        import base64, os
-                        from uuid import uuid4
-
-                        UPLOAD_DIR = "uploads"
-                        os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-                        ext = "mp4" if "video" in media_type else "png"  # adjust jpg/jpeg if needed
-                        filename = f"{uuid4().hex}.{ext}"
-                        path = os.path.join(UPLOAD_DIR, filename)
-                        with open(path, "wb") as f:
-                            f.write(base64.b64decode(media))
-                        file_url = f"/uploads/{filename}"
-
-                    # Save message in DB
-                    new_msg = models.Message(
-                        sender_id=int(user_id),
-                        receiver_id=receiver_id,
-                        content=content,
-                        image=file_url if media and "image" in media_type else None,
-                        video=file_url if media and "video" in media_type else None,
-                        timestamp=now_ph(),
-                        is_card=is_card,
-                        is_read=False
-                    )
-                    db.add(new_msg)
-                    db.commit()
-                    db.refresh(new_msg)
-
-                    payload = {
-                        "type": "message",
-                        "id": int(new_msg.id),
-                        "sender_id": new_msg.sender_id,
-                        "receiver_id": new_msg.receiver_id,
-                        "content": new_msg.content,
-                        "image": new_msg.image,
-                        "video": new_msg.video,
-                        "timestamp": new_msg.timestamp.isoformat(),
-                        "is_read": new_msg.is_read,
-                        "is_card": new_msg.is_card,
-                    }
-                    # Send to both sender & receiver
-                    await manager.send_personal_message(payload, new_msg.receiver_id)
-                    await manager.send_personal_message(payload, new_msg.sender_id)
+                if receiver_id and (content or attachment_id or media):
+                    # Legacy inline media: decode and write in a worker thread
+                    if media and not attachment_id:
+                        file_url = await asyncio.to_thread(chat_attachments.store_base64, media, media_type)
+                        image = file_url if "image" in media_type else None
+                        video = file_url if "video" in media_type else None
+
+                    try:
+                        payload, summaries = await run_db(
+                            save_message, int(user_id), receiver_id, content, image, video, is_card, attachment_id
+                        )
+                    except chat_attachments.AttachmentError as e:
+                        await manager.reply(websocket, {"type": "error", "detail": str(e)})
+                        continue
 
+                    # Send to both sender & receiver
+                    await manager.send_personal_message(payload, payload["receiver_id"])
+                    await manager.send_personal_message(payload, payload["sender_id"])
 
                     # Update active chats
-                    for uid in [new_msg.sender_id, new_msg.receiver_id]:
+                    for uid, summary in summaries.items():
                         await manager.send_personal_message(
-                            {
-                                "type": "active_chats_update",
-                                "chat": build_chat_summary(db, new_msg, uid),
-                            },
+                            {"type": "active_chats_update", "chat": summary},
                             uid
                         )
 
             # Delete message
             elif msg_type == "delete_message":
                 msg_id = int(data.get("id"))
-                msg = db.query(models.Message).filter(models.Message.id == msg_id).first()
-                if msg:
-                    # Optional: only allow sender to delete
-                    if msg.sender_id == user_id:
-                        db.delete(msg)
-                        db.commit()
+                participants = await run_db(delete_message, int(user_id), msg_id)
+                if participants:
                     # Notify both sender and receiver to remove from frontend
                     payload = {"type": "delete_message", "id": msg_id}
-                    await manager.send_personal_message(payload, msg.sender_id)
-                    await manager.send_personal_message(payload, msg.receiver_id)
+                    for uid in participants:
+                        await manager.send_personal_message(payload, uid)
 
             elif msg_type == "delete_for_me":
                 msg_id = int(data.get("id"))
-                msg = db.query(models.Message).filter(models.Message.id == msg_id).first()
-                if msg:
-                    if msg.sender_id == user_id:
-                        msg.deleted_for_sender = True
-                    elif msg.receiver_id == user_id:
-                        msg.deleted_for_receiver = True
-                    db.commit()
+                if await run_db(delete_for_me, int(user_id), msg_id):
                     await manager.send_personal_message({"type": "delete_for_me", "id": msg_id}, user_id)
 
             elif msg_type == "accept_donation":
                 msg_id = int(data.get("id"))
-                msg = db.query(models.Message).filter(models.Message.id == msg_id).first()
-                if msg and msg.is_card:
-                    msg.accepted_by_receiver = True
-                    db.commit()
+                participants = await run_db(accept_donation, msg_id)
+                if participants:
+                    # Notify both users
+                    payload = {"type": "donation_accepted", "id": msg_id}
+                    for uid in participants:
+                        await manager.send_personal_message(payload, uid)
 
-                # Notify both users
-                payload = {"type": "donation_accepted", "id": msg.id}
-                await manager.send_personal_message(payload, msg.sender_id)
-                await manager.send_personal_message(payload, msg.receiver_id)
 
-
-            # Typing 
+            # Typing
             elif msg_type in ["typing", "stop_typing"]:
                 receiver_id = int(data.get("receiver_id"))
                 if receiver_id:
@@ -173,108 +161,197 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int):
                         receiver_id
                     )
 
-            # Get history
+            # Get history (newest page by default; pass before_id to page back)
             elif msg_type == "get_history":
                 peer_id = int(data.get("peer_id"))
-                msgs = db.query(models.Message).filter(
-                    or_(
-                        and_(models.Message.sender_id == int(user_id), models.Message.receiver_id == peer_id),
-                        and_(models.Message.sender_id == peer_id, models.Message.receiver_id == int(user_id))
-                    )
-                ).order_by(models.Message.timestamp).all()
-
-                history = []
-                for m in msgs:
-                    # Skip if this user deleted the message
-                    if (m.sender_id == user_id and getattr(m, "deleted_for_sender", False)) or \
-                       (m.receiver_id == user_id and getattr(m, "deleted_for_receiver", False)):
-                        continue  
-
-                    history.append({
-                        "id": m.id,
-                        "sender_id": m.sender_id,
-                        "receiver_id": m.receiver_id,
-                        "content": m.content,
-                        "image": m.image,
-                        "video": m.video,
-                        "timestamp": m.timestamp.isoformat(),
-                        "is_card": getattr(m, "is_card", False),
-                        "accepted": getattr(m, "accepted_by_receiver", False),
-                        "is_read": m.is_read
-                    })
-
-                # Mark unread messages as read
-                unread = db.query(models.Message).filter(
-                    models.Message.receiver_id == int(user_id),
-                    models.Message.sender_id == peer_id,
-                    models.Message.is_read == False
-                ).all()
-                for u in unread:
-                    u.is_read = True
-                if unread:
-                    db.commit()
+                before_id = int(data["before_id"]) if data.get("before_id") is not None else None
+                limit = max(1, min(int(data.get("limit") or 50), 200))
+                history, has_more, marked = await run_db(get_history_page, int(user_id), peer_id, before_id, limit)
+
+                if marked:
                     await manager.send_personal_message(
                         {"type": "message_read", "reader_id": int(user_id), "peer_id": peer_id},
                         peer_id
                     )
 
-                await websocket.send_json({"type": "history", "messages": history})
+                await manager.reply(websocket, {
+                    "type": "history",
+                    "messages": history,
+                    "has_more": has_more,
+                    "next_before_id": history[0]["id"] if has_more else None
+                })
 
-            # Get active chats 
+            # Get active chats
             elif msg_type == "get_active_chats":
-                await send_active_chats(db, int(user_id), websocket)
+                await send_active_chats(int(user_id), websocket)
 
             # Search charities and bakeries
             elif msg_type == "search":
                 query = (data.get("query") or "").strip().lower()
                 target = data.get("target")
-
-                q = db.query(models.User).filter(
-                    models.User.verified == True,
-                    models.User.role != "Admin",   # exclude admin
-                    models.User.id != user_id,  # exclude self
-                    func.lower(models.User.name).like(f"%{query}%")
-                )
-
-                if target == "charities":
-                    q = q.filter(models.User.role == "Charity")
-                elif target == "bakeries":
-                    q = q.filter(models.User.role == "Bakery")
-                elif target in ["users", "all"]:
-                    pass  # keep both charities + bakeries
-
-                results = q.all()
-
-                payload = [
-                    {
-                        "id": u.id,
-                        "name": f"{u.name} ({u.role})" if u.role in ["Bakery", "Charity"] else u.name, #if dont include the role just "name": u.name,
-                        "email": u.email,
-                        "profile_picture": u.profile_picture,
-                        "role": u.role
-                    }
-                    for u in results
-                ]
-                await websocket.send_json({"type": "search_results", "results": payload})
+                payload = await run_db(search_users, int(user_id), query, target)
+                await manager.reply(websocket, {"type": "search_results", "results": payload})
 
 
     except WebSocketDisconnect:
-        manager.disconnect(int(user_id), websocket)
         print(f"[WS] User {user_id} disconnected")
     finally:
-        db.close()
+        manager.disconnect(int(user_id), websocket)
 
 
-#  Helper functions 
+#  DB handlers (run on the chat DB executor, return plain data only)
+def save_message(db: Session, sender_id: int, receiver_id: int, content, image, video, is_card: bool, attachment_id=None):
+    """Store a message; returns its payload and the active-chat summary for both participants."""
+    attachment = None
+    if attachment_id:
+        attachment = chat_attachments.claim_attachment(db, attachment_id, sender_id)
+        kind = chat_attachments.media_kind(attachment.content_type)
+        image = attachment.file_url if kind == "image" else None
+        video = attachment.file_url if kind == "video" else None
+
+    new_msg = models.Message(
+        sender_id=sender_id,
+        receiver_id=receiver_id,
+        content=content or "",  # attachment-only messages have no text
+        image=image,
+        video=video,
+        timestamp=now_ph(),
+        is_card=is_card,
+        is_read=False
+    )
+    db.add(new_msg)
+    db.flush()
+    if attachment:
+        attachment.message_id = new_msg.id
+    crud.record_message(db, new_msg)
+    db.commit()
+    db.refresh(new_msg)
+
+    payload = {
+        "type": "message",
+        "id": int(new_msg.id),
+        "sender_id": new_msg.sender_id,
+        "receiver_id": new_msg.receiver_id,
+        "content": new_msg.content,
+        "image": new_msg.image,
+        "video": new_msg.video,
+        "timestamp": new_msg.timestamp.isoformat(),
+        "is_read": new_msg.is_read,
+        "is_card": new_msg.is_card,
+    }
+    summaries = {uid: build_chat_summary(db, new_msg, uid) for uid in [new_msg.sender_id, new_msg.receiver_id]}
+    return payload, summaries
+
+
+def delete_message(db: Session, user_id: int, msg_id: int):
+    """Hard-delete a message (sender only); returns the participants to notify, or None if it doesn't exist."""
+    msg = db.query(models.Message).filter(models.Message.id == msg_id).first()
+    if not msg:
+        return None
+
+    participants = (msg.sender_id, msg.receiver_id)
+    # Optional: only allow sender to delete
+    if msg.sender_id == user_id:
+        db.delete(msg)
+        db.flush()
+        crud.refresh_conversation(db, msg.sender_id, msg.receiver_id)
+        crud.refresh_conversation(db, msg.receiver_id, msg.sender_id)
+        db.commit()
+    return participants
+
+
+def delete_for_me(db: Session, user_id: int, msg_id: int) -> bool:
+    msg = db.query(models.Message).filter(models.Message.id == msg_id).first()
+    if not msg:
+        return False
+
+    if msg.sender_id == user_id:
+        msg.deleted_for_sender = True
+    elif msg.receiver_id == user_id:
+        msg.deleted_for_receiver = True
+    db.flush()
+    peer_id = msg.receiver_id if msg.sender_id == user_id else msg.sender_id
+    crud.refresh_conversation(db, user_id, peer_id)
+    db.commit()
+    return True
+
+
+def accept_donation(db: Session, msg_id: int):
+    """Mark a donation card accepted; returns the participants to notify, or None if it doesn't exist."""
+    msg = db.query(models.Message).filter(models.Message.id == msg_id).first()
+    if not msg:
+        return None
+    if msg.is_card:
+        msg.accepted_by_receiver = True
+        db.commit()
+    return (msg.sender_id, msg.receiver_id)
+
+
+def get_history_page(db: Session, user_id: int, peer_id: int, before_id, limit: int):
+    """One history page as dicts, plus has_more and how many messages were marked read."""
+    msgs, has_more = crud.get_message_history(db, user_id, peer_id, before_id=before_id, limit=limit)
+
+    history = []
+    for m in msgs:
+        history.append({
+            "id": m.id,
+            "sender_id": m.sender_id,
+            "receiver_id": m.receiver_id,
+            "content": m.content,
+            "image": m.image,
+            "video": m.video,
+            "timestamp": m.timestamp.isoformat(),
+            "is_card": getattr(m, "is_card", False),
+            "accepted": getattr(m, "accepted_by_receiver", False),
+            "is_read": m.is_read
+        })
+
+    # Mark unread messages as read up to the newest one shown
+    marked = 0
+    if before_id is None and msgs:
+        marked = crud.mark_history_read(db, user_id, peer_id, msgs[-1].id)
+        if marked:
+            db.commit()
+    return history, has_more, marked
+
+
+def search_users(db: Session, user_id: int, query: str, target):
+    q = db.query(models.User).filter(
+        models.User.verified == True,
+        models.User.role != "Admin",   # exclude admin
+        models.User.id != user_id,  # exclude self
+        func.lower(models.User.name).like(f"%{query}%")
+    )
+
+    if target == "charities":
+        q = q.filter(models.User.role == "Charity")
+    elif target == "bakeries":
+        q = q.filter(models.User.role == "Bakery")
+    elif target in ["users", "all"]:
+        pass  # keep both charities + bakeries
+
+    return [
+        {
+            "id": u.id,
+            "name": f"{u.name} ({u.role})" if u.role in ["Bakery", "Charity"] else u.name, #if dont include the role just "name": u.name,
+            "email": u.email,
+            "profile_picture": u.profile_picture,
+            "role": u.role
+        }
+        for u in q.all()
+    ]
+
+
+#  Helper functions
 def get_user_dict(db: Session, user_id: int):
     u = db.query(models.User).filter(models.User.id == int(user_id)).first()
     if not u:
         return None
     return {
-        "id": u.id, 
+        "id": u.id,
         "name": f"{u.name} ({u.role})" if u.role in ["Bakery", "Charity"] else u.name, #if dont include the role just "name": u.name,
-        "email": u.email, 
-        "profile_picture": u.profile_picture, 
+        "email": u.email,
+        "profile_picture": u.profile_picture,
         "role": u.role}
 
 
@@ -291,50 +368,42 @@ def build_chat_summary(db: Session, message_obj, client_user_id: int):
             "timestamp": message_obj.timestamp.isoformat(),
             "is_read": message_obj.is_read
         },
-        "unread": db.query(models.Message).filter(
-            models.Message.receiver_id == client_user_id,
-            models.Message.sender_id == peer_id,
-            models.Message.is_read == False
-        ).count()
+        "unread": crud.get_conversation_unread(db, client_user_id, peer_id)
     }
 
 
-async def send_active_chats(db: Session, user_id: int, websocket: WebSocket):
-    msgs = db.query(models.Message).filter(
-        or_(models.Message.sender_id == user_id, models.Message.receiver_id == user_id)
-    ).order_by(models.Message.timestamp.desc()).all()
-
-    seen = {}
+def get_active_chats(db: Session, user_id: int):
     chats = []
-    for m in msgs:
-        peer_id = m.receiver_id if m.sender_id == user_id else m.sender_id
-        if peer_id in seen: continue
-        seen[peer_id] = True
-        peer = get_user_dict(db, peer_id)
-        unread_count = db.query(models.Message).filter(
-            models.Message.receiver_id == user_id,
-            models.Message.sender_id == peer_id,
-            models.Message.is_read == False
-        ).count()
+    for conversation, m, peer in crud.get_conversations(db, user_id):
         chats.append({
-            "peer": peer,
+            "peer": {
+                "id": peer.id,
+                "name": f"{peer.name} ({peer.role})" if peer.role in ["Bakery", "Charity"] else peer.name,
+                "email": peer.email,
+                "profile_picture": peer.profile_picture,
+                "role": peer.role
+            },
             "last_message": {
                 "id": m.id,
                 "sender_id": m.sender_id,
                 "receiver_id": m.receiver_id,
                 "content": (
-                        m.content if m.content 
-                        else "Send Image" if m.image 
-                        else "Send Video" if m.video 
+                        m.content if m.content
+                        else "Send Image" if m.image
+                        else "Send Video" if m.video
                         else ""
                  ),
-                "image": m.image,     
-                "video": m.video, 
+                "image": m.image,
+                "video": m.video,
                 "timestamp": m.timestamp.isoformat(),
                 "is_card": getattr(m, "is_card", False),
                 "is_read": m.is_read
             },
-            "unread": unread_count
+            "unread": conversation.unread_count
         })
+    return chats
+
 
-    await websocket.send_json({"type": "active_chats", "chats": chats})
\ No newline at end of file
+async def send_active_chats(user_id: int, websocket: WebSocket):
+    chats = await run_db(get_active_chats, user_id)
+    await manager.reply(websocket, {"type": "active_chats", "chats": chats})
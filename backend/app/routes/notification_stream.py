@@ -0,0 +1,111 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from jose import JWTError, jwt
+from datetime import timedelta
+import asyncio, json, os, time
+
+from app import auth
+from app.timezone_utils import now_ph
+from app.notification_events import hub
+
+router = APIRouter()
+
+# Comment line sent when idle so proxies keep the connection open
+KEEPALIVE_SECONDS = 15
+# Lifetime of a stream ticket; it only has to survive until the EventSource connects
+STREAM_TICKET_SECONDS = int(os.getenv("NOTIFICATION_STREAM_TICKET_SECONDS", "60"))
+STREAM_TICKET_PURPOSE = "notification_stream"
+
+
+def _ticket_key() -> str:
+    # Own signing key, so a ticket is never accepted as an access token (and vice versa)
+    return f"{auth.SECRET_KEY}:{STREAM_TICKET_PURPOSE}"
+
+
+def _subscriber(current_auth):
+    """(feed user id, role) for a bakery, employee or charity principal."""
+    if isinstance(current_auth, dict):
+        # Employees see their bakery's feed
+        return current_auth.get("bakery_id"), "Bakery"
+    return current_auth.id, current_auth.role
+
+
+# --- Stream tickets ---
+# EventSource cannot send headers, so the stream URL carries a ticket instead of the
+# access token: short-lived, only valid for this stream, and it ends the stream when
+# the login it was issued for expires. URLs end up in access and proxy logs.
+@router.post("/notifications/stream-ticket")
+def create_stream_ticket(
+    token: str = Depends(auth.oauth2_scheme),
+    current_auth=Depends(auth.get_current_user_or_employee)
+):
+    user_id, role = _subscriber(current_auth)
+    payload = auth.decode_access_token(token) or {}
+    ticket = jwt.encode(
+        {
+            "purpose": STREAM_TICKET_PURPOSE,
+            "sub": str(user_id),
+            "role": role,
+            "session_exp": payload.get("exp"),
+            "exp": now_ph() + timedelta(seconds=STREAM_TICKET_SECONDS)
+        },
+        _ticket_key(),
+        algorithm=auth.ALGORITHM
+    )
+    return {"ticket": ticket, "expires_in": STREAM_TICKET_SECONDS}
+
+
+def _read_ticket(ticket: str):
+    """(user id, role, session expiry as a unix time or None) of a valid stream ticket."""
+    try:
+        payload = jwt.decode(ticket, _ticket_key(), algorithms=[auth.ALGORITHM])
+    except JWTError:
+        payload = None
+    if not payload or payload.get("purpose") != STREAM_TICKET_PURPOSE or not payload.get("sub"):
+        raise HTTPException(status_code=401, detail="Invalid or expired stream ticket")
+    try:
+        user_id = int(payload["sub"])
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=401, detail="Invalid or expired stream ticket")
+    return user_id, payload.get("role"), payload.get("session_exp")
+
+
+# --- Notification event stream (Server-Sent Events) ---
+@router.get("/notifications/stream")
+async def notification_stream(request: Request, ticket: str = Query(...)):
+    user_id, role, session_exp = _read_ticket(ticket)
+
+    await hub.start()
+    sub = hub.subscribe(user_id, role)
+
+    async def events():
+        try:
+            # Sent on every (re)connect: the page fetches the full feed once here
+            yield "event: ready\ndata: {}\n\n"
+            while True:
+                timeout = KEEPALIVE_SECONDS
+                if session_exp:
+                    remaining = session_exp - time.time()
+                    if remaining <= 0:
+                        # The login expired: stop pushing; the page needs a new login
+                        yield "event: expired\ndata: {}\n\n"
+                        break
+                    timeout = min(timeout, remaining)
+                try:
+                    evt = await asyncio.wait_for(sub.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if evt is None:
+                    break
+                yield f"data: {json.dumps(evt, default=str)}\n\n"
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
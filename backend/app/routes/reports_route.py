@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func
-from app import database, models, auth
+from app import database, models, auth, report_export
 from datetime import datetime, timedelta
 from app.timezone_utils import now_ph
 
@@ -15,41 +15,51 @@ def check_bakery_or_employee(current_auth = Depends(auth.get_current_user_or_emp
     bakery_id = auth.get_bakery_id_from_auth(current_auth)
     return current_auth, bakery_id
 
-from sqlalchemy.orm import joinedload
+def _donation_row(d):
+    inv = d.inventory_item
+    return {
+        "product_id": inv.product_id if inv else None,
+        "name": d.name,  # comes from Donation
+        "quantity": d.quantity,
+        "creation_date": d.creation_date,
+        "uploaded_by": d.uploaded,  # this is your "employee name"
+        "bakery_name": d.bakery.name if d.bakery else None,
+        "image": f"{d.image}" if d.image else None,
+        "threshold": d.threshold,
+        "expiration_date": d.expiration_date,
+        "description": d.description
+    }
 
-@router.get("/donation")
-def donation_report(
-    db: Session = Depends(database.get_db),
-    auth_data = Depends(check_bakery_or_employee)
-):
-    current_auth, bakery_id = auth_data
-    donations = (
+DONATION_COLUMNS = [
+    "product_id", "name", "quantity", "creation_date", "uploaded_by",
+    "bakery_name", "image", "threshold", "expiration_date", "description",
+]
+
+def _donation_query(db: Session, bakery_id: int):
+    return (
         db.query(models.Donation)
         .options(
             joinedload(models.Donation.inventory_item),  # join bakery_inventory
             joinedload(models.Donation.bakery)           # join bakery (user)
         )
         .filter(models.Donation.bakery_id == bakery_id)
-        .all()
     )
 
-    result = []
-    for d in donations:
-        inv = d.inventory_item
-        result.append({
-            "product_id": inv.product_id if inv else None,
-            "name": d.name,  # comes from Donation
-            "quantity": d.quantity,
-            "creation_date": d.creation_date,
-            "uploaded_by": d.uploaded,  # this is your "employee name"
-            "bakery_name": d.bakery.name if d.bakery else None,
-            "image": f"{d.image}" if d.image else None,
-            "threshold": d.threshold,
-            "expiration_date": d.expiration_date,
-            "description": d.description
-        })
+@router.get("/donation")
+def donation_report(
+    export_format: str = Query("json", alias="format", pattern=report_export.FORMAT_PATTERN),
+    db: Session = Depends(database.get_db),
+    auth_data = Depends(check_bakery_or_employee)
+):
+    current_auth, bakery_id = auth_data
 
-    return result
+    if export_format != "json":
+        def rows(export_db):
+            query = _donation_query(export_db, bakery_id).order_by(models.Donation.id)
+            return (_donation_row(d) for d in report_export.stream(query))
+        return report_export.export_response(export_format, "donations", DONATION_COLUMNS, rows)
+
+    return [_donation_row(d) for d in _donation_query(db, bakery_id).all()]
 
 @router.get("/expiry")
 def expiry_loss_report(
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, and_, or_
 from app.database import get_db
 from app.models import SystemEvent, User
 from app.auth import get_current_user
+from app import report_export
 from datetime import datetime, timedelta
 from app.timezone_utils import now_ph
 from typing import Optional, List
@@ -226,6 +227,25 @@ def get_event_details(
     
     return event_data
 
+EXPORT_COLUMNS = [
+    "event_id", "event_type", "description", "severity", "timestamp",
+    "user_id", "user_name", "user_email", "user_role", "metadata",
+]
+
+def _export_row(event: SystemEvent) -> dict:
+    return {
+        "event_id": event.id,
+        "event_type": event.event_type,
+        "description": event.description,
+        "severity": event.severity,
+        "timestamp": event.timestamp.strftime("%Y-%m-%d %H:%M:%S") if event.timestamp else "",
+        "user_id": event.user_id,
+        "user_name": event.user.name if event.user else "N/A",
+        "user_email": event.user.email if event.user else "N/A",
+        "user_role": event.user.role if event.user else "N/A",
+        "metadata": event.event_metadata
+    }
+
 # ========== ENDPOINT 4: Export Events Report ==========
 @router.get("/events/export/data")
 def export_events(
@@ -233,57 +253,50 @@ def export_events(
     severity: Optional[str] = Query(None),
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
+    export_format: str = Query("json", alias="format", pattern=report_export.FORMAT_PATTERN),
     current_user: User = Depends(get_current_superadmin),
     db: Session = Depends(get_db)
 ):
     """
     Export filtered events data for report generation.
-    Returns all matching events without pagination.
+    Returns all matching events without pagination; format=csv|ndjson streams them.
     """
     
-    # Build query
-    query = db.query(SystemEvent)
-    
-    # Apply filters (same as get_system_events)
-    if event_type:
-        query = query.filter(SystemEvent.event_type == event_type)
-    
-    if severity:
-        query = query.filter(SystemEvent.severity == severity)
-    
-    if start_date:
-        try:
-            start = datetime.strptime(start_date, "%Y-%m-%d")
+    # Validate date filters up front; a streamed export cannot report them as 400s
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid start_date format")
+    try:
+        end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1) if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid end_date format")
+
+    def build_query(session: Session):
+        query = session.query(SystemEvent).options(joinedload(SystemEvent.user))
+        
+        # Apply filters (same as get_system_events)
+        if event_type:
+            query = query.filter(SystemEvent.event_type == event_type)
+        if severity:
+            query = query.filter(SystemEvent.severity == severity)
+        if start:
             query = query.filter(SystemEvent.timestamp >= start)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid start_date format")
-    
-    if end_date:
-        try:
-            end = datetime.strptime(end_date, "%Y-%m-%d")
-            end = end + timedelta(days=1)
+        if end:
             query = query.filter(SystemEvent.timestamp < end)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid end_date format")
-    
-    # Order by timestamp
-    events = query.order_by(SystemEvent.timestamp.desc()).all()
+        
+        # Order by timestamp
+        return query.order_by(SystemEvent.timestamp.desc())
+
+    if export_format != "json":
+        def rows(export_db):
+            return (_export_row(event) for event in report_export.stream(build_query(export_db)))
+        return report_export.export_response(export_format, "system_events", EXPORT_COLUMNS, rows)
+
+    events = build_query(db).all()
     
     # Format for export
-    export_data = []
-    for event in events:
-        export_data.append({
-            "event_id": event.id,
-            "event_type": event.event_type,
-            "description": event.description,
-            "severity": event.severity,
-            "timestamp": event.timestamp.strftime("%Y-%m-%d %H:%M:%S") if event.timestamp else "",
-            "user_id": event.user_id,
-            "user_name": event.user.name if event.user else "N/A",
-            "user_email": event.user.email if event.user else "N/A",
-            "user_role": event.user.role if event.user else "N/A",
-            "metadata": event.event_metadata
-        })
+    export_data = [_export_row(event) for event in events]
     
     return {
         "total_records": len(export_data),
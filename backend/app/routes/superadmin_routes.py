@@ -13,8 +13,8 @@ Features:
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_, desc, case
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, and_, or_, desc, case, text, tuple_
 from typing import List, Optional
 from datetime import datetime, timedelta, date
 from pydantic import BaseModel
@@ -22,11 +22,17 @@ import app.models as models
 import app.admin_models as admin_models
 from app.database import get_db
 from app.auth import get_current_user, pwd_context
-from app.email_utils import send_email
+from app.email_outbox import enqueue_email
+from app.geofence_scheduler import geofence_scheduler
+from app.audit_export import (
+    audit_export_jobs, apply_filters as apply_audit_filters,
+    get_job as get_audit_export_job, artifact_path as audit_artifact_path,
+)
 import json
+import os
 import secrets
 import string
-from app import database, auth
+from app import database, auth, crud
 from app.timezone_utils import now_ph, today_ph, get_day_start_ph, get_day_end_ph
 
 router = APIRouter(prefix="/admin", tags=["Super Admin"]) 
@@ -283,6 +289,24 @@ def get_users_by_status(
 
 # ==================== 2. AUDIT LOG VIEWER ====================
 
+AUDIT_LOG_MAX_LIMIT = 10000
+
+def _estimate_count(db: Session, query, filtered: bool) -> Optional[int]:
+    """Planner estimate of how many rows `query` matches (Postgres only), or None"""
+    if db.bind.dialect.name != "postgresql":
+        return None
+    if not filtered:
+        estimate = db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'system_events'")
+        ).scalar()
+        # -1 until the table has been vacuumed/analyzed
+        return estimate if estimate is not None and estimate >= 0 else None
+    compiled = query.statement.compile(dialect=db.bind.dialect)
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
 @router.get("/audit-logs")
 def get_audit_logs(
     db: Session = Depends(get_db),
@@ -294,99 +318,103 @@ def get_audit_logs(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     skip: int = 0,
-    limit: int = 100
+    limit: int = Query(100, ge=1, le=AUDIT_LOG_MAX_LIMIT),
+    before_id: Optional[int] = None,
+    count: str = Query("exact", pattern="^(exact|estimate|none)$")
 ):
     """
     Comprehensive audit log viewer with filters.
     Super Admin only.
     Queries from system_events table.
+
+    Pages are keyed on (timestamp, id), newest first: pass next_before_id from
+    the previous page as before_id. skip still works without before_id but gets
+    slower the deeper it goes. count=estimate returns the planner's row estimate
+    instead of an exact COUNT, count=none skips the total.
     """
     require_super_admin(current_admin)
     
-    # Query directly from system_events table using raw SQL or the correct model
-    from sqlalchemy import text
-    
-    # Build the base query
-    base_query = "SELECT * FROM system_events WHERE 1=1"
-    count_query = "SELECT COUNT(*) FROM system_events WHERE 1=1"
-    params = {}
-    
-    # Apply filters
-    if event_type:
-        base_query += " AND event_type = :event_type"
-        count_query += " AND event_type = :event_type"
-        params["event_type"] = event_type
-    
+    filters = {
+        "event_type": event_type,
+        "severity": severity,
+        "start_date": start_date,
+        "end_date": end_date,
+    }
+    query = apply_audit_filters(db.query(models.SystemEvent), filters)
     if actor_id:
-        base_query += " AND user_id = :actor_id"
-        count_query += " AND user_id = :actor_id"
-        params["actor_id"] = actor_id
-    
-    if severity:
-        base_query += " AND severity = :severity"
-        count_query += " AND severity = :severity"
-        params["severity"] = severity
-    
-    if start_date:
-        base_query += " AND timestamp >= :start_date"
-        count_query += " AND timestamp >= :start_date"
-        params["start_date"] = start_date
-    
-    if end_date:
-        base_query += " AND timestamp <= :end_date"
-        count_query += " AND timestamp <= :end_date"
-        params["end_date"] = end_date
+        query = query.filter(models.SystemEvent.user_id == actor_id)
     
     # Get total count
-    total_result = db.execute(text(count_query), params).scalar()
-    total_count = total_result or 0
-    
-    # Add ordering and pagination
-    base_query += " ORDER BY timestamp DESC LIMIT :limit OFFSET :skip"
-    params["limit"] = limit
-    params["skip"] = skip
-    
-    # Execute query
-    result = db.execute(text(base_query), params)
-    logs = result.fetchall()
-    
-    # Get column names for mapping
-    column_names = result.keys()
+    total_count = None
+    total_is_estimate = False
+    if count == "estimate":
+        filtered = any(filters.values()) or bool(actor_id)
+        total_count = _estimate_count(db, query.with_entities(models.SystemEvent.id), filtered)
+        total_is_estimate = total_count is not None
+    if count == "exact" or (count == "estimate" and total_count is None):
+        total_count = query.with_entities(func.count(models.SystemEvent.id)).scalar() or 0
+    
+    # Continue after the last event of the previous page
+    if before_id is not None:
+        anchor = db.query(models.SystemEvent.timestamp, models.SystemEvent.id).filter(
+            models.SystemEvent.id == before_id
+        ).first()
+        if not anchor:
+            return {
+                "total_count": total_count,
+                "total_is_estimate": total_is_estimate,
+                "page": None,
+                "limit": limit,
+                "has_more": False,
+                "next_before_id": None,
+                "logs": []
+            }
+        query = query.filter(
+            tuple_(models.SystemEvent.timestamp, models.SystemEvent.id) < tuple_(anchor.timestamp, anchor.id)
+        )
     
-    # Helper function to get user info by ID
-    def get_user_info(user_id):
-        if not user_id:
+    # Actors come from the same query (one join instead of a lookup per row)
+    query = (
+        query.options(joinedload(models.SystemEvent.user))
+        .order_by(models.SystemEvent.timestamp.desc(), models.SystemEvent.id.desc())
+    )
+    if before_id is None and skip:
+        query = query.offset(skip)
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    events = rows[:limit]
+    
+    # Helper function to get actor info for an event
+    def get_user_info(event):
+        if not event.user_id:
             return {"name": "System", "type": "System"}
-        user = db.query(models.User).filter(models.User.id == user_id).first()
-        if not user:
+        if not event.user:
             return {"name": "Unknown", "type": "Unknown"}
         return {
-            "name": user.name,  # Organization name (bakery/charity name)
-            "type": user.role   # Role: Admin, bakery, charity
+            "name": event.user.name,  # Organization name (bakery/charity name)
+            "type": event.user.role   # Role: Admin, bakery, charity
         }
     
     # Format response to match what frontend expects
     formatted_logs = []
-    for log in logs:
-        # Convert row to dict
-        log_dict = dict(zip(column_names, log))
-        
-        # Parse event_data JSON if it exists
-        event_data = log_dict.get("event_data")
+    for event in events:
+        # Parse event metadata JSON if it exists
+        event_data = event.event_metadata
         if event_data and isinstance(event_data, str):
             try:
                 event_data = json.loads(event_data)
             except:
                 event_data = {}
-        elif not event_data:
+        if not isinstance(event_data, dict):
             event_data = {}
         
         # Get actor information
-        actor_info = get_user_info(log_dict.get("user_id"))
+        actor_info = get_user_info(event)
         
         # Check if this was an employee action (has employee_name and employee_role in metadata)
         employee_name = event_data.get("employee_name")
         employee_role = event_data.get("employee_role")
+        description = event.description or ""
         
         # Build actor display name
         # For employees: "TheBakeMac - Paul Morada (Employee)"
@@ -400,7 +428,7 @@ def get_audit_logs(
         elif actor_info["type"] in ["bakery", "charity"]:
             # Owner/main user login
             actor_display_name = actor_info["name"]  # Organization name
-            actor_person = event_data.get("name") or log_dict.get("description", "").split("User ")[1].split(" (")[0] if "User " in log_dict.get("description", "") else None
+            actor_person = event_data.get("name") or description.split("User ")[1].split(" (")[0] if "User " in description else None
             actor_person_role = "Owner" if actor_info["type"] == "bakery" else "Representative"
         else:
             # Admin or system
@@ -413,16 +441,16 @@ def get_audit_logs(
         target_type = event_data.get("role") or event_data.get("target_type") or "User"
         
         # Determine success based on event_type
-        event_type_lower = (log_dict.get("event_type") or "").lower()
+        event_type_lower = (event.event_type or "").lower()
         success = "failed" not in event_type_lower and "error" not in event_type_lower
         
         formatted_logs.append({
-            "id": log_dict.get("id"),
-            "timestamp": log_dict.get("timestamp").isoformat() if log_dict.get("timestamp") else None,
-            "event_type": log_dict.get("event_type"),
-            "event_category": categorize_event(log_dict.get("event_type")),
-            "description": log_dict.get("description"),
-            "actor_id": log_dict.get("user_id"),
+            "id": event.id,
+            "timestamp": event.timestamp.isoformat() if event.timestamp else None,
+            "event_type": event.event_type,
+            "event_category": categorize_event(event.event_type),
+            "description": event.description,
+            "actor_id": event.user_id,
             "actor_type": actor_info["type"],
             "actor_name": actor_display_name,
             "actor_person": actor_person,  # Individual person's name (Paul Morada, Tesia Kate)
@@ -430,7 +458,7 @@ def get_audit_logs(
             "target_id": None,
             "target_type": target_type,
             "target_name": target_name,
-            "severity": log_dict.get("severity") or "info",
+            "severity": event.severity or "info",
             "success": success,
             "ip_address": event_data.get("ip_address"),
             "user_agent": event_data.get("user_agent"),
@@ -441,8 +469,11 @@ def get_audit_logs(
     
     return {
         "total_count": total_count,
-        "page": skip // limit + 1 if limit > 0 else 1,
+        "total_is_estimate": total_is_estimate,
+        "page": skip // limit + 1 if before_id is None else None,
         "limit": limit,
+        "has_more": has_more,
+        "next_before_id": events[-1].id if has_more else None,
         "logs": formatted_logs
     }
 
@@ -467,7 +498,7 @@ def categorize_event(event_type: str) -> str:
     else:
         return "System"
 
-@router.get("/audit-logs/export")
+@router.post("/audit-logs/export")
 def export_audit_logs(
     db: Session = Depends(get_db),
     current_admin: models.User = Depends(get_current_user),
@@ -476,263 +507,58 @@ def export_audit_logs(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None
 ):
-    """Export audit logs as PDF with auto-fitting table format"""
+    """
+    Start a PDF export of the filtered audit logs (see app/audit_export.py).
+    Returns the job status; poll /audit-logs/export/{job_id} and download
+    from /audit-logs/export/{job_id}/download once status is "complete".
+    Identical exports are served from the artifact cache.
+    """
     require_super_admin(current_admin)
-    
-    from sqlalchemy import text
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import A4, landscape
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.lib.enums import TA_LEFT, TA_CENTER
-    from io import BytesIO
-    from fastapi.responses import StreamingResponse
-    
-    # Build query
-    base_query = "SELECT * FROM system_events WHERE 1=1"
-    params = {}
-    
-    if event_type:
-    # Handle admin_crud as multiple event types
-        if event_type == "admin_crud":
-            base_query += " AND event_type IN ('ADMIN_UPDATE_USER', 'ADMIN_MANUAL_REGISTRATION', 'ADMIN_DELETE_USER')"
-        else:
-            base_query += " AND event_type = :event_type"
-            params["event_type"] = event_type
-    
-    if severity:
-        base_query += " AND severity = :severity"
-        params["severity"] = severity
-    
-    if start_date:
-        base_query += " AND timestamp >= :start_date"
-        params["start_date"] = start_date
-    
-    if end_date:
-        base_query += " AND timestamp <= :end_date"
-        params["end_date"] = end_date
-    
-    base_query += " ORDER BY timestamp DESC LIMIT 1000"
-    
-    result = db.execute(text(base_query), params)
-    logs = result.fetchall()
-    column_names = result.keys()
-    
-    # Helper function to get user info
-    def get_user_info(user_id):
-        if not user_id:
-            return "System"
-        user = db.query(models.User).filter(models.User.id == user_id).first()
-        return user.name if user else "Unknown"
-    
-    # Create PDF in memory
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=landscape(A4),
-        rightMargin=15,
-        leftMargin=15,
-        topMargin=35,
-        bottomMargin=20,
-        title="DoughNation Audit Logs Report"
-    )
-    
-    # Container for PDF elements
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Add title
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor('#4A2F17'),
-        spaceAfter=8,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-    title = Paragraph("<b>DoughNation - Audit Logs Report</b>", title_style)
-    elements.append(title)
-    
-    # Add metadata
-    meta_style = ParagraphStyle(
-        'MetaStyle',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.HexColor('#6b4b2b'),
-        spaceAfter=12
-    )
-    
-    meta_info = f"<b>Generated:</b> {now_ph().strftime('%B %d, %Y at %H:%M:%S PHT')} | "
-    meta_info += f"<b>By:</b> {current_admin.name} | "
-    meta_info += f"<b>Total Records:</b> {len(logs)}"
-    
-    if event_type or severity or start_date or end_date:
-        meta_info += "<br/><b>Filters Applied:</b> "
-        filters = []
-        if event_type:
-            filters.append(f"Event Type: {event_type}")
-        if severity:
-            filters.append(f"Severity: {severity}")
-        if start_date:
-            filters.append(f"From: {start_date.strftime('%Y-%m-%d')}")
-        if end_date:
-            filters.append(f"To: {end_date.strftime('%Y-%m-%d')}")
-        meta_info += ", ".join(filters)
-    
-    meta_para = Paragraph(meta_info, meta_style)
-    elements.append(meta_para)
-    elements.append(Spacer(1, 0.2 * inch))
-    
-    # Define styles for table cells with auto-wrapping
-    header_style = ParagraphStyle(
-        'HeaderStyle',
-        parent=styles['Normal'],
-        fontSize=9,
-        fontName='Helvetica-Bold',
-        textColor=colors.HexColor('#4A2F17'),
-        alignment=TA_CENTER,
-        leading=11
-    )
-    
-    cell_style = ParagraphStyle(
-        'CellStyle',
-        parent=styles['Normal'],
-        fontSize=7.5,
-        leading=9,
-        textColor=colors.HexColor('#4A2F17'),
-        wordWrap='CJK',
-        alignment=TA_LEFT
-    )
-    
-    cell_style_center = ParagraphStyle(
-        'CellStyleCenter',
-        parent=styles['Normal'],
-        fontSize=7.5,
-        leading=9,
-        textColor=colors.HexColor('#4A2F17'),
-        alignment=TA_CENTER
-    )
-    
-    # Prepare table data with Paragraphs for auto-wrapping
-    table_data = [[
-        Paragraph('<b>Timestamp</b>', header_style),
-        Paragraph('<b>Event Type</b>', header_style),
-        Paragraph('<b>Actor</b>', header_style),
-        Paragraph('<b>Severity</b>', header_style),
-        Paragraph('<b>Description</b>', header_style)
-    ]]
-    
-    for log in logs:
-        log_dict = dict(zip(column_names, log))
-        
-        timestamp = log_dict.get("timestamp")
-        if timestamp:
-            timestamp_str = timestamp.strftime('%Y-%m-%d<br/>%H:%M:%S')
-        else:
-            timestamp_str = "N/A"
-        
-        event_type_val = log_dict.get("event_type") or "N/A"
-        actor_name = get_user_info(log_dict.get("user_id"))
-        severity_val = (log_dict.get("severity") or "info").upper()
-        description = log_dict.get("description") or "No description"
-        
-        # Create Paragraph objects for each cell - this enables auto-wrapping
-        table_data.append([
-            Paragraph(timestamp_str, cell_style_center),
-            Paragraph(event_type_val, cell_style),
-            Paragraph(actor_name, cell_style),
-            Paragraph(severity_val, cell_style_center),
-            Paragraph(description, cell_style)
-        ])
-    
-    # Calculate available width (landscape A4 = 11.69 inches)
-    available_width = landscape(A4)[0] - 30  # Subtract margins
-    
-    # Optimized column widths that fit within landscape A4
-    # Total should be ~11.4 inches
-    col_widths = [
-        1.0 * inch,   # Timestamp - narrower
-        1.5 * inch,   # Event Type - medium
-        1.1 * inch,   # Actor - narrow
-        0.7 * inch,   # Severity - very narrow
-        4.5 * inch    # Description - widest for details
-    ]
-    
-    # Create table
-    table = Table(table_data, colWidths=col_widths, repeatRows=1)
-    
-    # Apply comprehensive table styling
-    table.setStyle(TableStyle([
-        # Header styling
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#EADBC8')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#4A2F17')),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, 0), 'MIDDLE'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-        ('TOPPADDING', (0, 0), (-1, 0), 10),
-        
-        # Body styling
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor('#4A2F17')),
-        ('ALIGN', (0, 1), (0, -1), 'CENTER'),  # Timestamp centered
-        ('ALIGN', (1, 1), (2, -1), 'LEFT'),    # Event Type and Actor left
-        ('ALIGN', (3, 1), (3, -1), 'CENTER'),  # Severity centered
-        ('ALIGN', (4, 1), (4, -1), 'LEFT'),    # Description left
-        ('VALIGN', (0, 1), (-1, -1), 'TOP'),   # All content aligned to top
-        ('FONTSIZE', (0, 1), (-1, -1), 7.5),
-        ('TOPPADDING', (0, 1), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-        ('LEFTPADDING', (0, 0), (-1, -1), 6),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-        
-        # Grid and borders
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#D4B896')),
-        ('LINEBELOW', (0, 0), (-1, 0), 1.5, colors.HexColor('#BF7327')),
-        
-        # Alternating row colors for better readability
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#FFF9F1')]),
-        
-        # Word wrap enabled (handled by Paragraph objects)
-        ('WORDWRAP', (0, 0), (-1, -1), True),
-    ]))
-    
-    elements.append(table)
-    
-    # Add footer note
-    elements.append(Spacer(1, 0.2 * inch))
-    footer_style = ParagraphStyle(
-        'FooterStyle',
-        parent=styles['Normal'],
-        fontSize=7,
-        textColor=colors.HexColor('#999999'),
-        alignment=TA_CENTER
-    )
-    footer = Paragraph(
-        f"<i>This is an official audit log report from DoughNation System. "
-        f"Report generated on {now_ph().strftime('%B %d, %Y')}.  </i>",
-        footer_style
-    )
-    elements.append(footer)
-    
-    # Build PDF
-    doc.build(elements)
-    buffer.seek(0)
-    
+
+    filters = {
+        "event_type": event_type,
+        "severity": severity,
+        "start_date": start_date,
+        "end_date": end_date,
+    }
+    return audit_export_jobs.submit(db, filters, generated_by=current_admin.name)
+
+@router.get("/audit-logs/export/{job_id}")
+def get_audit_log_export(
+    job_id: str,
+    current_admin: models.User = Depends(get_current_user)
+):
+    """Progress of an audit log export job"""
+    require_super_admin(current_admin)
+
+    job = get_audit_export_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+@router.get("/audit-logs/export/{job_id}/download")
+def download_audit_log_export(
+    job_id: str,
+    current_admin: models.User = Depends(get_current_user)
+):
+    """Download the PDF of a completed audit log export job"""
+    require_super_admin(current_admin)
+
+    from fastapi.responses import FileResponse
+
+    job = get_audit_export_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job["status"] != "complete":
+        raise HTTPException(status_code=409, detail=f"Export is {job['status']}")
+
+    path = audit_artifact_path(job["key"])
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Export has expired, please export again")
+
     # Generate filename with timestamp
     filename = f"DoughNation_Audit_Logs_{now_ph().strftime('%Y%m%d_%H%M%S')}.pdf"
-    
-    # Return as streaming response
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={
-            "Content-Disposition": f"attachment; filename={filename}"
-        }
-    )
+    return FileResponse(path, media_type="application/pdf", filename=filename)
 
 @router.get("/admin_profile")
 def get_admin_profile(
@@ -783,39 +609,34 @@ def send_notification(
         expires_at=notification.expires_at
     )
     db.add(notif)
-    db.commit()
-    db.refresh(notif)
+    db.flush()  # Get the notification ID
     
     # Determine recipients
     recipients = []
     
-    if notification.target_all:
-        recipients = db.query(models.User).filter(
-            models.User.role != "Admin",
-            models.User.verified == True
-        ).all()
-    elif notification.target_role:
-        recipients = db.query(models.User).filter(
-            models.User.role == notification.target_role,
-            models.User.verified == True
-        ).all()
+    if crud.is_broadcast(notif):
+        # Broadcast / role-targeted: no per-user receipts, readers are matched when
+        # they load their feed (crud.get_unread_system_notifications)
+        audience = db.query(models.User.id, models.User.email).filter(crud.broadcast_audience(notif))
+        recipients_count = audience.count()
+        if notification.send_email:
+            recipients = audience.all()
     elif notification.target_user_ids:  # FIXED: Check target_user_ids
-        recipients = db.query(models.User).filter(
+        recipients = db.query(models.User.id, models.User.email).filter(
             models.User.id.in_(notification.target_user_ids)
         ).all()
-    
-    # Create notification receipts for in-app delivery
-    for recipient in recipients:
-        receipt = admin_models.NotificationReceipt(
-            notification_id=notif.id,
-            user_id=recipient.id,
-            delivered_at=now_ph()
-        )
-        db.add(receipt)
+        recipients_count = len(recipients)
         
-        # Send email if requested
-        if notification.send_email:
-            send_email(
+        # Create notification receipts for in-app delivery
+        crud.create_notification_receipts(db, notif.id, [recipient.id for recipient in recipients])
+    else:
+        recipients_count = 0
+    
+    # Send email if requested
+    if notification.send_email:
+        for recipient in recipients:
+            enqueue_email(
+                db,
                 to_email=recipient.email,
                 subject=notification.title,
                 html_content=f"""
@@ -832,11 +653,11 @@ def send_notification(
     log_audit_event(
         db=db,
         event_type="notification_sent",
-        description=f"Notification sent: {notification.title} to {len(recipients)} recipients",
+        description=f"Notification sent: {notification.title} to {recipients_count} recipients",
         actor_id=current_admin.id,
         event_data={
             "notification_id": notif.id,
-            "recipient_count": len(recipients),
+            "recipient_count": recipients_count,
             "target_all": notification.target_all,
             "target_role": notification.target_role,
             "target_user_ids": notification.target_user_ids
@@ -846,7 +667,7 @@ def send_notification(
     return {
         "message": "Notification sent successfully",
         "notification_id": notif.id,
-        "recipients_count": len(recipients),
+        "recipients_count": recipients_count,
         "sent_at": notif.sent_at
     }
 
@@ -864,6 +685,25 @@ def get_notification_history(
         .order_by(desc(admin_models.SystemNotification.created_at))\
         .offset(skip).limit(limit).all()
     
+    # Targeted notifications have one receipt per recipient; broadcasts have none,
+    # their recipients are the audience (one count per distinct audience)
+    R = admin_models.NotificationReceipt
+    targeted = [n.id for n in notifications if not crud.is_broadcast(n)]
+    recipient_counts = dict(
+        db.query(R.notification_id, func.count(R.id))
+        .filter(R.notification_id.in_(targeted))
+        .group_by(R.notification_id)
+        .all()
+    ) if targeted else {}
+    audience_counts = {}
+    for n in notifications:
+        if not crud.is_broadcast(n):
+            continue
+        key = (bool(n.target_all), n.target_role, n.sent_at.date() if n.sent_at else None)
+        if key not in audience_counts:
+            audience_counts[key] = db.query(func.count(models.User.id)).filter(crud.broadcast_audience(n)).scalar()
+        recipient_counts[n.id] = audience_counts[key]
+    
     return {
         "notifications": [
             {
@@ -875,7 +715,7 @@ def get_notification_history(
                 "target_role": n.target_role,
                 "sent_at": n.sent_at,
                 "priority": n.priority,
-                "recipient_count": len(n.receipts) if n.receipts else 0
+                "recipient_count": recipient_counts.get(n.id, 0)
             }
             for n in notifications
         ]
@@ -977,7 +817,8 @@ def emergency_password_reset(
     )
     
     # Send notification email to user
-    send_email(
+    enqueue_email(
+        db,
         to_email=user.email,
         subject="Emergency Password Reset - DoughNation",
         html_content=f"""
@@ -992,6 +833,7 @@ def emergency_password_reset(
         <p><small>Ticket: {reset_data.ticket_number or 'N/A'}</small></p>
         """
     )
+    db.commit()
     
     return {
         "message": "Password reset successful",
@@ -1152,7 +994,8 @@ def create_ownership_transfer(
     )
     
     # Send notification to new owner (former employee) with one-time password
-    send_email(
+    enqueue_email(
+        db,
         to_email=employee_email,
         subject="🔑 Bakery Ownership Transfer - Login Credentials - DoughNation",
         html_content=f"""
@@ -1216,10 +1059,12 @@ def create_ownership_transfer(
         </div>
         """
     )
+    db.commit()
     
     # Send notification to old owner
     try:
-        send_email(
+        enqueue_email(
+            db,
             to_email=old_email,
             subject="⚠️ Bakery Ownership Transfer Notice - Access Removed - DoughNation",
             html_content=f"""
@@ -1254,6 +1099,7 @@ def create_ownership_transfer(
             </div>
             """
         )
+        db.commit()
     except Exception as e:
         print(f"Failed to send notification to old owner: {e}")
     
@@ -1339,6 +1185,12 @@ def update_user_profile(
     db.commit()
     db.refresh(user)
     
+    # Re-evaluate nearby geofences when a charity or bakery moves
+    if ("latitude" in updates or "longitude" in updates) and user.role == "Charity":
+        geofence_scheduler.charity_moved(db, user)
+    elif ("latitude" in updates or "longitude" in updates) and user.role == "Bakery":
+        geofence_scheduler.schedule(user.id)
+    
     # Log audit event
     log_audit_event(
         db=db,
@@ -0,0 +1,327 @@
+"""
+Bakery product-template store.
+
+Templates (threshold, shelf life, description, image per product name) live in
+bakery_templates/bakery_{id}_products.csv by default. Parsed files are kept in
+an in-process LRU cache keyed by bakery and invalidated when the file's mtime
+changes or when this process writes it. Writes take a per-bakery lock and
+replace the file atomically (temp file + rename), so concurrent edits can't
+leave a half-written CSV behind. Writes work on the raw CSV rows, so rows the
+parser skips (and duplicate names) are kept as they are.
+
+Set TEMPLATE_STORE=db to keep templates in the product_templates table instead.
+"""
+
+import csv
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.database import SessionLocal
+from app import models
+
+CSV_DIR = "bakery_templates"
+CSV_FIELDS = ['Product Name', 'Threshold', 'Expiration', 'Description', 'Image']
+CSV_ENCODINGS = ['utf-8-sig', 'utf-8', 'latin-1', 'cp1252']
+
+TEMPLATE_STORE = os.getenv("TEMPLATE_STORE", "csv").lower()
+TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", "256"))
+
+
+def normalize_product_name(product_name: str) -> str:
+    """Key used to match product names (case and spaces ignored)."""
+    return (product_name or "").strip().lower().replace(' ', '')
+
+
+def _template(product_name, threshold, shelf_life_days, description, image):
+    return {
+        'shelf_life_days': shelf_life_days,
+        'threshold': threshold,
+        'description': (description or '').strip(),
+        'original_name': product_name,
+        'image': image or ''
+    }
+
+
+class CsvTemplateStore:
+    def __init__(self, directory: str = CSV_DIR, max_bakeries: int = TEMPLATE_CACHE_SIZE):
+        self.directory = directory
+        self.max_bakeries = max_bakeries
+        self._cache: "OrderedDict[int, tuple]" = OrderedDict()  # bakery_id -> (mtime_ns, templates)
+        self._cache_lock = threading.Lock()
+        self._bakery_locks: Dict[int, threading.Lock] = {}
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, bakery_id: int) -> str:
+        return os.path.join(self.directory, f"bakery_{bakery_id}_products.csv")
+
+    def lock(self, bakery_id: int) -> threading.Lock:
+        with self._cache_lock:
+            return self._bakery_locks.setdefault(bakery_id, threading.Lock())
+
+    # ---------------- Reads ----------------
+    def templates(self, bakery_id: int) -> Dict[str, dict]:
+        """All templates of a bakery keyed by normalized product name (a copy, safe to modify)."""
+        return {key: dict(template) for key, template in self._templates(bakery_id).items()}
+
+    def get(self, bakery_id: int, product_name: str) -> Optional[dict]:
+        template = self._templates(bakery_id).get(normalize_product_name(product_name))
+        return dict(template) if template else None
+
+    def _templates(self, bakery_id: int) -> Dict[str, dict]:
+        """The cached templates themselves; callers must not modify them."""
+        csv_path = self.path(bakery_id)
+        try:
+            mtime = os.stat(csv_path).st_mtime_ns
+        except FileNotFoundError:
+            self.invalidate(bakery_id)
+            return {}
+
+        with self._cache_lock:
+            cached = self._cache.get(bakery_id)
+            if cached and cached[0] == mtime:
+                self._cache.move_to_end(bakery_id)
+                return cached[1]
+
+        templates = self._parse(csv_path)
+        with self._cache_lock:
+            self._cache[bakery_id] = (mtime, templates)
+            self._cache.move_to_end(bakery_id)
+            while len(self._cache) > self.max_bakeries:
+                self._cache.popitem(last=False)
+        print(f"[CSV] ✅ Loaded {len(templates)} templates for bakery {bakery_id}")
+        return templates
+
+    def invalidate(self, bakery_id: int):
+        with self._cache_lock:
+            self._cache.pop(bakery_id, None)
+
+    @staticmethod
+    def _parse(csv_path: str) -> Dict[str, dict]:
+        for encoding in CSV_ENCODINGS:
+            templates = {}
+            try:
+                with open(csv_path, 'r', encoding=encoding) as f:
+                    for row in csv.DictReader(f):
+                        product_name = (row.get('Product Name') or '').strip()
+                        if not product_name:
+                            continue
+                        try:
+                            threshold = int(row.get('Threshold', 0))
+                            expiration = int(row.get('Expiration', 0))
+                        except (TypeError, ValueError):
+                            continue
+                        templates[normalize_product_name(product_name)] = _template(
+                            product_name, threshold, expiration,
+                            row.get('Description', ''), row.get('Image', '')
+                        )
+                return templates
+            except UnicodeDecodeError:
+                continue
+            except Exception as e:
+                print(f"[CSV] ❌ Error loading CSV: {e}")
+                continue
+        return {}
+
+    # ---------------- Writes ----------------
+    def initialize(self, bakery_id: int) -> str:
+        """Create the bakery's CSV with just a header if it doesn't exist."""
+        csv_path = self.path(bakery_id)
+        with self.lock(bakery_id):
+            if not os.path.exists(csv_path):
+                print(f"[CSV] Creating new CSV for bakery {bakery_id}")
+                self._write_rows(bakery_id, list(CSV_FIELDS), [])
+                print(f"[CSV] ✅ Created: {csv_path}")
+        return csv_path
+
+    def add(self, bakery_id: int, product_name: str, threshold: int, shelf_life_days: int,
+            description: str = "", image: str = "") -> bool:
+        """Add a template; returns False if the product already exists."""
+        with self.lock(bakery_id):
+            if normalize_product_name(product_name) in self._templates(bakery_id):
+                print(f"[CSV] Product '{product_name}' already exists for bakery {bakery_id}, skipping...")
+                return False
+
+            header, rows = self._read_rows(self.path(bakery_id))
+            header, rows = self._with_fields(header, rows)
+            rows.append(self._row(header, product_name, threshold, shelf_life_days, description, image))
+            self._write_rows(bakery_id, header, rows)
+        print(f"[CSV] ✅ Added '{product_name}' to bakery {bakery_id} CSV")
+        return True
+
+    def update(self, bakery_id: int, old_product_name: str, new_product_name: str, threshold: int,
+               shelf_life_days: int, description: str = "", image: str = "") -> bool:
+        """Replace the template stored under old_product_name (or add it if missing)."""
+        with self.lock(bakery_id):
+            if not os.path.exists(self.path(bakery_id)):
+                print(f"[CSV] No CSV found for bakery {bakery_id}")
+                return False
+
+            header, rows = self._read_rows(self.path(bakery_id))
+            header, rows = self._with_fields(header, rows)
+            old_key = normalize_product_name(old_product_name)
+            name_col = header.index('Product Name')
+            new_row = self._row(header, new_product_name, threshold, shelf_life_days, description, image)
+
+            # Only the last matching row (the one reads resolve to) changes, every other
+            # row is written back untouched
+            for i in reversed(range(len(rows))):
+                row = rows[i]
+                if len(row) > name_col and normalize_product_name(row[name_col]) == old_key:
+                    print(f"[CSV] 🔄 Updating '{old_product_name}' to '{new_product_name}' in bakery {bakery_id} CSV")
+                    row = row + [''] * (len(header) - len(row))
+                    for column, value in enumerate(new_row):
+                        if value is not None:
+                            row[column] = value
+                    rows[i] = row
+                    break
+            else:
+                print(f"[CSV] ⚠️ Product '{old_product_name}' not found in CSV, adding as new")
+                rows.append(new_row)
+
+            self._write_rows(bakery_id, header, rows)
+        print(f"[CSV] ✅ Successfully updated CSV for bakery {bakery_id}")
+        return True
+
+    @staticmethod
+    def _read_rows(csv_path: str):
+        """(header, rows) of the CSV as raw string lists, exactly as stored."""
+        if not os.path.exists(csv_path):
+            return list(CSV_FIELDS), []
+        for encoding in CSV_ENCODINGS:
+            try:
+                with open(csv_path, 'r', newline='', encoding=encoding) as f:
+                    lines = list(csv.reader(f))
+                break
+            except UnicodeDecodeError:
+                continue
+        else:
+            raise ValueError(f"Could not decode {csv_path}")
+        if not lines:
+            return list(CSV_FIELDS), []
+        return lines[0], lines[1:]
+
+    @staticmethod
+    def _with_fields(header, rows):
+        """Add any missing template columns to the header (existing rows get them empty)."""
+        missing = [field for field in CSV_FIELDS if field not in header]
+        if not missing:
+            return header, rows
+        width = len(header)
+        return header + missing, [row + [''] * (width - len(row)) + [''] * len(missing) for row in rows]
+
+    @staticmethod
+    def _row(header, product_name, threshold, shelf_life_days, description, image):
+        """A row in the file's column order; columns the store doesn't own are None (left as they are)."""
+        values = {
+            'Product Name': product_name.strip(),
+            'Threshold': str(threshold),
+            'Expiration': str(shelf_life_days),
+            'Description': (description or '').strip(),
+            'Image': image or ''
+        }
+        return [values.get(column) for column in header]
+
+    def _write_rows(self, bakery_id: int, header, rows):
+        """Write the whole CSV to a temp file and atomically move it into place."""
+        csv_path = self.path(bakery_id)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".bakery_{bakery_id}_", suffix=".csv")
+        try:
+            with os.fdopen(fd, 'w', newline='', encoding='utf-8-sig') as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                writer.writerows(rows)
+            os.replace(tmp_path, csv_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            self.invalidate(bakery_id)
+
+
+class DbTemplateStore:
+    """Same interface as CsvTemplateStore, backed by the product_templates table."""
+
+    def templates(self, bakery_id: int) -> Dict[str, dict]:
+        db = SessionLocal()
+        try:
+            rows = db.query(models.ProductTemplate).filter(
+                models.ProductTemplate.bakery_id == bakery_id
+            ).order_by(models.ProductTemplate.id).all()
+            return {r.normalized_name: self._to_template(r) for r in rows}
+        finally:
+            db.close()
+
+    def get(self, bakery_id: int, product_name: str) -> Optional[dict]:
+        db = SessionLocal()
+        try:
+            row = db.query(models.ProductTemplate).filter(
+                models.ProductTemplate.bakery_id == bakery_id,
+                models.ProductTemplate.normalized_name == normalize_product_name(product_name)
+            ).first()
+            return self._to_template(row) if row else None
+        finally:
+            db.close()
+
+    def invalidate(self, bakery_id: int):
+        pass
+
+    def initialize(self, bakery_id: int):
+        return None
+
+    def add(self, bakery_id: int, product_name: str, threshold: int, shelf_life_days: int,
+            description: str = "", image: str = "") -> bool:
+        db = SessionLocal()
+        try:
+            key = normalize_product_name(product_name)
+            exists = db.query(models.ProductTemplate.id).filter(
+                models.ProductTemplate.bakery_id == bakery_id,
+                models.ProductTemplate.normalized_name == key
+            ).first()
+            if exists:
+                return False
+            db.add(models.ProductTemplate(
+                bakery_id=bakery_id,
+                normalized_name=key,
+                product_name=product_name.strip(),
+                threshold=threshold,
+                shelf_life_days=shelf_life_days,
+                description=(description or '').strip(),
+                image=image or ''
+            ))
+            db.commit()
+            return True
+        finally:
+            db.close()
+
+    def update(self, bakery_id: int, old_product_name: str, new_product_name: str, threshold: int,
+               shelf_life_days: int, description: str = "", image: str = "") -> bool:
+        db = SessionLocal()
+        try:
+            row = db.query(models.ProductTemplate).filter(
+                models.ProductTemplate.bakery_id == bakery_id,
+                models.ProductTemplate.normalized_name == normalize_product_name(old_product_name)
+            ).first()
+            if not row:
+                row = models.ProductTemplate(bakery_id=bakery_id)
+                db.add(row)
+            row.normalized_name = normalize_product_name(new_product_name)
+            row.product_name = new_product_name.strip()
+            row.threshold = threshold
+            row.shelf_life_days = shelf_life_days
+            row.description = (description or '').strip()
+            row.image = image or ''
+            db.commit()
+            return True
+        finally:
+            db.close()
+
+    @staticmethod
+    def _to_template(row):
+        return _template(row.product_name, row.threshold, row.shelf_life_days, row.description, row.image)
+
+
+template_store = DbTemplateStore() if TEMPLATE_STORE == "db" else CsvTemplateStore()
@@ -0,0 +1,14 @@
+from app.database import SessionLocal
+from app import models, database
+from app.crud import rebuild_conversations
+
+# Make sure the conversations table exists before backfilling it
+models.Base.metadata.create_all(bind=database.engine)
+
+db = SessionLocal()
+
+try:
+    rows = rebuild_conversations(db)
+    print(f"✅ conversations rebuilt: {rows} rows written")
+finally:
+    db.close()
@@ -0,0 +1,14 @@
+from app.database import SessionLocal
+from app import models, database
+from app.crud import rebuild_donation_totals
+
+# Make sure the rollup table exists before backfilling it
+models.Base.metadata.create_all(bind=database.engine)
+
+db = SessionLocal()
+
+try:
+    rows = rebuild_donation_totals(db)
+    print(f"✅ donation_totals rebuilt: {rows} rows written")
+finally:
+    db.close()
@@ -0,0 +1,26 @@
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import query_stats
+from app.database import Base
+
+
+@pytest.fixture
+def Session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+    @event.listens_for(engine, "connect")
+    def _register_functions(dbapi_conn, _):
+        # Postgres function used by the bakery_inventory expression index
+        dbapi_conn.create_function("greatest", -1, max, deterministic=True)
+
+    Base.metadata.create_all(engine)
+    query_stats.instrument_engine(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
@@ -0,0 +1,95 @@
+import asyncio
+import itertools
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import database, models
+from app.database import Base
+from app.routes import messages
+from app.timezone_utils import now_ph
+from tests.test_notification_queries import _user
+
+ACTIONS = 12
+DB_DELAY = 0.2  # seconds each action spends "in the database"
+
+
+@pytest.fixture
+def file_session(tmp_path, monkeypatch):
+    # A file database with a real connection pool: each action checks out its own connection
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}", connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _register_functions(dbapi_conn, _):
+        dbapi_conn.create_function("greatest", -1, max, deterministic=True)
+
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(database, "SessionLocal", Session)
+    yield Session
+    engine.dispose()
+
+
+def test_socket_actions_run_off_the_event_loop_with_their_own_sessions(file_session):
+    db = file_session()
+    bakery = _user(db, "Bakery", "bakery")
+    charity = _user(db, "Charity", "charity")
+    for i in range(5):
+        db.add(models.Message(sender_id=bakery.id, receiver_id=charity.id, content=f"hi {i}", timestamp=now_ph()))
+    db.commit()
+    bakery_id, charity_id = bakery.id, charity.id
+    db.close()
+
+    used = []  # (session tag, thread id) of every action
+    used_lock = threading.Lock()
+    tags = itertools.count()
+
+    def slow(fn):
+        def action(db, *args):
+            with used_lock:
+                tag = db.info.setdefault("test_tag", next(tags))
+                used.append((tag, threading.get_ident()))
+            time.sleep(DB_DELAY)  # a slow query blocks only this worker thread
+            result = fn(db, *args)
+            with used_lock:
+                used.append((db.info["test_tag"], threading.get_ident()))
+            return result
+        return action
+
+    async def scenario():
+        ticks = []
+
+        async def ticker():
+            # Keeps running on the loop while the actions wait on their threads
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        tick_task = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        results = await asyncio.gather(*[
+            messages.run_db(slow(messages.get_history_page), charity_id, bakery_id, None, 20) if i % 2
+            else messages.run_db(slow(messages.search_users), charity_id, "bakery", "bakeries")
+            for i in range(ACTIONS)
+        ])
+        elapsed = time.perf_counter() - start
+        tick_task.cancel()
+        gaps = [b - a for a, b in zip(ticks, ticks[1:])]
+        return results, elapsed, max(gaps)
+
+    results, elapsed, max_gap = asyncio.run(scenario())
+
+    assert len(results) == ACTIONS
+    assert all(len(r[0]) == 5 for i, r in enumerate(results) if i % 2)
+    assert all(r and r[0]["id"] == bakery_id for i, r in enumerate(results) if not i % 2)
+    # Ran in parallel on the executor, and the loop never stalled for a whole DB call
+    assert elapsed < DB_DELAY * ACTIONS / 2
+    assert max_gap < DB_DELAY / 2
+    # One fresh session per action, never shared between threads
+    sessions = {}
+    for tag, thread_id in used:
+        assert sessions.setdefault(tag, thread_id) == thread_id
+    assert len(sessions) == ACTIONS
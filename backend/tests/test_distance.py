@@ -0,0 +1,61 @@
+import math
+
+import numpy as np
+import pytest
+
+from app.distance import haversine, haversine_vector
+
+# (lat, lon) pairs: Metro Manila, the antimeridian, the poles and identical points
+POINTS = [
+    ((14.5995, 120.9842), (14.6760, 121.0437)),
+    ((14.5995, 120.9842), (10.3157, 123.8854)),
+    ((0.0, 179.9), (0.0, -179.9)),
+    ((89.9, 0.0), (-89.9, 180.0)),
+    ((51.5074, -0.1278), (40.7128, -74.0060)),
+    ((14.5995, 120.9842), (14.5995, 120.9842)),
+]
+
+
+def test_haversine_known_distance():
+    # Manila to Cebu City is about 571 km
+    assert haversine(14.5995, 120.9842, 10.3157, 123.8854) == pytest.approx(571, abs=5)
+
+
+def test_haversine_same_point_is_zero():
+    assert haversine(14.5995, 120.9842, 14.5995, 120.9842) == 0
+
+
+def test_vector_matches_scalar():
+    origins = [origin for origin, _ in POINTS]
+    destinations = [destination for _, destination in POINTS]
+
+    distances = haversine_vector(origins, destinations)
+
+    assert distances.shape == (len(POINTS),)
+    for (origin, destination), distance in zip(POINTS, distances):
+        assert distance == pytest.approx(haversine(*origin, *destination), rel=1e-9, abs=1e-9)
+
+
+def test_vector_broadcasts_single_origin():
+    origin = (14.5995, 120.9842)
+    destinations = [destination for _, destination in POINTS]
+
+    distances = haversine_vector(origin, destinations)
+
+    expected = [haversine(*origin, *destination) for destination in destinations]
+    np.testing.assert_allclose(distances, expected, rtol=1e-9, atol=1e-9)
+
+
+def test_vector_single_pair():
+    distances = haversine_vector((14.5995, 120.9842), (14.6760, 121.0437))
+
+    assert distances.shape == (1,)
+    assert distances[0] == pytest.approx(haversine(14.5995, 120.9842, 14.6760, 121.0437))
+
+
+def test_vector_antipodal_points_stay_finite():
+    # Rounding can push the haversine term just past 1 for antipodes
+    distances = haversine_vector([(0.0, 0.0)], [(0.0, 180.0)])
+
+    assert math.isfinite(distances[0])
+    assert distances[0] == pytest.approx(math.pi * 6371)
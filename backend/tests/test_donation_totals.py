@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from app import crud, models
+from app.timezone_utils import today_ph
+from tests.test_notification_queries import _user
+
+
+def _totals(db):
+    return sorted(
+        (t.user_id, t.day, t.request_count, t.request_quantity, t.direct_count, t.direct_quantity)
+        for t in db.query(models.DonationTotal)
+        if t.request_count or t.request_quantity or t.direct_count or t.direct_quantity
+    )
+
+
+def test_deleting_inventory_keeps_totals_in_step(Session):
+    today = today_ph()
+    db = Session()
+    try:
+        bakery = _user(db, "Bakery", "bakery")
+        charity = _user(db, "Charity", "charity")
+        items = []
+        for i in range(2):
+            item = models.BakeryInventory(
+                bakery_id=bakery.id, product_id=f"P-{i}", name="Pandesal", quantity=10,
+                creation_date=today, expiration_date=today + timedelta(days=2), threshold=1, uploaded="owner"
+            )
+            db.add(item)
+            db.flush()
+            items.append(item)
+            for quantity, status in ((3, "complete"), (4, "complete"), (5, "preparing")):
+                db.add(models.DirectDonation(
+                    bakery_inventory_id=item.id, charity_id=charity.id, name="Pandesal", quantity=quantity,
+                    threshold=1, creation_date=today, expiration_date=today + timedelta(days=1),
+                    btracking_status=status
+                ))
+        db.commit()
+        crud.rebuild_donation_totals(db)
+        assert _totals(db)[0][4:] == (4, 14)
+
+        crud.delete_inventory(db, items[0].id, bakery.id)
+
+        incremental = _totals(db)
+        crud.rebuild_donation_totals(db)
+        assert incremental == _totals(db)
+        assert incremental[0][4:] == (2, 7)
+    finally:
+        db.close()
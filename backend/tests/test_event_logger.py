@@ -0,0 +1,64 @@
+import os
+import threading
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import database, event_logger, models
+from app.event_logger import EventWriter
+from app.timezone_utils import now_ph
+
+
+@pytest.fixture
+def writer(Session, tmp_path, monkeypatch):
+    monkeypatch.setattr(event_logger, "EVENT_LOG_SPOOL_PATH", str(tmp_path / "events.spool.jsonl"))
+    monkeypatch.setattr(event_logger, "EVENT_LOG_BATCH_SIZE", 1)
+    monkeypatch.setattr(database, "SessionLocal", Session)
+    return EventWriter()
+
+
+def _rows(n):
+    return [
+        {"event_type": "uptime", "description": f"event {i}", "severity": "info",
+         "user_id": None, "timestamp": now_ph(), "event_metadata": None}
+        for i in range(n)
+    ]
+
+
+def _written(Session):
+    db = Session()
+    try:
+        return sorted(e.description for e in db.query(models.SystemEvent))
+    finally:
+        db.close()
+
+
+def test_failed_replay_keeps_only_unwritten_rows(writer, Session, monkeypatch):
+    writer._spool(_rows(3))
+
+    insert = writer._insert
+    calls = []
+
+    def flaky_insert(db, rows, progress=None):
+        calls.append(rows)
+        if len(calls) == 2:
+            raise OperationalError("INSERT", {}, Exception("connection lost"))
+        insert(db, rows, progress)
+
+    monkeypatch.setattr(writer, "_insert", flaky_insert)
+    writer._replay_spool_locked()
+    assert _written(Session) == ["event 0"]
+
+    monkeypatch.setattr(writer, "_insert", insert)
+    writer._replay_spool_locked()
+    assert _written(Session) == ["event 0", "event 1", "event 2"]
+    assert not os.path.exists(event_logger.EVENT_LOG_SPOOL_PATH)
+
+
+def test_spooling_does_not_wait_for_a_database_write(writer):
+    with writer._lock:  # held by the writer thread during a DB write
+        spooler = threading.Thread(target=writer._spool, args=(_rows(1),))
+        spooler.start()
+        spooler.join(timeout=2)
+        assert not spooler.is_alive()
+    assert writer.stats["spooled"] == 1
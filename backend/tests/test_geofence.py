@@ -0,0 +1,97 @@
+import math
+import random
+import time
+
+import pytest
+from sqlalchemy import insert
+
+from app import models
+from app.distance import EARTH_RADIUS_KM, haversine
+from app.routes.geofence import bounding_box, charities_within
+
+BAKERY = (14.60, 120.98)
+
+
+def _charity_rows(points):
+    return [
+        {"role": "Charity", "name": f"charity{i}", "email": f"charity{i}@gmail.com", "contact_person": "c",
+         "contact_number": "09170000000", "address": "Manila", "hashed_password": "x", "status": "Active",
+         "latitude": lat, "longitude": lon}
+        for i, (lat, lon) in enumerate(points)
+    ]
+
+
+def _north(lat, lon, km):
+    return lat + math.degrees(km / EARTH_RADIUS_KM), lon
+
+
+def _south(lat, lon, km):
+    return lat - math.degrees(km / EARTH_RADIUS_KM), lon
+
+
+def _east(lat, lon, km, sign=1):
+    # Same latitude, `km` along the great circle
+    d_lon = 2 * math.asin(math.sin(km / (2 * EARTH_RADIUS_KM)) / math.cos(math.radians(lat)))
+    return lat, lon + sign * math.degrees(d_lon)
+
+
+def _west(lat, lon, km):
+    return _east(lat, lon, km, sign=-1)
+
+
+@pytest.mark.parametrize("lat", [0.0, 14.60, 60.0])
+def test_bounding_box_contains_the_haversine_circle(lat):
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, 120.98, 10)
+    for bearing in range(0, 360, 5):
+        # Walk 9.999 km along `bearing` and check the point stays in the box
+        angle, b = 9.999 / EARTH_RADIUS_KM, math.radians(bearing)
+        p_lat = math.asin(math.sin(math.radians(lat)) * math.cos(angle)
+                          + math.cos(math.radians(lat)) * math.sin(angle) * math.cos(b))
+        p_lon = math.radians(120.98) + math.atan2(
+            math.sin(b) * math.sin(angle) * math.cos(math.radians(lat)),
+            math.cos(angle) - math.sin(math.radians(lat)) * math.sin(p_lat)
+        )
+        assert min_lat <= math.degrees(p_lat) <= max_lat
+        assert min_lon <= math.degrees(p_lon) <= max_lon
+
+
+@pytest.mark.parametrize("direction", [_north, _south, _east, _west])
+def test_charity_just_inside_the_radius_is_kept(Session, direction):
+    db = Session()
+    try:
+        inside, outside = direction(*BAKERY, 9.995), direction(*BAKERY, 10.005)
+        db.execute(insert(models.User), _charity_rows([inside, outside]))
+        matches = charities_within(db, *BAKERY, 10)
+        assert [charity.name for charity, _ in matches] == ["charity0"]
+        assert matches[0][1] == pytest.approx(9.995, abs=1e-6)
+    finally:
+        db.close()
+
+
+def test_charities_within_benchmark_10k(Session):
+    """10k charities around Metro Manila: the box prefilter against a haversine scan of every charity."""
+    rng = random.Random(7)
+    points = [(rng.uniform(13.5, 15.7), rng.uniform(119.9, 122.1)) for _ in range(10_000)]
+    db = Session()
+    try:
+        db.execute(insert(models.User), _charity_rows(points))
+        db.commit()
+
+        start = time.perf_counter()
+        matches = charities_within(db, *BAKERY, 10)
+        prefiltered = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = sorted(
+            (haversine(*BAKERY, c.latitude, c.longitude), c.id)
+            for c in db.query(models.User).filter(models.User.role == "Charity")
+        )
+        expected = [charity_id for distance, charity_id in expected if distance <= 10]
+        full_scan = time.perf_counter() - start
+    finally:
+        db.close()
+
+    print(f"\n[geofence] 10k charities: box prefilter {prefiltered * 1000:.1f} ms, "
+          f"full scan {full_scan * 1000:.1f} ms, {len(matches)} in range")
+    assert expected
+    assert [charity.id for charity, _ in matches] == expected
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from app import models
+from app.routes.binventory_routes import effective_inventory_status, effective_inventory_status_expr
+from app.timezone_utils import today_ph
+from tests.test_notification_queries import _user
+
+
+def test_status_expression_matches_python(Session):
+    today = today_ph()
+    db = Session()
+    try:
+        bakery = _user(db, "Bakery", "bakery")
+        cases = [
+            (status, quantity, expiration)
+            for status in ("available", "unavailable", "donated")
+            for quantity in (0, 4)
+            for expiration in (None, today - timedelta(days=1), today, today + timedelta(days=3))
+        ]
+        for i, (status, quantity, expiration) in enumerate(cases):
+            db.add(models.BakeryInventory(
+                bakery_id=bakery.id, product_id=f"P-{i}", name="Pandesal", quantity=quantity,
+                creation_date=today, expiration_date=expiration, threshold=1, uploaded="owner", status=status
+            ))
+        db.commit()
+
+        rows = db.query(models.BakeryInventory, effective_inventory_status_expr(today)).all()
+        assert len(rows) == len(cases)
+        for item, derived in rows:
+            assert derived == effective_inventory_status(item, today), (item.status, item.quantity, item.expiration_date)
+    finally:
+        db.close()
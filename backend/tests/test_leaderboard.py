@@ -0,0 +1,82 @@
+import time
+from datetime import timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from app import models, query_stats
+from app.database import get_db
+from app.routes import leaderboard
+from app.timezone_utils import today_ph
+
+
+def _seed(db, bakeries: int, days: int = 5):
+    """`bakeries` verified bakeries; bakery i donated i + 1 items on each of `days` days."""
+    db.execute(insert(models.User), [
+        {"role": "Bakery", "name": f"bakery{i}", "email": f"bakery{i}@gmail.com", "contact_person": "b",
+         "contact_number": "09170000000", "address": "Manila", "hashed_password": "x",
+         "status": "Active", "verified": True}
+        for i in range(bakeries)
+    ])
+    users = {u.name: u.id for u in db.query(models.User)}
+    today = today_ph()
+    db.execute(insert(models.DonationTotal), [
+        {"user_id": users[f"bakery{i}"], "day": today - timedelta(days=d),
+         "request_count": 1, "request_quantity": i + 1, "direct_count": 0, "direct_quantity": 0}
+        for i in range(bakeries) for d in range(days)
+    ])
+    db.commit()
+
+
+@pytest.mark.parametrize("bakeries", [3, 200])
+def test_leaderboard_is_one_ranked_query(Session, bakeries):
+    db = Session()
+    try:
+        _seed(db, bakeries)
+        with query_stats.query_budget(1):
+            page = leaderboard.get_leaderboard_summary(limit=10, offset=1, current_user=None, db=db)
+    finally:
+        db.close()
+
+    top = min(10, bakeries - 1)
+    assert [row["rank"] for row in page] == list(range(2, top + 2))
+    assert page[0]["bakery_name"] == f"bakery{bakeries - 2}"
+    assert page[0]["total_quantity"] == (bakeries - 1) * 5
+
+
+def test_leaderboard_benchmark(Session):
+    """2000 bakeries with 30 days of totals each: time one page of the ranked query."""
+    db = Session()
+    try:
+        _seed(db, 2000, days=30)
+        start = time.perf_counter()
+        with query_stats.query_budget(1):
+            page = leaderboard.get_leaderboard_summary(limit=10, offset=0, current_user=None, db=db)
+        elapsed = time.perf_counter() - start
+    finally:
+        db.close()
+
+    print(f"\n[leaderboard] 2000 bakeries x 30 days: {elapsed * 1000:.1f} ms for one page")
+    assert page[0]["bakery_name"] == "bakery1999"
+
+
+def test_negative_offset_is_rejected(Session):
+    app = FastAPI()
+    app.include_router(leaderboard.router)
+    app.dependency_overrides[leaderboard.get_current_admin] = lambda: None
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    client = TestClient(app)
+
+    assert client.get("/leaderboard/summary?offset=-1").status_code == 422
+    assert client.get("/leaderboard/charities?offset=-5").status_code == 422
+    assert client.get("/leaderboard/summary?offset=0").status_code == 200
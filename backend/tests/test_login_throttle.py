@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from passlib.hash import bcrypt
+
+from app import auth, database, login_throttle
+from app.routes import auth_routes
+from tests.test_notification_queries import _user
+
+EMAIL = "bakery@gmail.com"
+
+
+@pytest.fixture
+def client(Session, monkeypatch):
+    db = Session()
+    user = _user(db, "Bakery", "bakery")
+    user.hashed_password = bcrypt.using(rounds=4).hash("right-password")
+    db.commit()
+    db.close()
+
+    # Small limits, fresh counters
+    monkeypatch.setattr(login_throttle, "failures_by_identifier", login_throttle.SlidingWindowLimiter(3, 900))
+    monkeypatch.setattr(login_throttle, "attempts_by_ip", login_throttle.SlidingWindowLimiter(100, 300))
+    monkeypatch.setattr(auth, "SECRET_KEY", "test-secret")
+    monkeypatch.setattr(auth, "ALGORITHM", "HS256")
+    monkeypatch.setattr(auth_routes, "log_system_event", lambda **kwargs: None)
+
+    app = FastAPI()
+    app.include_router(auth_routes.router)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[database.get_db] = override_get_db
+    return TestClient(app)
+
+
+def _login(client, password, email=EMAIL):
+    return client.post("/login", json={"email": email, "password": password})
+
+
+def test_failures_over_the_limit_get_429_with_retry_after(client):
+    for _ in range(3):
+        assert _login(client, "wrong").status_code == 401
+
+    response = _login(client, "right-password")
+    assert response.status_code == 429
+    assert 0 < int(response.headers["Retry-After"]) <= 900
+
+
+def test_successful_login_resets_the_failure_count(client):
+    for _ in range(2):
+        assert _login(client, "wrong").status_code == 401
+    assert _login(client, "right-password").status_code == 200
+
+    # The count starts over: two more failures still leave room for a third attempt
+    for _ in range(2):
+        assert _login(client, "wrong").status_code == 401
+    assert _login(client, "wrong").status_code == 401
+    assert _login(client, "wrong").status_code == 429
+
+
+def test_unknown_account_counts_as_a_failure(client):
+    for _ in range(3):
+        assert _login(client, "x", email="nobody@gmail.com").status_code == 401
+    assert _login(client, "x", email="nobody@gmail.com").status_code == 429
+    # Other identifiers are not affected
+    assert _login(client, "right-password").status_code == 200
+
+
+def test_employee_not_found_counts_as_a_failure(client, monkeypatch):
+    def not_found(credentials, db):
+        raise HTTPException(status_code=404, detail="Employee not found")
+
+    monkeypatch.setattr(auth_routes, "_employee_login", not_found)
+    body = {"employee_id": "EMP-1-001", "password": "x"}
+    for _ in range(3):
+        assert client.post("/employee-login", json=body).status_code == 404
+    assert client.post("/employee-login", json=body).status_code == 429
+
+
+def test_other_errors_do_not_count(client):
+    # Role mismatch is a 403, not a credential failure
+    for _ in range(5):
+        response = client.post("/login", json={"email": EMAIL, "password": "x", "role": "Charity"})
+        assert response.status_code == 403
+    assert _login(client, "right-password").status_code == 200
+
+
+def test_password_pool_is_bounded(monkeypatch):
+    monkeypatch.setattr(auth, "_hash_slots", threading.BoundedSemaphore(2))
+    release = threading.Event()
+    running = []
+
+    def slow_check():
+        running.append(threading.current_thread().name)
+        release.wait(5)
+        return "ok"
+
+    async def scenario():
+        first = [asyncio.ensure_future(auth.run_on_password_pool(slow_check)) for _ in range(2)]
+        while len(running) < 2:
+            await asyncio.sleep(0.01)
+        # Both slots taken: the next login is turned away immediately instead of queueing
+        with pytest.raises(HTTPException) as busy:
+            await auth.run_on_password_pool(slow_check)
+        release.set()
+        return busy.value, await asyncio.gather(*first)
+
+    start = time.perf_counter()
+    busy, results = asyncio.run(scenario())
+    assert busy.status_code == 429 and busy.headers["Retry-After"] == "1"
+    assert results == ["ok", "ok"]
+    assert all(name.startswith(auth._HASH_THREAD_PREFIX) for name in running)
+    assert time.perf_counter() - start < 5
@@ -0,0 +1,54 @@
+from app import models
+from app.notification_events import _CHANGES_KEY, build_events
+from tests.test_notification_queries import _seed
+
+
+def _flush_changes(db):
+    db.flush()
+    changes = [list(c) for c in db.info.get(_CHANGES_KEY, [])]
+    db.commit()
+    return changes
+
+
+def _charity_events(Session, change):
+    db = Session()
+    try:
+        charity_id = _seed(db, 1)
+        donation = db.query(models.Donation).one()
+        donation_id = donation.id
+        change(db, donation)
+        changes = _flush_changes(db)
+        events = build_events(db, changes, {charity_id: "Charity"})
+        return donation_id, [evt for user_id, evt in events if user_id == charity_id]
+    finally:
+        db.close()
+
+
+def test_claimed_donation_is_dropped_from_charity_feed(Session):
+    def claim(db, donation):
+        donation.quantity = 0
+
+    donation_id, events = _charity_events(Session, claim)
+    assert {"section": "donations", "removed": donation_id} in events
+    # Still in the database, so the geofence entry is refreshed rather than dropped
+    geofence = [e for e in events if e["section"] == "geofence_notifications"]
+    assert geofence and geofence[0]["item"]["quantity"] == 0
+
+
+def test_edited_donation_is_pushed_to_charity_feed(Session):
+    def edit(db, donation):
+        donation.quantity = 2
+
+    donation_id, events = _charity_events(Session, edit)
+    items = [e["item"] for e in events if e["section"] == "donations" and "item" in e]
+    assert [(i["donation_id"], i["quantity"]) for i in items] == [(donation_id, 2)]
+
+
+def test_deleted_donation_is_removed_from_every_charity_section(Session):
+    def delete(db, donation):
+        db.query(models.DonationRequest).filter_by(donation_id=donation.id).delete()
+        db.delete(donation)
+
+    donation_id, events = _charity_events(Session, delete)
+    assert {"section": "donations", "removed": donation_id} in events
+    assert {"section": "geofence_notifications", "removed": donation_id} in events
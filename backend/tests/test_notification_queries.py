@@ -0,0 +1,102 @@
+from datetime import timedelta
+
+import pytest
+
+from app import admin_models, models, query_stats
+from app.database import Base
+from app.routes.cnotification import get_message_notifications
+from app.timezone_utils import now_ph, today_ph
+
+# Statements the charity feed may run, whatever the number of rows it returns
+FEED_QUERY_BUDGET = 10
+
+
+def _user(db, role, name, **fields):
+    user = models.User(
+        role=role, name=name, email=f"{name}@gmail.com", contact_person=name,
+        contact_number="09170000000", address="Manila", hashed_password="x",
+        verified=True, status="Active", **fields
+    )
+    db.add(user)
+    db.flush()
+    return user
+
+
+def _seed(db, bakeries: int) -> int:
+    """A charity with `bakeries` nearby bakeries, each contributing one row to every feed section."""
+    today = today_ph()
+    admin = _user(db, "Admin", "admin")
+    charity = _user(db, "Charity", "charity", latitude=14.60, longitude=120.98)
+
+    for i in range(bakeries):
+        bakery = _user(db, "Bakery", f"bakery{i}", latitude=14.60 + i / 1000, longitude=120.98)
+        item = models.BakeryInventory(
+            bakery_id=bakery.id, product_id=f"P-{i}", name="Pandesal", quantity=10,
+            creation_date=today, expiration_date=today + timedelta(days=2), threshold=1, uploaded="owner"
+        )
+        db.add(item)
+        db.flush()
+        donation = models.Donation(
+            bakery_inventory_id=item.id, bakery_id=bakery.id, name="Pandesal", quantity=5, threshold=1,
+            creation_date=today, expiration_date=today + timedelta(days=2), uploaded="owner"
+        )
+        db.add(donation)
+        db.flush()
+        db.add_all([
+            models.Message(sender_id=bakery.id, receiver_id=charity.id, content=f"hello {i}", timestamp=now_ph()),
+            models.DirectDonation(
+                bakery_inventory_id=item.id, charity_id=charity.id, name="Ensaymada", quantity=3,
+                threshold=1, creation_date=today, expiration_date=today + timedelta(days=1)
+            ),
+            models.DonationRequest(
+                donation_id=donation.id, bakery_inventory_id=item.id, charity_id=charity.id,
+                bakery_id=bakery.id, status="accepted", donation_name="Pandesal", donation_quantity=5
+            ),
+            models.NotificationRead(user_id=charity.id, notif_id=f"donation-{donation.id}"),
+            models.NotificationRead(
+                user_id=charity.id, notif_id=f"geofence-{donation.id}-to-{charity.id}", read_at=None
+            ),
+        ])
+        db.add(admin_models.SystemNotification(
+            title=f"Notice {i}", message="...", notification_type="announcement",
+            target_all=True, sent_by_admin_id=admin.id, sent_at=now_ph()
+        ))
+
+    # No created_at: SQLite can't compare CAST(timestamp AS DATE) the way Postgres does
+    db.query(models.User).filter(models.User.id == charity.id).update({models.User.created_at: None})
+    db.commit()
+    return charity.id
+
+
+def _feed_query_count(Session, bakeries: int):
+    db = Session()
+    try:
+        charity = db.get(models.User, _seed(db, bakeries))
+        with query_stats.query_budget(FEED_QUERY_BUDGET) as stats:
+            feed = get_message_notifications(db=db, current_user=charity)
+        return stats.count, feed
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("bakeries", [1, 15])
+def test_charity_feed_stays_within_query_budget(Session, bakeries):
+    count, feed = _feed_query_count(Session, bakeries)
+
+    assert len(feed["messages"]) == bakeries
+    assert len(feed["donations"]) == bakeries
+    assert len(feed["received_donations"]) == 2 * bakeries
+    assert len(feed["geofence_notifications"]) == bakeries
+    assert len(feed["system_notifications"]) == bakeries
+    assert count <= FEED_QUERY_BUDGET
+
+
+def test_charity_feed_query_count_does_not_grow_with_rows(Session):
+    small, _ = _feed_query_count(Session, 1)
+
+    # Fresh database for the larger feed
+    Base.metadata.drop_all(Session.kw["bind"])
+    Base.metadata.create_all(Session.kw["bind"])
+
+    large, _ = _feed_query_count(Session, 20)
+    assert large == small
@@ -0,0 +1,59 @@
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app import auth
+from app.routes import notification_stream
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(auth, "SECRET_KEY", "test-secret")
+    monkeypatch.setattr(auth, "ALGORITHM", "HS256")
+    app = FastAPI()
+    app.include_router(notification_stream.router)
+    app.dependency_overrides[auth.get_current_user_or_employee] = lambda: SimpleNamespace(id=7, role="Charity")
+    return TestClient(app)
+
+
+def _ticket(client):
+    token = auth.create_access_token({"sub": "7"}, expires_delta=timedelta(minutes=60))
+    response = client.post("/notifications/stream-ticket", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    return response.json()["ticket"]
+
+
+def test_stream_rejects_access_tokens(client):
+    token = auth.create_access_token({"sub": "7"})
+    assert client.get("/notifications/stream", params={"ticket": token}).status_code == 401
+
+
+def test_ticket_is_not_an_access_token(client):
+    with pytest.raises(HTTPException) as exc:
+        auth.get_current_user(token=_ticket(client), db=None)
+    assert exc.value.status_code == 401
+
+
+def test_expired_ticket_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(notification_stream, "STREAM_TICKET_SECONDS", -1)
+    assert client.get("/notifications/stream", params={"ticket": _ticket(client)}).status_code == 401
+
+
+def test_stream_ends_when_the_login_expires(client):
+    # Login expires 1s from now: the stream says so and closes instead of running on
+    token = auth.create_access_token({"sub": "7"}, expires_delta=timedelta(seconds=1))
+    ticket = client.post(
+        "/notifications/stream-ticket", headers={"Authorization": f"Bearer {token}"}
+    ).json()["ticket"]
+
+    start = time.monotonic()
+    with client.stream("GET", "/notifications/stream", params={"ticket": ticket}) as response:
+        assert response.status_code == 200
+        body = "".join(response.iter_text())
+    assert body.startswith("event: ready")
+    assert body.rstrip().endswith("event: expired\ndata: {}")
+    assert time.monotonic() - start < notification_stream.KEEPALIVE_SECONDS
@@ -0,0 +1,22 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import auth, query_stats
+
+
+def _client(overrides=None):
+    app = FastAPI()
+    app.include_router(query_stats.router)
+    app.dependency_overrides.update(overrides or {})
+    return TestClient(app)
+
+
+def test_debug_query_stats_requires_login():
+    assert _client().get("/debug/query-stats").status_code == 401
+
+
+def test_debug_query_stats_for_admins():
+    client = _client({auth.get_current_admin: lambda: object()})
+    response = client.get("/debug/query-stats")
+    assert response.status_code == 200
+    assert "routes" in response.json()
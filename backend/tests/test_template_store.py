@@ -0,0 +1,63 @@
+import csv
+
+from app.template_store import CsvTemplateStore
+
+HEADER = ['Product Name', 'Threshold', 'Expiration', 'Description', 'Image']
+
+
+def _store(tmp_path, rows):
+    store = CsvTemplateStore(directory=str(tmp_path))
+    with open(store.path(1), 'w', newline='', encoding='utf-8-sig') as f:
+        csv.writer(f).writerows([HEADER] + rows)
+    return store
+
+
+def _rows(store):
+    with open(store.path(1), newline='', encoding='utf-8-sig') as f:
+        return list(csv.reader(f))[1:]
+
+
+ROWS = [
+    ['Pandesal', '5', '2', 'Soft roll', ''],
+    ['Broken row', 'n/a', '2', 'Threshold is not a number', ''],
+    ['Ensaymada', '3', '1', 'First copy', ''],
+    ['Ensaymada', '4', '1', 'Second copy', ''],
+]
+
+
+def test_add_keeps_rows_the_parser_skips(tmp_path):
+    store = _store(tmp_path, ROWS)
+
+    assert store.add(1, 'Monay', 2, 3, 'Dense bread')
+
+    assert _rows(store) == ROWS + [['Monay', '2', '3', 'Dense bread', '']]
+
+
+def test_update_rewrites_only_the_targeted_row(tmp_path):
+    store = _store(tmp_path, ROWS)
+
+    assert store.update(1, 'ensaymada', 'Ensaymada Special', 6, 2, 'Updated')
+
+    assert _rows(store) == ROWS[:3] + [['Ensaymada Special', '6', '2', 'Updated', '']]
+    assert store.get(1, 'Ensaymada Special')['threshold'] == 6
+
+
+def test_update_keeps_extra_columns(tmp_path):
+    store = CsvTemplateStore(directory=str(tmp_path))
+    with open(store.path(1), 'w', newline='', encoding='utf-8-sig') as f:
+        csv.writer(f).writerows([HEADER + ['Notes'], ['Pandesal', '5', '2', '', '', 'keep me']])
+
+    store.update(1, 'Pandesal', 'Pandesal', 8, 2)
+
+    assert _rows(store) == [['Pandesal', '8', '2', '', '', 'keep me']]
+
+
+def test_templates_returns_a_copy(tmp_path):
+    store = _store(tmp_path, ROWS)
+
+    templates = store.templates(1)
+    templates['pandesal']['threshold'] = 99
+    templates.clear()
+
+    assert store.get(1, 'Pandesal')['threshold'] == 5
+    assert set(store.templates(1)) == {'pandesal', 'ensaymada'}
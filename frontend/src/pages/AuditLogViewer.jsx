@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import {
   Card,
   CardContent,
@@ -75,6 +75,8 @@ const AuditLogViewer = () => {
   const [endDate, setEndDate] = useState("");
   const [page, setPage] = useState(0);
   const [limit] = useState(10);
+  // before_id cursor for each page visited under the current filters
+  const cursorsRef = useRef({ key: "", before: [null] });
   const [adminProfile, setAdminProfile] = useState(null);
 
   // Detail dialog
@@ -102,15 +104,27 @@ const AuditLogViewer = () => {
   const fetchLogs = async () => {
     try {
       setLoading(true);
-      const params = new URLSearchParams({
-        skip: (page * limit).toString(),
-        limit: limit.toString(),
-      });
+      const filterKey = JSON.stringify([eventTypeFilter, severityFilter, startDate, endDate]);
+      const filtersChanged = cursorsRef.current.key !== filterKey;
+      if (filtersChanged) {
+        cursorsRef.current = { key: filterKey, before: [null] };
+      }
+      const beforeId = cursorsRef.current.before[page];
+
+      const params = new URLSearchParams({ limit: limit.toString() });
+      if (beforeId) {
+        // Keyset page: continue after the last event of the previous page
+        params.append("before_id", beforeId.toString());
+      } else {
+        params.append("skip", (page * limit).toString());
+      }
+      // The total only needs loading once per set of filters
+      if (page > 0 && !filtersChanged) {
+        params.append("count", "none");
+      }
 
-      // Handle admin_crud as multiple event types (client-side filter)
-      if (eventTypeFilter === "admin_crud") {
-        // Don't add event_type filter - we'll filter client-side
-      } else if (eventTypeFilter && eventTypeFilter !== "all") {
+      // "admin_crud" covers several event types; the server expands it
+      if (eventTypeFilter && eventTypeFilter !== "all") {
         params.append("event_type", eventTypeFilter);
       }
 
@@ -132,22 +146,11 @@ const AuditLogViewer = () => {
       }
 
       const response = await api.get(`/admin/audit-logs?${params.toString()}`);
-      let filteredLogs = response.data.logs || [];
-
-      // Client-side filter for admin CRUD operations
-      if (eventTypeFilter === "admin_crud") {
-        const adminCrudTypes = [
-          "ADMIN_UPDATE_USER",
-          "ADMIN_MANUAL_REGISTRATION",
-          "ADMIN_DELETE_USER",
-        ];
-        filteredLogs = filteredLogs.filter((log) =>
-          adminCrudTypes.includes(log.event_type)
-        );
+      setLogs(response.data.logs || []);
+      if (response.data.total_count !== null && response.data.total_count !== undefined) {
+        setTotalCount(response.data.total_count);
       }
-
-      setLogs(filteredLogs);
-      setTotalCount(response.data.total_count || 0);
+      cursorsRef.current.before[page + 1] = response.data.next_before_id;
     } catch (error) {
       console.error("Failed to fetch audit logs:", error);
       Swal.fire("Error", "Failed to load audit logs", "error");
@@ -161,10 +164,8 @@ const AuditLogViewer = () => {
     try {
       const params = new URLSearchParams();
 
-      // Handle admin_crud as multiple event types (client-side filter)
-      if (eventTypeFilter === "admin_crud") {
-        // Don't add event_type filter - we'll filter client-side
-      } else if (eventTypeFilter && eventTypeFilter !== "all") {
+      // "admin_crud" covers several event types; the server expands it
+      if (eventTypeFilter && eventTypeFilter !== "all") {
         params.append("event_type", eventTypeFilter);
       }
 
@@ -190,19 +191,7 @@ const AuditLogViewer = () => {
       params.append("limit", "10000"); // Large number to get all records
 
       const response = await api.get(`/admin/audit-logs?${params.toString()}`);
-      let allLogs = response.data.logs || [];
-
-      // Client-side filter for admin CRUD operations
-      if (eventTypeFilter === "admin_crud") {
-        const adminCrudTypes = [
-          "ADMIN_UPDATE_USER",
-          "ADMIN_MANUAL_REGISTRATION",
-          "ADMIN_DELETE_USER",
-        ];
-        allLogs = allLogs.filter((log) =>
-          adminCrudTypes.includes(log.event_type)
-        );
-      }
+      const allLogs = response.data.logs || [];
 
       if (allLogs.length === 0) {
         Swal.fire(
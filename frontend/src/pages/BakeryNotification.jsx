@@ -1,5 +1,6 @@
 import { useEffect, useRef, useState } from "react";
 import axios from "axios";
+import { openNotificationStream } from "../utils/notificationStream";
 import { Bell, ExternalLink, X, ChevronRight } from "lucide-react";
 
 function UnreadCircle({ read }) {
@@ -165,10 +166,33 @@ export default function BakeryNotification() {
     }
   };
 
+  // ---------- live updates ----------
+  // The feed is fetched once; afterwards the server pushes changes over SSE.
   useEffect(() => {
     fetchNotifications();
-    const iv = setInterval(fetchNotifications, 4000);
-    return () => clearInterval(iv);
+
+    let connected = false;
+    return openNotificationStream(
+      API,
+      () => localStorage.getItem("employeeToken") || localStorage.getItem("token"),
+      {
+        // "ready" comes on every (re)connect; refetch after a reconnect in case events were missed
+        onReady: () => {
+          if (connected) fetchNotifications();
+          connected = true;
+        },
+        onEvent: (evt) => {
+          if (evt.resync) {
+            fetchNotifications();
+          } else if (evt.section === "system_notifications" && evt.item) {
+            setSystemNotifications((prev) => [
+              evt.item,
+              ...prev.filter((n) => n.id !== evt.item.id),
+            ]);
+          }
+        },
+      }
+    );
   }, []);
 
   useEffect(() => {
@@ -1,5 +1,6 @@
 import { useEffect, useState, useRef } from "react";
 import axios from "axios";
+import { openNotificationStream } from "../utils/notificationStream";
 import { Bell, ChevronRight, X } from "lucide-react";
 
 // Small unread/read circle indicator
@@ -60,6 +61,23 @@ export default function NotificationBell() {
       return bd - ad; // newest first
     });
 
+  const receivedMessage = (d) => {
+    switch (d.type) {
+      case "direct":
+        return `${d.bakery_name} sent a donation`;
+      case "request":
+        return `${d.bakery_name} accepted your request`;
+      case "request_declined":
+        return `${d.bakery_name} declined your request`;
+      default:
+        return `Update from ${d.bakery_name}`;
+    }
+  };
+
+  // insert or replace by id, newest first
+  const upsert = (list, item) =>
+    sortByNewest([item, ...list.filter((x) => x.id !== item.id)]);
+
   // Fetch notifications
   const fetchNotifications = async () => {
     try {
@@ -98,30 +116,11 @@ export default function NotificationBell() {
       setSystemNotifications(sysNotifs || []);
 
       // received donations (status updates)
-      const mapped = sortByNewest(rDons || []).map((d) => {
-        let message;
-        switch (d.type) {
-          case "direct":
-            message = `${d.bakery_name} sent a donation`;
-            break;
-          case "request":
-            message = `${d.bakery_name} accepted your request`;
-            break;
-          case "request_declined":
-            message = `${d.bakery_name} declined your request`;
-            break;
-          default:
-            message = `Update from ${d.bakery_name}`;
-        }
-
-        const wasRead = storedRead.includes(d.id);
-
-        return {
-          ...d,
-          message,
-          read: wasRead,
-        };
-      });
+      const mapped = sortByNewest(rDons || []).map((d) => ({
+        ...d,
+        message: receivedMessage(d),
+        read: storedRead.includes(d.id),
+      }));
 
       setReceivedDonations(mapped);
     } catch (err) {
@@ -163,10 +162,64 @@ export default function NotificationBell() {
   };
 
   // effects
+  // The feed is fetched once; afterwards the server pushes changes over SSE.
   useEffect(() => {
     fetchNotifications();
-    const iv = setInterval(fetchNotifications, 2000);
-    return () => clearInterval(iv);
+
+    let connected = false;
+    return openNotificationStream(
+      API,
+      () => localStorage.getItem("token"),
+      {
+        // "ready" comes on every (re)connect; refetch after a reconnect in case events were missed
+        onReady: () => {
+          if (connected) fetchNotifications();
+          connected = true;
+        },
+        onEvent: (evt) => {
+          if (evt.resync) {
+            fetchNotifications();
+            return;
+          }
+          if (evt.removed !== undefined) {
+            // Donation claimed, used up or deleted
+            if (evt.section === "donations") {
+              setDonations((prev) => prev.filter((d) => d.donation_id !== evt.removed));
+            } else if (evt.section === "geofence_notifications") {
+              setPriorityDonations((prev) => prev.filter((d) => d.id !== evt.removed));
+            }
+            return;
+          }
+          if (!evt.item) return;
+
+          const item = {
+            ...evt.item,
+            read: getReadFromStorage().includes(evt.item.id),
+          };
+          switch (evt.section) {
+            case "donations":
+              setDonations((prev) => upsert(prev, item));
+              break;
+            case "geofence_notifications":
+              setPriorityDonations((prev) => upsert(prev, item));
+              break;
+            case "received_donations":
+              setReceivedDonations((prev) =>
+                upsert(prev, { ...item, message: receivedMessage(item) })
+              );
+              break;
+            case "system_notifications":
+              setSystemNotifications((prev) => [
+                evt.item,
+                ...prev.filter((n) => n.id !== evt.item.id),
+              ]);
+              break;
+            default:
+              break;
+          }
+        },
+      }
+    );
   }, []);
 
   // reset page when list size changes
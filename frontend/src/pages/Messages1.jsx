@@ -382,6 +382,9 @@ export default function Messages({ currentUser: currentUserProp }) {
   const composeRef = useRef(null);
   const pollRef = useRef({ activeChats: null, history: null, inventory: null });
   const fetchedHistoryRef = useRef(new Set());
+  // peerId -> id to pass as before_id for the next older history page (null = no more)
+  const [historyCursors, setHistoryCursors] = useState(new Map());
+  const olderScrollRef = useRef(null); // scrollHeight before an older page is prepended
   const renderFetchRef = useRef(new Set());
 
   const setMsgRef = (id) => (el) => {
@@ -534,13 +537,22 @@ export default function Messages({ currentUser: currentUserProp }) {
     });
   };
 
-  const fetchHistoryForPeer = async (peerId) => {
+  const fetchHistoryForPeer = async (peerId, beforeId = null) => {
     if (!peerId || !currentUser) return;
     try {
+      const beforeParam = beforeId ? `&before_id=${Number(beforeId)}` : "";
       const res = await axios.get(
-        `${API_URL}/messages/history?peer_id=${Number(peerId)}`,
+        `${API_URL}/messages/history?peer_id=${Number(peerId)}${beforeParam}`,
         makeAuthOpts()
       );
+      const nextBeforeId = res.data.next_before_id ?? null;
+      setHistoryCursors((prev) => {
+        // Polling the newest page must not reset a cursor that was already paged back
+        if (!beforeId && prev.has(Number(peerId))) return prev;
+        const next = new Map(prev);
+        next.set(Number(peerId), nextBeforeId);
+        return next;
+      });
       const incoming = (res.data.messages || []).map((m) => ({
         ...m,
         id: Number(m.id),
@@ -560,27 +572,25 @@ export default function Messages({ currentUser: currentUserProp }) {
 
     try {
       const opts = makeAuthOpts();
+      const payload = {
+        sender_id: Number(currentUser.id),
+        receiver_id: Number(selectedUser.id),
+        content: newMessage.trim(),
+      };
       if (mediaFile) {
+        // Upload the file first; the message only references it by id
         const form = new FormData();
-        form.append("sender_id", Number(currentUser.id));
-        form.append("receiver_id", Number(selectedUser.id));
-        form.append("content", newMessage.trim() || "");
         form.append("file", mediaFile);
-        await axios.post(`${API_URL}/messages/send`, form, {
+        const upload = await axios.post(`${API_URL}/messages/attachments`, form, {
           ...opts,
           headers: {
             ...(opts.headers || {}),
             "Content-Type": "multipart/form-data",
           },
         });
-      } else {
-        const payload = {
-          sender_id: Number(currentUser.id),
-          receiver_id: Number(selectedUser.id),
-          content: newMessage.trim(),
-        };
-        await axios.post(`${API_URL}/messages/send`, payload, opts);
+        payload.attachment_id = upload.data.attachment_id;
       }
+      await axios.post(`${API_URL}/messages/send`, payload, opts);
       setNewMessage("");
       setMediaFile(null);
 
@@ -1737,7 +1747,11 @@ export default function Messages({ currentUser: currentUserProp }) {
       filteredMessages.length !== prevMessageCountRef.current;
     prevMessageCountRef.current = filteredMessages.length;
 
-    if (messageCountChanged) {
+    if (messageCountChanged && olderScrollRef.current !== null) {
+      // Older page prepended: keep the current messages in view
+      el.scrollTop = el.scrollHeight - olderScrollRef.current;
+      olderScrollRef.current = null;
+    } else if (messageCountChanged) {
       const s = () => {
         el.scrollTop = el.scrollHeight;
       };
@@ -2248,6 +2262,22 @@ export default function Messages({ currentUser: currentUserProp }) {
               )}
 
               <div ref={dockScrollRef} className="dock-scroll">
+                {selectedUser && historyCursors.get(Number(selectedUser.id)) && (
+                  <div style={{ display: "flex", justifyContent: "center", margin: "6px 0" }}>
+                    <button
+                      className="btn-mini"
+                      onClick={() => {
+                        olderScrollRef.current = dockScrollRef.current?.scrollHeight ?? null;
+                        fetchHistoryForPeer(
+                          selectedUser.id,
+                          historyCursors.get(Number(selectedUser.id))
+                        );
+                      }}
+                    >
+                      Load earlier messages
+                    </button>
+                  </div>
+                )}
                 {filteredMessages.map((m, i) => {
                   const me = Number(m.sender_id) === Number(currentUser?.id);
                   const render = renderMessageBody(m);
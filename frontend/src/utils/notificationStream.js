@@ -0,0 +1,72 @@
+import axios from "axios";
+
+// Wait before reconnecting after the stream drops
+const RETRY_MS = 5000;
+
+/**
+ * Open the notification stream (Server-Sent Events).
+ *
+ * EventSource cannot send headers, so instead of putting the access token in the
+ * URL a short-lived stream ticket is fetched first (with the normal Authorization
+ * header). A dropped connection reconnects with a fresh ticket; when the login
+ * expires the server sends "expired" and the stream stays closed.
+ *
+ * Returns a function that closes the stream.
+ */
+export const openNotificationStream = (api, getToken, { onReady, onEvent }) => {
+  let es = null;
+  let retryTimer = null;
+  let closed = false;
+
+  const retry = () => {
+    if (!closed) retryTimer = setTimeout(connect, RETRY_MS);
+  };
+
+  const connect = async () => {
+    const token = getToken();
+    if (!token || closed) return;
+
+    let ticket;
+    try {
+      const res = await axios.post(`${api}/notifications/stream-ticket`, null, {
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      ticket = res.data.ticket;
+    } catch (err) {
+      // 401: the login is no longer valid, nothing to reconnect with
+      if (err?.response?.status !== 401) retry();
+      return;
+    }
+    if (closed) return;
+
+    es = new EventSource(
+      `${api}/notifications/stream?ticket=${encodeURIComponent(ticket)}`
+    );
+    es.addEventListener("ready", onReady);
+    es.addEventListener("expired", () => {
+      closed = true;
+      es.close();
+    });
+    es.onmessage = (e) => {
+      let evt;
+      try {
+        evt = JSON.parse(e.data);
+      } catch {
+        return;
+      }
+      onEvent(evt);
+    };
+    es.onerror = () => {
+      // The ticket in the URL has expired by now; reconnect with a new one
+      es.close();
+      retry();
+    };
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(retryTimer);
+    if (es) es.close();
+  };
+};